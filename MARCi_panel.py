@@ -20,7 +20,10 @@ if 'DEBUG_MODE' in sys.argv:
     sys.argv.remove('DEBUG_MODE')
 
 PROPS = [
-    ('transfer_only_existing', bpy.props.BoolProperty(name='Transfer only existing', default=True))
+    ('transfer_only_existing', bpy.props.BoolProperty(name='Transfer only existing', default=True)),
+    ('transfer_to_all_selected', bpy.props.BoolProperty(name='Transfer to all selected', default=False)),
+    ('sync_drivers', bpy.props.BoolProperty(name='Sync only changed drivers', default=False)),
+    ('native_widgets', bpy.props.BoolProperty(name='Built-in widgets', default=True))
 ]
 
 class VIEW3D_MARCi:
@@ -35,6 +38,8 @@ class VIEW3D_PT_MARCi(VIEW3D_MARCi, bpy.types.Panel):
 
     def draw(self, context):
         self.layout.operator("view3d.constraint_bone_to_empty", text="Constraint bone to empty")
+        if hasattr(context.scene, 'marci_instrumentation'):
+            self.layout.prop(context.scene, 'marci_instrumentation')
 
 class VIEW3D_PT_MARCi_RENAME_BONES(VIEW3D_MARCi, bpy.types.Panel):
     bl_parent_id = "marci_panel"
@@ -62,7 +67,9 @@ class VIEW3D_PT_MARCI_BONE_SHAPES(VIEW3D_MARCi, bpy.types.Panel):
     bl_label = "Bone Shapes"
 
     def draw(self, context):
-        self.layout.label(text="Requires boneWidget")
+        self.layout.prop(context.scene, PROPS[3][0])
+        if not context.scene.native_widgets:
+            self.layout.label(text="Requires boneWidget")
         self.layout.operator("view3d.shape_arm_bones", text="Shape arm bones")
         self.layout.operator("view3d.shape_finger_bones", text="Shape finger bones")
         self.layout.operator("view3d.shape_spine_bones", text="Shape spine bones")
@@ -77,6 +84,11 @@ class VIEW3D_PT_MARCi_FIXES(VIEW3D_MARCi, bpy.types.Panel):
         self.layout.operator("view3d.fix_foot_driver", text="Fix Foot driver")
         self.layout.operator("view3d.fix_hand_driver", text="Fix hand driver")
         self.layout.operator("view3d.fix_shldr_driver", text="Fix shoulder driver")
+        self.layout.operator("view3d.fix_all_drivers", text="Fix all drivers")
+        self.layout.operator("view3d.analyze_drivers", text="Analyze drivers")
+        self.layout.operator("view3d.optimize_drivers", text="Optimize drivers")
+        self.layout.operator("view3d.profile_drivers", text="Profile drivers")
+        self.layout.operator("view3d.share_driver_values", text="Share driver values")
 
 class VIEW3D_PT_MARCi_TRANSFER_DRIVERS(VIEW3D_MARCi, bpy.types.Panel):
     bl_parent_id = "marci_panel"
@@ -84,7 +96,11 @@ class VIEW3D_PT_MARCi_TRANSFER_DRIVERS(VIEW3D_MARCi, bpy.types.Panel):
 
     def draw(self, context):
         self.layout.operator("view3d.transfer_drivers", text="Transfer drivers")
+        self.layout.operator("view3d.export_driver_library", text="Export driver library")
+        self.layout.operator("view3d.import_driver_library", text="Import driver library")
         self.layout.prop(context.scene, PROPS[0][0])
+        self.layout.prop(context.scene, PROPS[1][0])
+        self.layout.prop(context.scene, PROPS[2][0])
 
 
 classes = [VIEW3D_PT_MARCi,
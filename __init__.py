@@ -7,7 +7,7 @@ bl_info = {
     'version': '0.0.1'
 }
 
-modules_names = ['rigging', 'rename_bones', 'transfer_drivers', 'rig_shapes', 'bone_names', 'rig_utils']
+modules_names = ['rigging', 'rename_bones', 'transfer_drivers', 'rig_shapes', 'bone_names', 'rig_utils', 'rig_plan', 'driver_library', 'driver_fastpath', 'driver_profiler', 'shared_drivers', 'widget_meshes', 'instrumentation', 'backend', 'armature_model']
 
 modules_full_names = {}
 
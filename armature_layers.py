@@ -1,20 +1,88 @@
-import bpy
+from backend import bpy
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from rig_utils import objectmode, posemode, editmode
+
+
+class ArmatureState(NamedTuple):
+    """Snapshot of armature visibility, mirror settings, mode and bone selection"""
+    layers: tuple[bool, ...]
+    use_mirror_x: bool
+    mode: str
+    selection: dict[str, tuple[bool, bool, bool]]
+    active_bone: Optional[str]
+
+
+def set_if_changed(owner, attr: str, value):
+    """Writes value only if it differs, so unchanged data is not tagged for update"""
+    current = getattr(owner, attr)
+    if hasattr(current, '__len__') and not isinstance(current, str):
+        current = tuple(current)
+        value = tuple(value)
+    if current != value:
+        setattr(owner, attr, value)
+
 
 class ArmatureLayers:
     all_layers = [True for x in range(32)]
     none_layers = [False for x in range(32)]
-    current_layers: list[bool]
 
-    def show_all(self, armature: bpy.types.Armature):
-        self.current_layers = [*armature.layers]
-        armature.layers = self.all_layers.copy()
+    def __init__(self):
+        # Snapshots taken at outermost preserved() of each armature
+        self.snapshots: dict[int, ArmatureState] = {}
+        self.depth: dict[int, int] = {}
+
+    @contextmanager
+    def preserved(self, rig: bpy.types.Object, layers: Optional[list[bool]] = None,
+                  use_mirror_x: Optional[bool] = None):
+        """Shows given layers and sets mirror option for the duration of the block.
+        Blocks may nest, state is snapshotted at the outermost entry
+        and restored once at the outermost exit, writing only values that differ"""
+        key = rig.data.as_pointer()
+        if key not in self.snapshots:
+            self.snapshots[key] = self.snapshot(rig)
+            self.depth[key] = 0
+        self.depth[key] += 1
+        try:
+            if layers is not None:
+                set_if_changed(rig.data, 'layers', layers)
+            if use_mirror_x is not None:
+                set_if_changed(rig.data, 'use_mirror_x', use_mirror_x)
+            yield rig.data
+        finally:
+            self.depth[key] -= 1
+            if not self.depth[key]:
+                del self.depth[key]
+                self.restore(rig, self.snapshots.pop(key))
 
-    def restore_layers(self, armature: bpy.types.Armature):
-        armature.layers = self.current_layers
+    @staticmethod
+    def snapshot(rig: bpy.types.Object) -> ArmatureState:
+        armature = rig.data
+        bones = armature.edit_bones if rig.mode == 'EDIT' else armature.bones
+        selection = {bone.name: (bone.select, bone.select_head, bone.select_tail) for bone in bones}
+        active = bones.active.name if bones.active else None
+        return ArmatureState(tuple(armature.layers), armature.use_mirror_x, rig.mode, selection, active)
+
+    @staticmethod
+    def restore(rig: bpy.types.Object, state: ArmatureState):
+        armature = rig.data
+        set_if_changed(armature, 'layers', state.layers)
+        set_if_changed(armature, 'use_mirror_x', state.use_mirror_x)
+        bones = armature.edit_bones if rig.mode == 'EDIT' else armature.bones
+        unselected = (False, False, False)
+        for bone in bones:
+            selection = state.selection.get(bone.name, unselected)
+            if (bone.select, bone.select_head, bone.select_tail) != selection:
+                bone.select, bone.select_head, bone.select_tail = selection
+        active = bones.active.name if bones.active else None
+        if active != state.active_bone and (state.active_bone is None or state.active_bone in bones):
+            bones.active = bones[state.active_bone] if state.active_bone else None
+        if rig.mode != state.mode:
+            {'EDIT': editmode, 'POSE': posemode}.get(state.mode, objectmode)()
 
     def single_layer(self, layer: int) -> list[bool]:
         layers = self.none_layers.copy()
         layers[layer] = True
         return layers
-        
-armature_layers = ArmatureLayers()
\ No newline at end of file
+
+armature_layers = ArmatureLayers()
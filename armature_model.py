@@ -0,0 +1,662 @@
+"""Pure Python armature model for dry runs of rig plans and for running rig logic outside Blender.
+
+ModelRig mirrors the parts of armature objects rig helpers use: edit, data and pose bones
+(a single ModelBone plays all three), constraints, bone groups, layers and drivers.
+The module also provides stand-ins of bpy, Matrix and Vector: a context whose mode follows
+the active model rig and the operators rig helpers call on armatures, so rig_utils, rig_plan
+and rigging run unchanged against the model, see backend.py"""
+import math
+from types import SimpleNamespace
+from typing import Optional
+
+# First layer only, layers of bones created by edit_bones.new
+FIRST_LAYER = (True,) + (False,) * 31
+# Default constraint names which do not follow title case of the type
+CONSTRAINT_NAMES = {'IK': 'IK'}
+# Pose bone properties of bones which were never set
+POSE_DEFAULTS = {
+    'rotation_mode': 'QUATERNION',
+    'lock_location': (False, False, False),
+    'lock_rotation': (False, False, False),
+    'lock_rotation_w': False,
+    'lock_scale': (False, False, False),
+    'custom_shape_scale_xyz': (1.0, 1.0, 1.0),
+    'custom_shape_translation': (0.0, 0.0, 0.0),
+    'custom_shape_rotation_euler': (0.0, 0.0, 0.0)
+}
+
+
+class Vector:
+    """Three component mathutils.Vector stand-in, mutable like the original"""
+    __slots__ = ('co',)
+
+    def __init__(self, co=(0.0, 0.0, 0.0)):
+        self.co = [float(c) for c in co]
+
+    def __repr__(self):
+        return f"Vector(({self.co[0]:.4f}, {self.co[1]:.4f}, {self.co[2]:.4f}))"
+
+    def __iter__(self):
+        return iter(self.co)
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return self.co[index]
+
+    def __setitem__(self, index, value):
+        self.co[index] = float(value)
+
+    def __eq__(self, other):
+        return tuple(self.co) == tuple(other)
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self.co, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self.co, other))
+
+    def __mul__(self, factor: float):
+        return Vector(a * factor for a in self.co)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return self * -1
+
+    def dot(self, other) -> float:
+        return sum(a * b for a, b in zip(self.co, other))
+
+    def cross(self, other) -> 'Vector':
+        (ax, ay, az), (bx, by, bz) = self.co, tuple(other)
+        return Vector((ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx))
+
+    @property
+    def length(self) -> float:
+        return math.sqrt(self.dot(self))
+
+    def normalized(self) -> 'Vector':
+        size = self.length
+        return self * (1 / size) if size else Vector()
+
+    def copy(self) -> 'Vector':
+        return Vector(self.co)
+
+
+class Matrix:
+    """3x3 mathutils.Matrix stand-in stored by columns, enough for bone orientations"""
+    __slots__ = ('columns',)
+
+    def __init__(self, columns):
+        self.columns = tuple(Vector(column) for column in columns)
+
+    @classmethod
+    def Identity(cls, size: int) -> 'Matrix':
+        return cls(((1, 0, 0), (0, 1, 0), (0, 0, 1)))
+
+    def to_3x3(self) -> 'Matrix':
+        return self
+
+    def __matmul__(self, vec) -> Vector:
+        x, y, z = self.columns
+        vec = tuple(vec)
+        return x * vec[0] + y * vec[1] + z * vec[2]
+
+
+def rotated(vec: Vector, axis: Vector, angle: float) -> Vector:
+    """Rotates vec around normalized axis (Rodrigues formula)"""
+    cos, sin = math.cos(angle), math.sin(angle)
+    return vec * cos + axis.cross(vec) * sin + axis * (axis.dot(vec) * (1 - cos))
+
+
+def bone_matrix(head, tail, roll: float) -> Matrix:
+    """Rotation of edit bone, the way Blender derives it from head, tail and roll"""
+    y_axis = (Vector(tail) - Vector(head)).normalized()
+    if y_axis.length == 0:
+        return Matrix.Identity(3)
+    x, y, z = y_axis
+    theta = 1 + y
+    if theta > 1e-6:
+        x_axis = Vector((1 - x * x / theta, -x, -x * z / theta))
+        z_axis = Vector((-x * z / theta, -z, 1 - z * z / theta))
+    else:
+        # Bone points along -Y
+        x_axis, z_axis = Vector((-1, 0, 0)), Vector((0, 0, 1))
+    return Matrix((rotated(x_axis, y_axis, roll), y_axis, rotated(z_axis, y_axis, roll)))
+
+
+class PropsMixin:
+    """Keeps attributes without a slot in props, so arbitrary
+    constraint and pose properties can be set like on bpy structs"""
+    __slots__ = ()
+    DEFAULTS: dict = {}
+
+    def __getattr__(self, name: str):
+        try:
+            props = object.__getattribute__(self, 'props')
+        except AttributeError:
+            raise AttributeError(name) from None
+        if name in props:
+            return props[name]
+        if name in self.DEFAULTS:
+            return self.DEFAULTS[name]
+        raise AttributeError(f"{type(self).__name__} has no attribute {name}")
+
+    def __setattr__(self, name: str, value):
+        if hasattr(type(self), name):
+            object.__setattr__(self, name, value)
+        else:
+            self.props[name] = value
+
+
+class ModelConstraint(PropsMixin):
+    """Constraint of ModelBone, props hold attributes set by ConstraintSpec"""
+    __slots__ = ('name', 'type', 'props')
+
+    def __init__(self, name: str, type: str, props: Optional[dict] = None):
+        object.__setattr__(self, 'props', dict(props or {}))
+        self.name = name
+        self.type = type
+
+    def __repr__(self):
+        return f"ModelConstraint({self.name!r}, {self.type!r})"
+
+
+class ModelConstraints:
+    """Constraint stack of a bone, indexed by name or position like bpy collections"""
+    __slots__ = ('items',)
+
+    def __init__(self):
+        self.items: list[ModelConstraint] = []
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, name: str) -> bool:
+        return any(constraint.name == name for constraint in self.items)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.items[key]
+        for constraint in self.items:
+            if constraint.name == key:
+                return constraint
+        raise KeyError(key)
+
+    def unique_name(self, name: str) -> str:
+        names = {constraint.name for constraint in self.items}
+        unique, i = name, 0
+        while unique in names:
+            i += 1
+            unique = f"{name}.{i:03}"
+        return unique
+
+    def new(self, type: str) -> ModelConstraint:
+        name = CONSTRAINT_NAMES.get(type, type.replace('_', ' ').title())
+        constraint = ModelConstraint(self.unique_name(name), type)
+        self.items.append(constraint)
+        return constraint
+
+    def copy(self, constraint: ModelConstraint) -> ModelConstraint:
+        copied = ModelConstraint(self.unique_name(constraint.name), constraint.type, constraint.props)
+        self.items.append(copied)
+        return copied
+
+    def remove(self, constraint: ModelConstraint):
+        self.items.remove(constraint)
+
+    def move(self, from_index: int, to_index: int):
+        self.items.insert(to_index, self.items.pop(from_index))
+
+
+class ModelBone(PropsMixin):
+    """Bone with edit, data and pose properties in one object,
+    pose properties without a slot are kept in props"""
+    __slots__ = ('name', '_head', '_tail', 'roll', 'parent', '_layers', 'use_deform', 'use_connect',
+                 'use_inherit_rotation', 'inherit_scale', 'use_local_location', 'bbone_segments',
+                 'constraints', 'bone_group', 'custom_shape', 'select', 'select_head', 'select_tail', 'props')
+    DEFAULTS = POSE_DEFAULTS
+
+    def __init__(self, name: str):
+        object.__setattr__(self, 'props', {})
+        self.name = name
+        self.head = self.tail = (0.0, 0.0, 0.0)
+        self.roll = 0.0
+        self.parent: Optional[ModelBone] = None
+        self.layers = FIRST_LAYER
+        self.use_deform = True
+        self.use_connect = False
+        self.use_inherit_rotation = True
+        self.inherit_scale = 'FULL'
+        self.use_local_location = True
+        self.bbone_segments = 1
+        self.constraints = ModelConstraints()
+        self.bone_group = None
+        self.custom_shape = None
+        self.select = self.select_head = self.select_tail = False
+
+    def __repr__(self):
+        return f"ModelBone({self.name!r})"
+
+    @property
+    def head(self) -> Vector:
+        return self._head
+
+    @head.setter
+    def head(self, value):
+        self._head = Vector(value)
+
+    @property
+    def tail(self) -> Vector:
+        return self._tail
+
+    @tail.setter
+    def tail(self, value):
+        self._tail = Vector(value)
+
+    @property
+    def layers(self) -> list[bool]:
+        return self._layers
+
+    @layers.setter
+    def layers(self, value):
+        self._layers = list(value)
+
+    @property
+    def bone(self) -> 'ModelBone':
+        """Data bone of pose bone, the same object in the model"""
+        return self
+
+    @property
+    def vector(self) -> Vector:
+        return self._tail - self._head
+
+    @property
+    def length(self) -> float:
+        return self.vector.length
+
+    @length.setter
+    def length(self, value: float):
+        self.tail = self._head + self.vector.normalized() * value
+
+    @property
+    def matrix(self) -> Matrix:
+        return bone_matrix(self._head, self._tail, self.roll)
+
+    def translate(self, vec):
+        self.head = self._head + vec
+        self.tail = self._tail + vec
+
+
+class ModelBones:
+    """Name ordered bones, iterated and indexed by name like bpy bone collections.
+    Shared by data, edit and pose sides of the model"""
+    __slots__ = ('by_name', 'active')
+
+    def __init__(self):
+        self.by_name: dict[str, ModelBone] = {}
+        self.active: Optional[ModelBone] = None
+
+    def __iter__(self):
+        return iter(list(self.by_name.values()))
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def __getitem__(self, name: str) -> ModelBone:
+        return self.by_name[name]
+
+    def get(self, name: str, default=None) -> Optional[ModelBone]:
+        return self.by_name.get(name, default)
+
+    def keys(self):
+        return self.by_name.keys()
+
+    def new(self, name: str) -> ModelBone:
+        """Adds zero length bone at origin, existing names get .001 suffix like in Blender"""
+        unique, i = name, 0
+        while unique in self.by_name:
+            i += 1
+            unique = f"{name}.{i:03}"
+        bone = self.by_name[unique] = ModelBone(unique)
+        return bone
+
+    def remove(self, bone: ModelBone):
+        for child in self.by_name.values():
+            if child.parent is bone:
+                child.parent = bone.parent
+        del self.by_name[bone.name]
+
+
+class ModelGroup:
+    __slots__ = ('name', 'color_set')
+
+    def __init__(self, name: str, color_set: str = 'DEFAULT'):
+        self.name = name
+        self.color_set = color_set
+
+
+class ModelGroups:
+    """Bone groups of a pose, indexed by name or position"""
+    __slots__ = ('items',)
+
+    def __init__(self):
+        self.items: list[ModelGroup] = []
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.items[key]
+        group = self.get(key)
+        if group is None:
+            raise KeyError(key)
+        return group
+
+    def get(self, name: str, default=None) -> Optional[ModelGroup]:
+        return next((group for group in self.items if group.name == name), default)
+
+    def new(self, name: str = 'Group') -> ModelGroup:
+        group = ModelGroup(name)
+        self.items.append(group)
+        return group
+
+
+class ModelTarget:
+    __slots__ = ('id', 'id_type', 'bone_target', 'data_path', 'transform_type', 'transform_space', 'rotation_mode')
+
+    def __init__(self):
+        self.id = None
+        self.id_type = 'OBJECT'
+        self.bone_target = ''
+        self.data_path = ''
+        self.transform_type = 'LOC_X'
+        self.transform_space = 'WORLD_SPACE'
+        self.rotation_mode = 'AUTO'
+
+
+class ModelVariable:
+    __slots__ = ('name', 'type', 'targets')
+
+    def __init__(self, name: str = 'var'):
+        self.name = name
+        self.type = 'SINGLE_PROP'
+        self.targets = [ModelTarget(), ModelTarget()]
+
+
+class ModelVariables(list):
+    def new(self) -> ModelVariable:
+        self.append(ModelVariable())
+        return self[-1]
+
+
+class ModelDriver:
+    __slots__ = ('type', 'expression', 'variables')
+
+    def __init__(self):
+        self.type = 'SCRIPTED'
+        self.expression = ''
+        self.variables = ModelVariables()
+
+
+class ModelFCurve:
+    __slots__ = ('data_path', 'array_index', 'driver')
+
+    def __init__(self, data_path: str, array_index: int = 0):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.driver = ModelDriver()
+
+
+class ModelArmature:
+    __slots__ = ('name', 'bones', '_layers', 'use_mirror_x', 'animation_data')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.bones = ModelBones()
+        self.layers = FIRST_LAYER
+        self.use_mirror_x = False
+        self.animation_data: Optional[SimpleNamespace] = None
+
+    @property
+    def edit_bones(self) -> ModelBones:
+        return self.bones
+
+    @property
+    def layers(self) -> list[bool]:
+        return self._layers
+
+    @layers.setter
+    def layers(self, value):
+        self._layers = list(value)
+
+    def as_pointer(self) -> int:
+        return id(self)
+
+    def driver_add(self, data_path: str, index: int = -1) -> ModelFCurve:
+        if self.animation_data is None:
+            self.animation_data = SimpleNamespace(drivers=[])
+        fcurve = ModelFCurve(data_path, max(index, 0))
+        self.animation_data.drivers.append(fcurve)
+        return fcurve
+
+
+class ModelPose:
+    __slots__ = ('bones', 'bone_groups')
+
+    def __init__(self, bones: ModelBones):
+        self.bones = bones
+        self.bone_groups = ModelGroups()
+
+
+class ModelRig:
+    """Armature object of the model, accepted by plan_* functions and rig helpers,
+    edit_return_mode is the mode leaving edit mode returns to"""
+    __slots__ = ('name', 'data', 'pose', 'mode', 'edit_return_mode')
+    type = 'ARMATURE'
+
+    def __init__(self, name: str):
+        self.name = name
+        self.data = ModelArmature(name)
+        self.pose = ModelPose(self.data.bones)
+        self.mode = 'OBJECT'
+        self.edit_return_mode = 'OBJECT'
+
+    def __repr__(self):
+        return f"ModelRig({self.name!r}, {len(self.data.bones)} bones)"
+
+    @classmethod
+    def from_bones(cls, name: str, bones: list[tuple]) -> 'ModelRig':
+        """Builds rig from (name, parent, head, tail) or (name, parent, head, tail, roll),
+        parents listed before children"""
+        rig = cls(name)
+        edit_bones = rig.data.bones
+        for bone_name, parent, head, tail, *roll in bones:
+            bone = edit_bones.new(bone_name)
+            bone.head, bone.tail = head, tail
+            bone.roll = roll[0] if roll else 0.0
+            bone.parent = edit_bones[parent] if parent is not None else None
+        return rig
+
+    @classmethod
+    def from_rig(cls, rig) -> 'ModelRig':
+        """Snapshot of Blender armature object, read through data and pose bones without mode switches.
+        Constraint and driver targets are kept as names and bone targets only"""
+        model = cls(rig.name)
+        armature = rig.data
+        model.data.layers = armature.layers
+        model.data.use_mirror_x = armature.use_mirror_x
+        bones = model.data.bones
+        for source in armature.bones:
+            bone = bones.new(source.name)
+            bone.head, bone.tail = source.head_local, source.tail_local
+            bone.roll = source.AxisRollFromMatrix(source.matrix_local.to_3x3())[1]
+            bone.layers = source.layers
+            bone.use_deform = source.use_deform
+            bone.use_inherit_rotation = source.use_inherit_rotation
+        for source in armature.bones:
+            if source.parent is not None:
+                bones[source.name].parent = bones[source.parent.name]
+        groups = {}
+        for group in rig.pose.bone_groups:
+            groups[group.name] = model.pose.bone_groups.new(group.name)
+            groups[group.name].color_set = group.color_set
+        for pose_bone in rig.pose.bones:
+            bone = bones[pose_bone.name]
+            for constraint in pose_bone.constraints:
+                bone.constraints.items.append(ModelConstraint(constraint.name, constraint.type))
+            bone.bone_group = groups.get(pose_bone.bone_group.name) if pose_bone.bone_group else None
+            bone.custom_shape = pose_bone.custom_shape
+            bone.rotation_mode = pose_bone.rotation_mode
+        if armature.animation_data is not None:
+            for fcurve in armature.animation_data.drivers:
+                copied = model.data.driver_add(fcurve.data_path, fcurve.array_index).driver
+                copied.type, copied.expression = fcurve.driver.type, fcurve.driver.expression
+                for var in fcurve.driver.variables:
+                    copied_var = copied.variables.new()
+                    copied_var.name, copied_var.type = var.name, var.type
+                    copied_var.targets[0].bone_target = var.targets[0].bone_target
+        return model
+
+
+class Unavailable:
+    """Placeholder for Blender API which raises when called"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr: str):
+        return Unavailable(f"{self.name}.{attr}")
+
+    def __call__(self, *args, **kwargs):
+        raise RuntimeError(f"{self.name} is not available outside Blender")
+
+
+class StandInModule:
+    """Namespace of given members, other attributes are Unavailable"""
+
+    def __init__(self, name: str, **members):
+        self.name = name
+        vars(self).update(members)
+
+    def __getattr__(self, attr: str):
+        return Unavailable(f"{self.name}.{attr}")
+
+
+class StandInTypes:
+    """bpy.types stand-in returning a distinct class per type name"""
+
+    def __getattr__(self, name: str) -> type:
+        cls = type(name, (), {})
+        setattr(self, name, cls)
+        return cls
+
+
+class ModelContext:
+    """bpy.context stand-in, mode follows the active model rig"""
+
+    def __init__(self):
+        self.view_layer = SimpleNamespace(objects=SimpleNamespace(active=None), update=lambda: None)
+
+    @property
+    def active_object(self) -> Optional[ModelRig]:
+        return self.view_layer.objects.active
+
+    object = active_object
+
+    @property
+    def mode(self) -> str:
+        rig = self.active_object
+        if rig is None:
+            return 'OBJECT'
+        return {'EDIT': 'EDIT_ARMATURE', 'POSE': 'POSE'}.get(rig.mode, 'OBJECT')
+
+
+context = ModelContext()
+
+
+def active_rig() -> ModelRig:
+    rig = context.active_object
+    if rig is None:
+        raise RuntimeError("No active model rig, see backend.model_backend")
+    return rig
+
+
+def leave_edit(rig: ModelRig, mode: str):
+    """Commits edit bones, zero length bones are removed like in Blender"""
+    for bone in rig.data.bones:
+        if bone.length < 1e-6:
+            rig.data.bones.remove(bone)
+    rig.mode = mode
+
+
+def editmode_toggle():
+    rig = active_rig()
+    if rig.mode == 'EDIT':
+        leave_edit(rig, rig.edit_return_mode)
+    else:
+        rig.edit_return_mode = rig.mode
+        rig.mode = 'EDIT'
+    return {'FINISHED'}
+
+
+def posemode_toggle():
+    rig = active_rig()
+    if rig.mode == 'EDIT':
+        leave_edit(rig, 'POSE')
+    else:
+        rig.mode = 'OBJECT' if rig.mode == 'POSE' else 'POSE'
+    return {'FINISHED'}
+
+
+def select_all(action: str = 'TOGGLE'):
+    for bone in active_rig().data.bones:
+        bone.select = bone.select_head = bone.select_tail = action == 'SELECT'
+    return {'FINISHED'}
+
+
+def armature_apply(selected: bool = False):
+    """Model bones have no pose transforms, so rest pose stays as it is"""
+    return {'FINISHED'}
+
+
+def escape_identifier(name: str) -> str:
+    return name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+bpy = SimpleNamespace(
+    types=StandInTypes(),
+    props=SimpleNamespace(**{name: lambda **kwargs: None for name in (
+        'BoolProperty', 'IntProperty', 'FloatProperty', 'StringProperty',
+        'EnumProperty', 'PointerProperty', 'CollectionProperty')}),
+    context=context,
+    ops=StandInModule('bpy.ops',
+                      object=StandInModule('bpy.ops.object', editmode_toggle=editmode_toggle,
+                                           posemode_toggle=posemode_toggle),
+                      pose=StandInModule('bpy.ops.pose', select_all=select_all, armature_apply=armature_apply),
+                      armature=StandInModule('bpy.ops.armature', select_all=select_all)),
+    data=Unavailable('bpy.data'),
+    utils=StandInModule('bpy.utils', escape_identifier=escape_identifier),
+    app=SimpleNamespace(version=(0, 0, 0), version_string='model', background=True))
+
+
+class ExportHelper:
+    """bpy_extras.io_utils.ExportHelper stand-in"""
+
+
+class ImportHelper:
+    """bpy_extras.io_utils.ImportHelper stand-in"""
@@ -0,0 +1,55 @@
+"""Backend switch of rig modules: real bpy and mathutils inside Blender,
+armature_model stand-ins outside of it, so rig_utils, rig_plan and rigging
+import in plain CPython and run unchanged against armature_model.ModelRig.
+model_backend switches them to the model inside Blender too"""
+import os
+import sys
+from contextlib import contextmanager
+import armature_model
+
+try:
+    import bpy
+    from mathutils import Matrix, Vector
+    from bpy_extras.io_utils import ExportHelper, ImportHelper
+    IN_BLENDER = True
+except ImportError:
+    from armature_model import bpy, Matrix, Vector, ExportHelper, ImportHelper
+    IN_BLENDER = False
+
+# Modules whose bpy, Matrix and Vector model_backend swaps inside Blender
+BACKEND_MODULES = {'rig_utils', 'rig_plan', 'rigging', 'armature_layers'}
+MODEL_NAMES = {'bpy': armature_model.bpy, 'Matrix': armature_model.Matrix, 'Vector': armature_model.Vector}
+
+
+def backend_modules() -> list:
+    """Loaded BACKEND_MODULES living next to this one, with or without add-on package prefix"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    modules = []
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path and os.path.dirname(os.path.abspath(path)) == directory \
+                and module.__name__.rsplit('.', 1)[-1] in BACKEND_MODULES:
+            modules.append(module)
+    return modules
+
+
+@contextmanager
+def model_backend(rig: armature_model.ModelRig):
+    """Makes rig the active object of the model context for the duration of the block,
+    inside Blender rig modules use the model bpy, Matrix and Vector meanwhile"""
+    active = armature_model.context.view_layer.objects
+    previous = active.active
+    active.active = rig
+    swapped = []
+    if IN_BLENDER:
+        for module in backend_modules():
+            for name, value in MODEL_NAMES.items():
+                if name in vars(module):
+                    swapped.append((module, name, vars(module)[name]))
+                    setattr(module, name, value)
+    try:
+        yield rig
+    finally:
+        for module, name, value in swapped:
+            setattr(module, name, value)
+        active.active = previous
@@ -0,0 +1,118 @@
+"""Rigs many .blend files with MARCi in parallel background Blender processes:
+
+    python batch_rig.py figures/*.blend --output-dir rigged --workers 4 --timeout 600 --retries 1 --report report.json
+
+Every file is handled by batch_worker.py in its own Blender process,
+arguments after --worker-args are passed to the worker, e.g.
+--worker-args --steps add_root_bone,rig_arm.
+Rigged files go to --output-dir, input files are never overwritten,
+so retries always start from the unrigged file"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batch_worker.py')
+
+
+def collect_files(paths: list[str]) -> list[str]:
+    """Expands directories and glob patterns into .blend files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, '*.blend')))
+        else:
+            files += sorted(glob.glob(path)) or [path]
+    return files
+
+
+def output_paths(files: list[str], output_dir: str) -> dict[str, str]:
+    """Output file of every input under output_dir, keeping directories relative
+    to their common parent so inputs of the same name never share an output"""
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+    return {path: os.path.join(output_dir, os.path.relpath(os.path.abspath(path), root)) for path in files}
+
+
+def run_file(path: str, output: Optional[str], options: argparse.Namespace) -> dict:
+    """Runs worker on file, retrying failed and timed out attempts"""
+    worker_args = list(options.worker_args)
+    if output:
+        worker_args += ['--output', output]
+    attempts = []
+    for attempt in range(options.retries + 1):
+        fd, result_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        command = [options.blender, '-b', path, '--factory-startup', '--python-exit-code', '1',
+                   '--python', WORKER, '--',
+                   '--result', result_path] + worker_args
+        start = time.perf_counter()
+        entry = {'attempt': attempt + 1, 'returncode': None, 'error': None, 'steps': []}
+        try:
+            process = subprocess.run(command, capture_output=True, text=True, timeout=options.timeout)
+            entry['returncode'] = process.returncode
+            if os.path.getsize(result_path):
+                with open(result_path) as file:
+                    result = json.load(file)
+                entry['steps'] = result['steps']
+                entry['error'] = result['error']
+            if process.returncode != 0 and entry['error'] is None:
+                entry['error'] = process.stderr[-4000:] or f"Blender exited with code {process.returncode}"
+        except subprocess.TimeoutExpired:
+            entry['error'] = f"Timed out after {options.timeout} s"
+        finally:
+            os.remove(result_path)
+        entry['seconds'] = time.perf_counter() - start
+        attempts.append(entry)
+        if entry['error'] is None:
+            break
+    last = attempts[-1]
+    return {'file': path, 'ok': last['error'] is None, 'attempts': attempts,
+            'steps': last['steps'], 'error': last['error']}
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    worker_args = []
+    if '--worker-args' in argv:
+        index = argv.index('--worker-args')
+        argv, worker_args = argv[:index], argv[index + 1:]
+    parser = argparse.ArgumentParser(prog="batch_rig.py", description="Rig .blend files with MARCi in parallel")
+    parser.add_argument('paths', nargs='+', help=".blend files, directories or glob patterns")
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--timeout', type=float, default=600, help="seconds per attempt")
+    parser.add_argument('--retries', type=int, default=1)
+    parser.add_argument('--output-dir', help="where to save rigged files, required unless worker gets --no-save")
+    parser.add_argument('--report', default='marci_batch_report.json')
+    options = parser.parse_args(argv)
+    options.worker_args = worker_args
+    if not options.output_dir and '--no-save' not in worker_args:
+        parser.error("--output-dir is required unless --worker-args --no-save is given")
+    return options
+
+
+def main(argv: list[str] = None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    files = list(dict.fromkeys(os.path.abspath(path) for path in collect_files(options.paths)))
+    outputs = output_paths(files, options.output_dir) if options.output_dir and files else {}
+    for output in outputs.values():
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(options.workers, 1)) as pool:
+        results = list(pool.map(lambda path: run_file(path, outputs.get(path), options), files))
+    report = {'seconds': time.perf_counter() - start, 'workers': options.workers,
+              'failed': sum(not result['ok'] for result in results), 'files': results}
+    with open(options.report, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Rigged {len(files) - report['failed']}/{len(files)} files in {report['seconds']:.1f} s, "
+          f"report written to {options.report}")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
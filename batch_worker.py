@@ -0,0 +1,137 @@
+"""Applies MARCi steps to the opened file, meant for background Blender:
+
+    blender -b figure.blend --python batch_worker.py -- --steps add_root_bone,rig_arm --output rigged.blend --result result.json
+
+Writes per-step timings and the first failure to the result file,
+exits with non-zero code if a step failed. The opened file is never overwritten,
+so a retry after a failure or timeout starts from the unrigged file again"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bpy
+from rigging import *
+from transfer_drivers import Params, stamp_driver_templates, sync_driver_templates, TransferReport
+from driver_library import load_driver_library
+
+
+def transfer_drivers_step(rig: bpy.types.Object, options: argparse.Namespace):
+    """Stamps driver library onto shape keys of meshes parented to rig"""
+    if not options.driver_library:
+        raise ValueError("transfer_drivers step needs --driver-library")
+    templates = load_driver_library(options.driver_library)
+    params = Params(options.transfer_only_existing)
+    report = TransferReport()
+    for child in rig.children:
+        dstkey = getattr(child.data, 'shape_keys', None)
+        if dstkey is None:
+            continue
+        if options.sync_drivers:
+            sync_driver_templates(templates, dstkey, rig, params, report)
+        else:
+            stamp_driver_templates(templates, dstkey, rig, params, report)
+    print(report.summary())
+
+
+# Step name -> function of (rig, options)
+STEPS = {
+    'add_root_bone': lambda rig, options: add_root_bone(rig),
+    'create_bone_groups': lambda rig, options: create_bone_groups(bpy.context),
+    'rig_arm': lambda rig, options: rig_arm(rig),
+    'add_finger_controller': lambda rig, options: add_finger_controller(bpy.context),
+    'rig_leg': lambda rig, options: execute_plan(rig, plan_leg_with_pole(rig)),
+    'rig_foot_rocker': lambda rig, options: rig_foot_rocker(rig),
+    'fix_hand_driver': lambda rig, options: fix_hand_driver(rig),
+    'fix_foot_driver': lambda rig, options: fix_foot_driver(rig),
+    'fix_shldr_driver': lambda rig, options: fix_shldr_driver(rig),
+    'fix_all_drivers': lambda rig, options: fix_all_drivers(rig),
+    'transfer_drivers': transfer_drivers_step
+}
+DEFAULT_STEPS = ['add_root_bone', 'create_bone_groups', 'rig_arm', 'rig_leg', 'rig_foot_rocker', 'fix_all_drivers']
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="batch_worker.py")
+    parser.add_argument('--steps', default=','.join(DEFAULT_STEPS),
+                        help=f"comma separated steps out of {', '.join(STEPS)}")
+    parser.add_argument('--rig', help="armature object name, first armature by default")
+    parser.add_argument('--result', help="JSON file receiving step timings")
+    parser.add_argument('--output', help="where to save rigged file, required unless --no-save is given")
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--driver-library', help="driver library used by transfer_drivers step")
+    parser.add_argument('--transfer-only-existing', action='store_true')
+    parser.add_argument('--sync-drivers', action='store_true')
+    options = parser.parse_args(argv)
+    if not options.output and not options.no_save:
+        parser.error("--output is required unless --no-save is given")
+    return options
+
+
+def find_rig(name: Optional[str]) -> bpy.types.Object:
+    if name:
+        return bpy.data.objects[name]
+    return next(obj for obj in bpy.data.objects if obj.type == 'ARMATURE')
+
+
+def save_rigged(filepath: str):
+    """Saves a copy to a temporary file next to filepath and renames it over filepath
+    only once saving succeeded, so a killed worker never leaves a partly written file"""
+    temporary = f"{os.path.splitext(filepath)[0]}.{os.getpid()}.tmp.blend"
+    try:
+        bpy.ops.wm.save_as_mainfile(filepath=temporary, copy=True)
+        os.replace(temporary, filepath)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def run_steps(options: argparse.Namespace) -> dict:
+    result = {'file': bpy.data.filepath, 'steps': [], 'error': None}
+    try:
+        if options.output and os.path.abspath(options.output) == os.path.abspath(bpy.data.filepath):
+            raise ValueError("--output is the opened file, a retry would rig it again")
+        steps = [step.strip() for step in options.steps.split(',') if step.strip()]
+        unknown = [step for step in steps if step not in STEPS]
+        if unknown:
+            raise ValueError(f"Unknown steps: {', '.join(unknown)}")
+        rig = find_rig(options.rig)
+        bpy.context.view_layer.objects.active = rig
+        rig.select_set(True)
+        for step in steps:
+            start = time.perf_counter()
+            try:
+                with al.preserved(rig, al.all_layers):
+                    STEPS[step](rig, options)
+            except Exception:
+                result['steps'].append({'name': step, 'seconds': time.perf_counter() - start,
+                                        'error': traceback.format_exc()})
+                raise
+            result['steps'].append({'name': step, 'seconds': time.perf_counter() - start, 'error': None})
+        objectmode()
+        if not options.no_save:
+            save_rigged(options.output)
+    except Exception:
+        result['error'] = traceback.format_exc()
+    return result
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    options = parse_args(argv)
+    result = run_steps(options)
+    if options.result:
+        with open(options.result, 'w') as file:
+            json.dump(result, file, indent=2)
+    if result['error']:
+        print(result['error'], file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Times MARCi operations on synthetic Genesis-like figures, meant for background Blender:
+
+    blender -b --factory-startup --python benchmark.py -- --scales 1,4,16 --output bench.json
+    blender -b --factory-startup --python benchmark.py -- --compare bench.json
+    python benchmark.py --model --scales 1,4,16
+
+Every scale multiplies filler drivers, shape keys and mesh density,
+results of a previous run given by --compare are reported as ratios.
+With --model, or outside Blender, rig steps run on armature_model figures"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from contextlib import nullcontext
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import armature_model
+from backend import bpy, IN_BLENDER, model_backend
+from armature_model import ModelRig
+from rigging import *
+if IN_BLENDER:
+    from rename_bones import rename_armature_bones, blender_to_daz, daz_to_blender
+    from transfer_drivers import Params, read_driver_templates, stamp_driver_templates
+
+# Ratio to previous run above which a step is reported as regression
+REGRESSION_RATIO = 1.2
+BONE_LENGTH = 0.08
+
+
+def figure_bones() -> list[tuple[str, Optional[str], tuple, tuple]]:
+    """(name, parent, head, tail) of Genesis-like skeleton built from bone_names"""
+    bones = [(SPINE_BONES[0], None, (0, 0, 1.0), (0, 0, 1.08))]
+    z = 1.0
+    for parent, name in zip(SPINE_BONES, SPINE_BONES[1:]):
+        z += BONE_LENGTH
+        bones.append((name, parent, (0, 0, z), (0, 0, z + BONE_LENGTH)))
+    for side in SIDES:
+        x = 1 if side() == '.L' else -1
+        chest = SPINE_BONES[5]
+        bones.append((side(PECTORAL), chest, (0.08 * x, -0.08, 1.35), (0.08 * x, -0.12, 1.35)))
+        bones.append((side(COLLAR), chest, (0.02 * x, 0, 1.42), (0.15 * x, 0, 1.42)))
+        parent, head = side(COLLAR), 0.15
+        for name in ARM_BONES + [HAND]:
+            bones.append((side(name), parent, (head * x, 0, 1.42), ((head + 0.12) * x, 0, 1.42)))
+            parent, head = side(name), head + 0.12
+        for j, finger in enumerate(FINGERS):
+            parent, tip = side(HAND), head + 0.12
+            for i in range(1, 4):
+                y = (j - 2) * 0.02
+                bones.append((side(f"{finger}{i}"), parent, (tip * x, y, 1.42), ((tip + 0.025) * x, y, 1.42)))
+                parent, tip = side(f"{finger}{i}"), tip + 0.025
+        parent, z = SPINE_BONES[1], 0.95
+        for name in LEG_BONES:
+            bones.append((side(name), parent, (0.1 * x, 0, z), (0.1 * x, 0.01, z - 0.22)))
+            parent, z = side(name), z - 0.22
+        bones.append((side(FOOT), side(LEG_BONES[2]), (0.1 * x, 0.01, 0.08), (0.1 * x, -0.1, 0.02)))
+        bones.append((side(METATARSALS), side(FOOT), (0.1 * x, 0.01, 0.05), (0.1 * x, -0.08, 0.02)))
+        bones.append((side(TOE), side(FOOT), (0.1 * x, -0.1, 0.02), (0.1 * x, -0.15, 0.02)))
+        for j, toe in enumerate(TOES):
+            offset = 0.1 * x + (j - 2) * 0.01
+            bones.append((side(toe), side(TOE), (offset, -0.15, 0.02), (offset, -0.17, 0.02)))
+            bones.append((side(toe + '_2'), side(toe), (offset, -0.17, 0.02), (offset, -0.19, 0.02)))
+    return bones
+
+
+def corrective_names() -> list[str]:
+    """Driven properties touched by fix_*_driver"""
+    names = []
+    for side in SIDES:
+        rules = hand_driver_rules(side) + foot_driver_rules(side) + shldr_driver_rules(side)
+        names += [rule.match for rule in rules]
+    return names
+
+
+def add_driver(owner: bpy.types.ID, data_path: str, rig: bpy.types.Object, bone_name: str):
+    driver = owner.driver_add(data_path).driver
+    driver.type = 'SCRIPTED'
+    var = driver.variables.new()
+    var.name = 'A'
+    var.type = 'TRANSFORMS'
+    var.targets[0].id = rig
+    var.targets[0].bone_target = bone_name
+    var.targets[0].transform_type = 'ROT_X'
+    var.targets[0].transform_space = 'LOCAL_SPACE'
+    driver.expression = 'A'
+
+
+def build_mesh(name: str, rig: bpy.types.Object, vertices: int, shape_keys: int) -> bpy.types.Object:
+    """Grid mesh parented to rig with driven shape keys"""
+    side = int(np.sqrt(vertices))
+    grid = np.stack(np.meshgrid(np.linspace(-0.5, 0.5, side), np.linspace(0, 1.8, side)), -1).reshape(-1, 2)
+    coords = np.zeros((len(grid), 3), dtype=np.float32)
+    coords[:, 0], coords[:, 2] = grid[:, 0], grid[:, 1]
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(coords))
+    mesh.vertices.foreach_set('co', coords.ravel())
+    mesh.update()
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    obj.parent = rig
+    obj.shape_key_add(name='Basis')
+    bone_names = [bone.name for bone in rig.data.bones]
+    for i in range(shape_keys):
+        key = obj.shape_key_add(name=f"pJCMBench_{i}", from_mix=False)
+        key.data.foreach_set('co', (coords + np.float32(0.001)).ravel())
+        add_driver(mesh.shape_keys, f'key_blocks["{key.name}"].value', rig, bone_names[i % len(bone_names)])
+    return obj
+
+
+def build_figure(scale: int, drivers: int, shape_keys: int, vertices: int) -> tuple[bpy.types.Object, list]:
+    """Creates armature, correctives, filler drivers and two meshes for transfer"""
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    armature = bpy.data.armatures.new("Genesis")
+    rig = bpy.data.objects.new("Genesis", armature)
+    bpy.context.scene.collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    rig.select_set(True)
+    with edit_session(rig) as edit_bones:
+        for name, parent, head, tail in figure_bones():
+            bone = edit_bones.new(name)
+            bone.head, bone.tail = head, tail
+            if parent is not None:
+                bone.parent = edit_bones[parent]
+    objectmode()
+    bone_names = [bone.name for bone in armature.bones]
+    for i, name in enumerate(corrective_names() + [f"pJCMFiller_{i}(fin)" for i in range(drivers * scale)]):
+        armature[name] = 0.0
+        add_driver(armature, f'["{name}"]', rig, bone_names[i % len(bone_names)])
+    source = build_mesh("Body", rig, vertices * scale, shape_keys * scale)
+    target = build_mesh("Body.transfer", rig, vertices * scale, 0)
+    for key in source.data.shape_keys.key_blocks[1:]:
+        target.shape_key_add(name=key.name, from_mix=False)
+    return rig, [source, target]
+
+
+def build_model_figure(scale: int, drivers: int) -> tuple[ModelRig, list]:
+    """Model counterpart of build_figure, drivers without meshes"""
+    rig = ModelRig.from_bones("Genesis", figure_bones())
+    bone_names = list(rig.data.bones.keys())
+    for i, name in enumerate(corrective_names() + [f"pJCMFiller_{i}(fin)" for i in range(drivers * scale)]):
+        add_driver(rig.data, f'["{name}"]', rig, bone_names[i % len(bone_names)])
+    return rig, []
+
+
+def transfer_step(rig: bpy.types.Object, meshes: list):
+    source, target = meshes
+    templates = read_driver_templates(source.data.shape_keys)
+    stamp_driver_templates(templates, target.data.shape_keys, rig, Params(True))
+
+
+def rename_step(rig: bpy.types.Object, meshes: list):
+    rename_armature_bones(rig, blender_to_daz)
+    rename_armature_bones(rig, daz_to_blender)
+
+
+def context_step(function):
+    return lambda rig, meshes: function(armature_model.context if isinstance(rig, ModelRig) else bpy.context)
+
+
+def rig_step(function):
+    return lambda rig, meshes: function(rig)
+
+
+# Steps run in order on the same figure, later steps rely on bones of earlier ones
+STEPS = [
+    ('add_root_bone', rig_step(add_root_bone)),
+    ('create_bone_groups', context_step(create_bone_groups)),
+    ('rig_arm', rig_step(rig_arm)),
+    ('rig_leg', lambda rig, meshes: execute_plan(rig, plan_leg_with_pole(rig))),
+    ('rig_foot_rocker', rig_step(rig_foot_rocker)),
+    ('add_finger_controller', context_step(add_finger_controller)),
+    ('fix_hand_driver', rig_step(fix_hand_driver)),
+    ('fix_foot_driver', rig_step(fix_foot_driver)),
+    ('fix_shldr_driver', rig_step(fix_shldr_driver)),
+    ('transfer_drivers', transfer_step),
+    ('rename', rename_step)
+]
+# Steps which only use rig helpers, so they run on armature_model figures
+MODEL_STEPS = {'add_root_bone', 'create_bone_groups', 'rig_arm', 'rig_leg', 'rig_foot_rocker',
+               'add_finger_controller', 'fix_hand_driver', 'fix_foot_driver', 'fix_shldr_driver'}
+
+
+def run_scale(scale: int, options: argparse.Namespace) -> dict:
+    """Runs all steps on fresh figures, keeping the best time of each step.
+    A failing step is recorded with its error and the run goes on with the next one"""
+    timings = {}
+    errors = {}
+    steps = [(name, step) for name, step in STEPS if not options.model or name in MODEL_STEPS]
+    for _ in range(options.repeats):
+        if options.model:
+            rig, meshes = build_model_figure(scale, options.drivers)
+        else:
+            rig, meshes = build_figure(scale, options.drivers, options.shape_keys, options.vertices)
+        with model_backend(rig) if options.model else nullcontext():
+            for name, step in steps:
+                start = time.perf_counter()
+                try:
+                    step(rig, meshes)
+                except Exception as error:
+                    problems = error.errors if isinstance(error, PreflightError) else [repr(error)]
+                    errors.setdefault(name, problems)
+                    objectmode()
+                    continue
+                seconds = time.perf_counter() - start
+                timings[name] = min(timings.get(name, seconds), seconds)
+                objectmode()
+    return {
+        'scale': scale,
+        'bones': len(rig.data.bones),
+        'drivers': len(rig.data.animation_data.drivers),
+        'shape_keys': len(meshes[0].data.shape_keys.key_blocks) - 1 if meshes else 0,
+        'vertices': len(meshes[0].data.vertices) if meshes else 0,
+        'timings': timings,
+        'total': sum(timings.values()),
+        'errors': errors
+    }
+
+
+def compare(results: dict, previous: dict) -> list[str]:
+    """Lists steps slower than previous run by more than REGRESSION_RATIO,
+    and steps which passed before and fail or are missing now"""
+    lines = []
+    previous_scales = {entry['scale']: entry for entry in previous['scales']}
+    for entry in results['scales']:
+        old = previous_scales.get(entry['scale'])
+        if old is None:
+            continue
+        for step, seconds in entry['timings'].items():
+            before = old['timings'].get(step)
+            if not before:
+                continue
+            ratio = seconds / before
+            mark = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+            lines.append(f"x{entry['scale']} {step}: {before:.4f} s -> {seconds:.4f} s ({ratio:.2f}x){mark}")
+        errors = entry.get('errors', {})
+        for step, before in old['timings'].items():
+            if step in entry['timings']:
+                continue
+            reason = "; ".join(errors[step]) if step in errors else "not run"
+            lines.append(f"x{entry['scale']} {step}: {before:.4f} s -> FAILED ({reason})  REGRESSION")
+    return lines
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="benchmark.py")
+    parser.add_argument('--scales', default='1,4,16', help="comma separated scale factors")
+    parser.add_argument('--drivers', type=int, default=200, help="filler armature drivers per scale")
+    parser.add_argument('--shape-keys', type=int, default=50, help="driven shape keys per scale")
+    parser.add_argument('--vertices', type=int, default=10000, help="mesh vertices per scale")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default='marci_benchmark.json')
+    parser.add_argument('--compare', help="previous results to compare with")
+    parser.add_argument('--model', action='store_true', help="run rig steps on armature model")
+    options = parser.parse_args(argv)
+    options.model = options.model or not IN_BLENDER
+    return options
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:] if not IN_BLENDER else []
+    options = parse_args(argv)
+    previous = None
+    if options.compare:
+        with open(options.compare) as file:
+            previous = json.load(file)
+    results = {
+        'blender': bpy.app.version_string if not options.model else 'model',
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'options': vars(options),
+        'scales': [run_scale(int(scale), options) for scale in options.scales.split(',')]
+    }
+    with open(options.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    for entry in results['scales']:
+        print(f"x{entry['scale']}: {entry['bones']} bones, {entry['drivers']} drivers, "
+              f"{entry['shape_keys']} shape keys, {entry['total']:.3f} s")
+        for step, problems in entry['errors'].items():
+            print(f"  {step} failed: " + "; ".join(problems))
+    if previous is not None:
+        print("\n".join(compare(results, previous)))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,15 @@ class BoneGroups:
     sk_ctrl = 'Shapekey Controllers'
     fk_wo_ik = 'Forward Kinematics (w/o IK)'
 
+# Color sets of bone groups created by create_bone_groups
+BONE_GROUP_COLORS = {
+    BoneGroups.ctrl: 'THEME03',
+    BoneGroups.poles: 'THEME06',
+    BoneGroups.fk: 'THEME09',
+    BoneGroups.sk_ctrl: 'THEME01',
+    BoneGroups.fk_wo_ik: 'THEME04'
+}
+
 def left_bone(bone = ""):
     return bone + ".L"
 
@@ -39,4 +48,6 @@ FOOT_BONES = [FOOT, METATARSALS, TOE]
 SPINE_BONES = ["hip", "pelvis", "abdomenLower", "abdomenUpper", 
                "chestLower", "chestUpper", "neckLower", "neckUpper", "head"]
 PECTORAL = "Pectoral"
-COLLAR = "Collar"
\ No newline at end of file
+COLLAR = "Collar"
+# Helper bone holding driver values shared by several drivers
+SHARED_VALUES = "Shared.Values"
\ No newline at end of file
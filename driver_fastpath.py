@@ -0,0 +1,224 @@
+import ast
+from backend import bpy
+from typing import Optional
+
+# Functions Blender evaluates natively in simple expressions
+SIMPLE_FUNCTIONS = {
+    'abs', 'fabs', 'floor', 'ceil', 'trunc', 'round', 'int', 'sin', 'cos', 'tan', 'asin', 'acos', 'atan',
+    'atan2', 'exp', 'log', 'sqrt', 'pow', 'fmod', 'min', 'max', 'radians', 'degrees', 'signum',
+    'clamp', 'lerp', 'smoothstep', 'compatible_bool', 'bool'
+}
+# Constants available in simple expressions
+SIMPLE_CONSTANTS = {'pi'}
+# Modules whose functions are moved out of attribute access, e.g. math.sin(A) -> sin(A)
+NAMESPACES = {'math', 'bpy.app.driver_namespace'}
+
+
+class FastPathReport:
+    """Collects drivers evaluated by Python and drivers moved to the fast path"""
+
+    def __init__(self):
+        self.native = 0
+        self.simple = 0
+        self.python: dict[str, list[str]] = {}
+        self.moved: dict[str, list[str]] = {}
+
+    def slow(self, owner: bpy.types.ID, fcurve: bpy.types.FCurve):
+        self.python.setdefault(owner.name, []).append(f"{fcurve.data_path}: {fcurve.driver.expression}")
+
+    def move(self, owner: bpy.types.ID, fcurve: bpy.types.FCurve, how: str):
+        self.moved.setdefault(owner.name, []).append(f"{fcurve.data_path} -> {how}")
+
+    def summary(self) -> str:
+        python = sum(len(paths) for paths in self.python.values())
+        moved = sum(len(paths) for paths in self.moved.values())
+        lines = [f"Moved {moved} drivers to fast path, {python} left on Python, "
+                 f"{self.simple} simple expressions, {self.native} native"]
+        for owner, paths in self.moved.items():
+            lines.append(f"  {owner} moved ({len(paths)}): {', '.join(paths)}")
+        for owner, paths in self.python.items():
+            lines.append(f"  {owner} Python ({len(paths)}): {', '.join(paths)}")
+        return "\n".join(lines)
+
+
+def driver_owners(objects: list[bpy.types.Object]) -> list[bpy.types.ID]:
+    """Returns armatures and shape keys of objects and of meshes parented to armatures"""
+    owners = []
+    for obj in objects:
+        candidates = [obj.data]
+        if obj.type == 'ARMATURE':
+            candidates += [child.data.shape_keys for child in obj.children if child.type == 'MESH']
+        elif obj.type == 'MESH':
+            candidates = [obj.data.shape_keys]
+        for owner in candidates:
+            if owner is not None and owner.animation_data is not None and owner not in owners:
+                owners.append(owner)
+    return owners
+
+
+def is_python_driver(driver: bpy.types.Driver) -> bool:
+    """True when Blender falls back to Python interpreter to evaluate driver"""
+    return driver.type == 'SCRIPTED' and (driver.use_self or not driver.is_simple_expression)
+
+
+def is_identity(fcurve: bpy.types.FCurve) -> bool:
+    """True when fcurve passes driver value through unchanged"""
+    return not fcurve.keyframe_points and not fcurve.modifiers
+
+
+def linear_form(node: ast.AST, names: set[str]) -> Optional[tuple[dict[str, float], float]]:
+    """Returns expression as ({variable: coefficient}, constant)
+    or None if it is not a linear combination of variables"""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return {}, float(node.value)
+    if isinstance(node, ast.Name):
+        return ({node.id: 1.0}, 0.0) if node.id in names else None
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        form = linear_form(node.operand, names)
+        if form is None or isinstance(node.op, ast.UAdd):
+            return form
+        return {name: -k for name, k in form[0].items()}, -form[1]
+    if not isinstance(node, ast.BinOp):
+        return None
+    left, right = linear_form(node.left, names), linear_form(node.right, names)
+    if left is None or right is None:
+        return None
+    if isinstance(node.op, (ast.Add, ast.Sub)):
+        sign = 1.0 if isinstance(node.op, ast.Add) else -1.0
+        coefficients = dict(left[0])
+        for name, k in right[0].items():
+            coefficients[name] = coefficients.get(name, 0.0) + sign * k
+        return coefficients, left[1] + sign * right[1]
+    if isinstance(node.op, ast.Mult) and not (left[0] and right[0]):
+        (coefficients, constant), scale = (left, right[1]) if left[0] else (right, left[1])
+        return {name: k * scale for name, k in coefficients.items()}, constant * scale
+    if isinstance(node.op, ast.Div) and not right[0] and right[1] != 0:
+        return {name: k / right[1] for name, k in left[0].items()}, left[1] / right[1]
+    return None
+
+
+class SimpleExpression(ast.NodeTransformer):
+    """Rewrites Python only syntax to its simple expression counterpart:
+    math.sin(A) -> sin(A), A ** 2 -> pow(A, 2)"""
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Attribute) and ast.unparse(node.func.value) in NAMESPACES \
+                and node.func.attr in SIMPLE_FUNCTIONS:
+            node.func = ast.Name(node.func.attr, ast.Load())
+        return node
+
+    def visit_Attribute(self, node: ast.Attribute):
+        self.generic_visit(node)
+        if ast.unparse(node.value) in NAMESPACES and node.attr in SIMPLE_CONSTANTS:
+            return ast.Name(node.attr, ast.Load())
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.Call(ast.Name('pow', ast.Load()), [node.left, node.right], [])
+        return node
+
+
+def rewrite_as_native(fcurve: bpy.types.FCurve) -> Optional[str]:
+    """Turns driver with linear expression over all of its variables
+    with equal weights into SUM or AVERAGE driver,
+    remaining scale and offset go to a generator modifier of fcurve"""
+    driver = fcurve.driver
+    names = {var.name for var in driver.variables}
+    if not names or not is_identity(fcurve):
+        return None
+    try:
+        form = linear_form(ast.parse(driver.expression, mode='eval').body, names)
+    except SyntaxError:
+        return None
+    if form is None or set(form[0]) != names or len(set(form[0].values())) != 1:
+        return None
+    scale, offset = next(iter(form[0].values())), form[1]
+    driver_type, how = 'SUM', 'SUM'
+    if abs(scale * len(names) - 1.0) < 1e-6:
+        driver_type, scale, how = 'AVERAGE', 1.0, 'AVERAGE'
+    driver.type = driver_type
+    if abs(scale - 1.0) > 1e-6 or offset:
+        generator = fcurve.modifiers.new('GENERATOR')
+        generator.mode = 'POLYNOMIAL'
+        generator.poly_order = 1
+        generator.coefficients = (offset, scale)
+        how += f" {scale:g}*x{offset:+g}"
+    return how
+
+
+def rewrite_as_simple(fcurve: bpy.types.FCurve) -> Optional[str]:
+    """Rewrites expression to simple expression form,
+    keeps original expression if Blender still can not evaluate it natively"""
+    driver = fcurve.driver
+    expression = driver.expression
+    try:
+        tree = SimpleExpression().visit(ast.parse(expression, mode='eval'))
+    except SyntaxError:
+        return None
+    driver.expression = ast.unparse(ast.fix_missing_locations(tree))
+    if driver.is_simple_expression:
+        return driver.expression
+    driver.expression = expression
+    return None
+
+
+def optimize_drivers(owners: list[bpy.types.ID], rewrite: bool = True) -> FastPathReport:
+    """Reports drivers evaluated by Python and, if rewrite is set,
+    moves the ones that can be safely rewritten to the fast path"""
+    report = FastPathReport()
+    for owner in owners:
+        for fcurve in owner.animation_data.drivers:
+            driver = fcurve.driver
+            if driver.type != 'SCRIPTED':
+                report.native += 1
+                continue
+            if not is_python_driver(driver):
+                report.simple += 1
+                continue
+            how = None
+            if rewrite and not driver.use_self:
+                how = rewrite_as_native(fcurve) or rewrite_as_simple(fcurve)
+            if how is None:
+                report.slow(owner, fcurve)
+            else:
+                report.move(owner, fcurve, how)
+    return report
+
+
+class AnalyzeDrivers(bpy.types.Operator):
+    """Lists drivers of selected armatures and their meshes evaluated by Python"""
+    bl_label = "Analyze drivers"
+    bl_idname = "view3d.analyze_drivers"
+
+    def execute(self, context: bpy.types.Context):
+        report = optimize_drivers(driver_owners(context.selected_objects), rewrite=False)
+        print(report.summary())
+        self.report({'INFO'}, report.summary().splitlines()[0])
+        return {'FINISHED'}
+
+
+class OptimizeDrivers(bpy.types.Operator):
+    """Rewrites drivers of selected armatures and their meshes to be evaluated without Python"""
+    bl_label = "Optimize drivers"
+    bl_idname = "view3d.optimize_drivers"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context: bpy.types.Context):
+        report = optimize_drivers(driver_owners(context.selected_objects))
+        print(report.summary())
+        self.report({'INFO'}, report.summary().splitlines()[0])
+        return {'FINISHED'}
+
+
+classes = [AnalyzeDrivers, OptimizeDrivers]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
@@ -0,0 +1,168 @@
+import mmap
+import numpy as np
+from backend import bpy, ExportHelper, ImportHelper
+from transfer_drivers import *
+
+# Driver library layout: MAGIC, uint64 element count of every section,
+# then sections in SECTIONS order, each padded to 8 bytes.
+# All strings live in one table and are referenced by index (-1 for None),
+# keyframe properties are stored as flat arrays shared by all drivers
+MAGIC = b'MARCiDL1'
+DRIVER_COLUMNS = 7      # data_path, type, expression, first variable, variables, first keyframe, keyframes
+VARIABLE_COLUMNS = 4    # name, type, first target, targets
+TARGET_COLUMNS = 7      # id_type, id name, data_path, bone_target, transform_space, transform_type, rotation_mode
+SECTIONS = [('string_offsets', np.uint32), ('string_data', np.uint8),
+            ('drivers', np.int32), ('variables', np.int32), ('targets', np.int32)]
+SECTIONS += [(prop, dtype) for prop, _, dtype in KEYFRAME_PROPS]
+
+# bpy.data collections of driver target id types, used to resolve ids by name
+ID_COLLECTIONS = {
+    'OBJECT': 'objects',
+    'MESH': 'meshes',
+    'ARMATURE': 'armatures',
+    'KEY': 'shape_keys',
+    'MATERIAL': 'materials',
+    'SCENE': 'scenes',
+    'WORLD': 'worlds',
+    'TEXTURE': 'textures',
+    'NODETREE': 'node_groups'
+}
+
+def save_driver_library(templates: list[DriverTemplate], filepath: str):
+    """Writes driver templates to compact binary library"""
+    strings = {}
+    def string(value):
+        return -1 if value is None else strings.setdefault(value, len(strings))
+
+    drivers, variables, targets = [], [], []
+    keyframes = {prop: [] for prop, _, _ in KEYFRAME_PROPS}
+    first_keyframe = 0
+    for template in templates:
+        count = len(template.keyframes['co']) // 2
+        drivers.append((string(template.data_path), string(template.type), string(template.expression),
+                        len(variables), len(template.variables), first_keyframe, count))
+        first_keyframe += count
+        for prop in keyframes:
+            keyframes[prop].append(template.keyframes[prop])
+        for var in template.variables:
+            variables.append((string(var.name), string(var.type), len(targets), len(var.targets)))
+            for t in var.targets:
+                targets.append((string(t.id_type), string(t.id.name if t.id else None), string(t.data_path),
+                                string(t.bone_target), string(t.transform_space),
+                                string(t.transform_type), string(t.rotation_mode)))
+    encoded = [value.encode() for value in strings]
+    sections = [
+        np.cumsum([0] + [len(value) for value in encoded], dtype=np.uint32),
+        np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        np.array(drivers, dtype=np.int32).reshape(-1, DRIVER_COLUMNS),
+        np.array(variables, dtype=np.int32).reshape(-1, VARIABLE_COLUMNS),
+        np.array(targets, dtype=np.int32).reshape(-1, TARGET_COLUMNS)
+    ]
+    for prop, _, dtype in KEYFRAME_PROPS:
+        sections.append(np.concatenate(keyframes[prop]).astype(dtype) if keyframes[prop] else np.empty(0, dtype))
+    with open(filepath, 'wb') as file:
+        file.write(MAGIC)
+        file.write(np.array([section.size for section in sections], dtype=np.uint64).tobytes())
+        for section in sections:
+            data = np.ascontiguousarray(section).tobytes()
+            file.write(data)
+            file.write(b'\0' * (-len(data) % 8))
+
+def read_sections(filepath: str) -> dict[str, np.ndarray]:
+    """Maps library file into memory and copies its sections out of the mapping,
+    which is closed before returning, so the file is not held open or locked"""
+    with open(filepath, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filepath} is not a MARCi driver library")
+        offset = len(MAGIC)
+        sizes = np.frombuffer(buffer, dtype=np.uint64, count=len(SECTIONS), offset=offset).tolist()
+        offset += len(SECTIONS) * np.dtype(np.uint64).itemsize
+        sections = {}
+        for size, (name, dtype) in zip(sizes, SECTIONS):
+            array = sections[name] = np.frombuffer(buffer, dtype=dtype, count=size, offset=offset).copy()
+            offset += array.nbytes
+            offset += -offset % 8
+    return sections
+
+def resolve_library_id(id_type: str, name: Optional[str]) -> Optional[bpy.types.ID]:
+    if name is None or id_type not in ID_COLLECTIONS:
+        return None
+    return getattr(bpy.data, ID_COLLECTIONS[id_type]).get(name)
+
+def load_driver_library(filepath: str) -> list[DriverTemplate]:
+    """Reads driver templates from library,
+    keyframe arrays are slices of the sections read from it"""
+    sections = read_sections(filepath)
+    data = sections['string_data'].tobytes()
+    offsets = sections['string_offsets'].tolist()
+    strings = [data[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+    def string(index):
+        return None if index < 0 else strings[index]
+
+    variables = sections['variables'].reshape(-1, VARIABLE_COLUMNS).tolist()
+    targets = sections['targets'].reshape(-1, TARGET_COLUMNS).tolist()
+    sizes = {prop: size for prop, size, _ in KEYFRAME_PROPS}
+    templates = []
+    for path, driver_type, expression, first_var, var_count, first_key, key_count in \
+            sections['drivers'].reshape(-1, DRIVER_COLUMNS).tolist():
+        driver_variables = []
+        for name, var_type, first_target, target_count in variables[first_var:first_var + var_count]:
+            driver_targets = []
+            for id_type, id_name, *fields in targets[first_target:first_target + target_count]:
+                id_type = string(id_type)
+                driver_targets.append(TargetTemplate(id_type, resolve_library_id(id_type, string(id_name)),
+                                                     *(string(field) for field in fields)))
+            driver_variables.append(VariableTemplate(string(name), string(var_type), driver_targets))
+        keyframes = {prop: sections[prop][first_key * size:(first_key + key_count) * size]
+                     for prop, size in sizes.items()}
+        data_path = string(path)
+        parsed = parse_key_block_path(data_path)
+        templates.append(DriverTemplate(data_path, parsed[0] if parsed else None, string(driver_type),
+                                        string(expression), driver_variables, keyframes))
+    return templates
+
+
+class ExportDriverLibrary(bpy.types.Operator, ExportHelper):
+    """Saves shapekey drivers of active object to driver library"""
+    bl_label = "Export driver library"
+    bl_idname = "view3d.export_driver_library"
+    filename_ext = ".marcidrv"
+
+    def execute(self, context: bpy.types.Context):
+        srckey = context.active_object.data.shape_keys
+        if srckey is None or srckey.animation_data is None:
+            return {'CANCELLED'}
+        templates = read_driver_templates(srckey)
+        save_driver_library(templates, self.filepath)
+        self.report({'INFO'}, f"Exported {len(templates)} drivers")
+        return {'FINISHED'}
+
+
+class ImportDriverLibrary(bpy.types.Operator, ImportHelper):
+    """Applies driver library to shapekeys of selected objects, targeting their parent rig"""
+    bl_label = "Import driver library"
+    bl_idname = "view3d.import_driver_library"
+    bl_options = {'REGISTER', 'UNDO'}
+    filename_ext = ".marcidrv"
+
+    def execute(self, context: bpy.types.Context):
+        try:
+            templates = load_driver_library(self.filepath)
+        except (ValueError, OSError) as error:
+            self.report({'ERROR'}, f"Cannot read driver library {self.filepath}: {error}")
+            return {'CANCELLED'}
+        report = transfer_templates(context, templates, context.selected_objects)
+        print(report.summary())
+        self.report({'INFO'}, report.summary().splitlines()[0])
+        return {'FINISHED'}
+
+
+classes = [ExportDriverLibrary, ImportDriverLibrary]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
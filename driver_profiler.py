@@ -0,0 +1,156 @@
+import os
+import csv
+import json
+import time
+from backend import bpy, ExportHelper
+from typing import NamedTuple
+from rig_plan import driver_name
+from driver_fastpath import driver_owners
+
+# Driver sets costing less than this per frame are not bisected further, in seconds
+MIN_BISECT_COST = 2e-5
+
+
+class ProfiledDriver(NamedTuple):
+    owner: bpy.types.ID
+    fcurve: bpy.types.FCurve
+    name: str
+    type: str
+    bones: tuple[str, ...]
+
+
+class ProfileRow(NamedTuple):
+    group: str      # DRIVER, SHAPE_KEY, TYPE or BONE
+    name: str
+    drivers: int
+    cost_ms: float  # evaluation time per frame
+
+
+def profiled_drivers(owners: list[bpy.types.ID]) -> list[ProfiledDriver]:
+    """Collects drivers of owners with the names they are grouped by"""
+    drivers = []
+    for owner in owners:
+        for fcurve in owner.animation_data.drivers:
+            bones = {target.bone_target for var in fcurve.driver.variables
+                     for target in var.targets if target.bone_target}
+            drivers.append(ProfiledDriver(owner, fcurve, driver_name(fcurve.data_path),
+                                          fcurve.driver.type, tuple(sorted(bones))))
+    return drivers
+
+
+class DriverTimer:
+    """Measures scene evaluation time per frame with only given drivers unmuted"""
+
+    def __init__(self, scene: bpy.types.Scene, drivers: list[ProfiledDriver], frames: range, repeats: int = 3):
+        self.scene = scene
+        self.drivers = drivers
+        self.frames = frames
+        self.repeats = repeats
+        if not frames:
+            raise ValueError(f"Empty frame range {frames.start}..{frames.stop - 1}, nothing to profile")
+        self.baseline = 0.0
+        self.baseline = self.measure([])
+
+    def measure(self, enabled: list[ProfiledDriver]) -> float:
+        enabled = {id(driver.fcurve) for driver in enabled}
+        for driver in self.drivers:
+            driver.fcurve.mute = id(driver.fcurve) not in enabled
+        bpy.context.view_layer.update()
+        best = float('inf')
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            for frame in self.frames:
+                self.scene.frame_set(frame)
+            best = min(best, time.perf_counter() - start)
+        return max(best / len(self.frames) - self.baseline, 0.0)
+
+    def bisect(self, drivers: list[ProfiledDriver], cost: float = None) -> dict[int, float]:
+        """Splits driver set in halves while it is expensive enough,
+        cost of sets not split further is shared evenly by their drivers"""
+        cost = self.measure(drivers) if cost is None else cost
+        if len(drivers) == 1 or cost < MIN_BISECT_COST:
+            return {id(driver.fcurve): cost / len(drivers) for driver in drivers}
+        half = len(drivers) // 2
+        costs = self.bisect(drivers[:half])
+        costs.update(self.bisect(drivers[half:]))
+        return costs
+
+
+def group_rows(drivers: list[ProfiledDriver], costs: dict[int, float]) -> list[ProfileRow]:
+    """Rows of every driver and of the shape keys, types and bones grouping them,
+    group cost is the sum of the costs of its drivers"""
+    groups = {}
+    for driver in drivers:
+        fcurve = driver.fcurve
+        keys = [('DRIVER', f"{driver.owner.name}: {fcurve.data_path}[{fcurve.array_index}]"),
+                ('SHAPE_KEY', driver.name), ('TYPE', driver.type)]
+        keys += [('BONE', bone) for bone in driver.bones]
+        for key in keys:
+            groups.setdefault(key, []).append(driver)
+    return [ProfileRow(group, name, len(members),
+                       sum(costs[id(driver.fcurve)] for driver in members) * 1000)
+            for (group, name), members in groups.items()]
+
+
+def profile_drivers(scene: bpy.types.Scene, owners: list[bpy.types.ID], frames: range,
+                    repeats: int = 3) -> list[ProfileRow]:
+    """Ranks drivers of owners and their groups by evaluation cost,
+    restores mute state of drivers and current frame afterwards"""
+    drivers = profiled_drivers(owners)
+    if not drivers:
+        return []
+    muted = [driver.fcurve.mute for driver in drivers]
+    current_frame = scene.frame_current
+    try:
+        timer = DriverTimer(scene, drivers, frames, repeats)
+        costs = timer.bisect(drivers, timer.measure(drivers))
+        rows = group_rows(drivers, costs)
+    finally:
+        for driver, mute in zip(drivers, muted):
+            driver.fcurve.mute = mute
+        scene.frame_set(current_frame)
+    rows.sort(key=lambda row: row.cost_ms, reverse=True)
+    return rows
+
+
+def write_profile(rows: list[ProfileRow], filepath: str):
+    """Writes ranked rows as JSON and as CSV next to it"""
+    with open(filepath, 'w') as file:
+        json.dump([row._asdict() for row in rows], file, indent=2)
+    with open(os.path.splitext(filepath)[0] + '.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(ProfileRow._fields)
+        writer.writerows(rows)
+
+
+class ProfileDrivers(bpy.types.Operator, ExportHelper):
+    """Measures evaluation cost of drivers of selected armatures and their meshes over scene frame range"""
+    bl_label = "Profile drivers"
+    bl_idname = "view3d.profile_drivers"
+    filename_ext = ".json"
+
+    repeats: bpy.props.IntProperty(name='Repeats', default=3, min=1)
+
+    def execute(self, context: bpy.types.Context):
+        scene = context.scene
+        frames = range(scene.frame_start, scene.frame_end + 1, max(scene.frame_step, 1))
+        if not frames:
+            self.report({'ERROR'}, f"Frame range {scene.frame_start}..{scene.frame_end} is empty")
+            return {'CANCELLED'}
+        rows = profile_drivers(scene, driver_owners(context.selected_objects), frames, self.repeats)
+        write_profile(rows, self.filepath)
+        for row in rows[:10]:
+            print(f"{row.cost_ms:.4f} ms  {row.group} {row.name} ({row.drivers})")
+        self.report({'INFO'}, f"Profiled {sum(row.group == 'DRIVER' for row in rows)} drivers")
+        return {'FINISHED'}
+
+
+classes = [ProfileDrivers]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
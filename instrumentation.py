@@ -0,0 +1,246 @@
+"""Opt-in instrumentation of MARCi operators.
+
+When enabled, helpers of rig_utils, BoneLookup and bpy.ops calls are wrapped
+to count time per helper, operator calls, mode switches and bone lookups
+of every MARCi operator invocation, along with memory before and after it
+as a measure of what its undo step holds. When disabled, original functions are restored,
+so it costs nothing. Enabled with MARCi panel or MARCI_INSTRUMENT=1 environment variable,
+summaries go to the console and, if MARCI_INSTRUMENT_JSON is set, are appended to that file"""
+import os
+import sys
+import json
+import time
+import inspect
+import functools
+from backend import bpy
+import rig_utils
+
+# Helpers whose calls switch modes
+MODE_HELPERS = {'objectmode', 'posemode', 'editmode', 'leave_editmode'}
+# BoneLookup methods, each call resolves a bone by name
+LOOKUP_METHODS = {'pose_bone', 'bone', 'edit_bone'}
+# Helpers resolving a bone by name themselves only without lookup, they call LOOKUP_METHODS otherwise
+LOOKUP_HELPERS = {'get_pose_bone', 'get_edit_bone'}
+
+
+class OperatorStats:
+    """Counters of a single operator invocation"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.ops_calls = 0
+        self.mode_switches = 0
+        self.lookups = 0
+        self.helpers: dict[str, list] = {}
+        self.memory_before = 0
+        self.memory_after = 0
+
+    def helper(self, name: str, seconds: float):
+        entry = self.helpers.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def as_dict(self) -> dict:
+        return {'operator': self.name, 'seconds': self.seconds, 'ops_calls': self.ops_calls,
+                'mode_switches': self.mode_switches, 'lookups': self.lookups,
+                'memory_before': self.memory_before, 'memory_after': self.memory_after,
+                'undo': undo_limits(),
+                'helpers': {name: {'calls': calls, 'seconds': seconds}
+                            for name, (calls, seconds) in self.helpers.items()}}
+
+    def summary(self) -> str:
+        lines = [f"{self.name}: {self.seconds:.3f} s, {self.ops_calls} bpy.ops calls, "
+                 f"{self.mode_switches} mode switches, {self.lookups} bone lookups",
+                 undo_summary(self.memory_before, self.memory_after)]
+        ranked = sorted(self.helpers.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (calls, seconds) in ranked[:10]:
+            lines.append(f"  {name}: {calls} calls, {seconds:.4f} s")
+        return "\n".join(lines)
+
+
+def resident_memory() -> int:
+    """Resident memory of Blender process in bytes, 0 where it cannot be read.
+    Blender does not expose undo stack size, so growth of the process
+    across an operator is used as the size of its undo step"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def undo_limits() -> dict:
+    edit = bpy.context.preferences.edit
+    return {'steps': edit.undo_steps, 'memory_limit_mb': edit.undo_memory_limit}
+
+
+def undo_summary(before: int, after: int) -> str:
+    limits = undo_limits()
+    limit = f"{limits['memory_limit_mb']} MB" if limits['memory_limit_mb'] else "unlimited, consider bounding it"
+    if not before:
+        return f"  undo: {limits['steps']} steps, memory limit {limit}"
+    return (f"  undo memory: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB "
+            f"({(after - before) / 2**20:+.1f} MB), {limits['steps']} steps, memory limit {limit}")
+
+
+# Stats of operators being executed, nested operators count into all of them
+active: list[OperatorStats] = []
+# (owner, attribute, original) of every wrapped attribute
+patched: list[tuple[object, str, object]] = []
+
+
+def is_enabled() -> bool:
+    return bool(patched)
+
+
+def marci_modules() -> list:
+    """Loaded modules living next to this one"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    modules = []
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path and os.path.dirname(os.path.abspath(path)) == directory:
+            modules.append(module)
+    return modules
+
+
+def wrap_helper(function, name: str):
+    signature = inspect.signature(function) if name in LOOKUP_HELPERS else None
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not active:
+            return function(*args, **kwargs)
+        mode = bpy.context.mode if name in MODE_HELPERS else None
+        lookup = name in LOOKUP_METHODS or \
+            (signature is not None and signature.bind(*args, **kwargs).arguments.get('lookup') is None)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            switched = mode is not None and bpy.context.mode != mode
+            for stats in active:
+                stats.helper(name, seconds)
+                stats.mode_switches += switched
+                stats.lookups += lookup
+    return wrapper
+
+
+def wrap_ops_call(call):
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        for stats in active:
+            stats.ops_calls += 1
+        return call(*args, **kwargs)
+    return wrapper
+
+
+def wrap_execute(execute, name: str):
+    @functools.wraps(execute)
+    def wrapper(self, context):
+        stats = OperatorStats(name)
+        active.append(stats)
+        stats.memory_before = resident_memory()
+        start = time.perf_counter()
+        try:
+            return execute(self, context)
+        finally:
+            stats.seconds = time.perf_counter() - start
+            active.remove(stats)
+            if bpy.app.background:
+                finish(stats)
+            else:
+                # Undo step is pushed after execute returns
+                bpy.app.timers.register(functools.partial(finish, stats), first_interval=0.0)
+    return wrapper
+
+
+def patch(owner, attr: str, wrapper):
+    patched.append((owner, attr, getattr(owner, attr)))
+    setattr(owner, attr, wrapper)
+
+
+def enable():
+    """Wraps helpers, lookups, bpy.ops calls and execute of MARCi operators"""
+    if is_enabled():
+        return
+    helpers = {function: wrap_helper(function, name)
+               for name, function in vars(rig_utils).items()
+               if inspect.isfunction(function) and function.__module__ == rig_utils.__name__
+               and not name.startswith('_')}
+    for module in marci_modules():
+        for attr, value in list(vars(module).items()):
+            if inspect.isfunction(value) and value in helpers:
+                patch(module, attr, helpers[value])
+            elif inspect.isclass(value) and issubclass(value, bpy.types.Operator) \
+                    and value.__module__ == module.__name__ and 'execute' in vars(value):
+                patch(value, 'execute', wrap_execute(value.execute, value.bl_idname))
+    for method in ('pose_bone', 'bone', 'edit_bone'):
+        patch(rig_utils.BoneLookup, method, wrap_helper(getattr(rig_utils.BoneLookup, method), method))
+    ops_class = getattr(bpy.ops, '_BPyOpsSubModOp', None)
+    if ops_class is not None:
+        patch(ops_class, '__call__', wrap_ops_call(ops_class.__call__))
+
+
+def disable():
+    """Restores original functions"""
+    while patched:
+        owner, attr, original = patched.pop()
+        setattr(owner, attr, original)
+
+
+def finish(stats: OperatorStats):
+    stats.memory_after = resident_memory()
+    report(stats)
+
+
+def report(stats: OperatorStats):
+    print(stats.summary())
+    path = os.environ.get('MARCI_INSTRUMENT_JSON')
+    if path:
+        with open(path, 'a') as file:
+            file.write(json.dumps(stats.as_dict()) + "\n")
+
+
+def sync_scenes():
+    """Checks instrumentation property of every scene when it is enabled and clears it otherwise,
+    so the panel shows its real state whichever scene or environment variable switched it"""
+    for scene in bpy.data.scenes:
+        if scene.marci_instrumentation != is_enabled():
+            scene.marci_instrumentation = is_enabled()
+
+
+def sync_after_load(*args):
+    sync_scenes()
+
+
+def update_instrumentation(scene: bpy.types.Scene, context: bpy.types.Context):
+    if scene.marci_instrumentation:
+        enable()
+    else:
+        disable()
+    sync_scenes()
+
+
+def register():
+    bpy.types.Scene.marci_instrumentation = bpy.props.BoolProperty(
+        name='Instrumentation', default=False, update=update_instrumentation)
+    if os.environ.get('MARCI_INSTRUMENT', '') not in ('', '0'):
+        enable()
+        # Scenes are not accessible while add-on registers
+        bpy.app.timers.register(sync_scenes, first_interval=0.0)
+    bpy.app.handlers.load_post.append(bpy.app.handlers.persistent(sync_after_load))
+
+
+def unregister():
+    if sync_after_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(sync_after_load)
+    disable()
+    del bpy.types.Scene.marci_instrumentation
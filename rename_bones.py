@@ -1,54 +1,130 @@
-import bpy
+import time
+from backend import bpy
+from typing import Callable, Optional
+
+
+def daz_to_blender(name: str) -> Optional[str]:
+    """'lShldrBend' -> 'ShldrBend.L'"""
+    if len(name) > 1 and name[0] in 'lr' and name[1].isupper():
+        return name[1:] + ('.L' if name[0] == 'l' else '.R')
+    return None
+
+
+def blender_to_daz(name: str) -> Optional[str]:
+    """'ShldrBend.L' -> 'lShldrBend'"""
+    if len(name) > 2 and name[-2] == '.' and name[-1] in 'LR':
+        return name[-1].lower() + name[:-2]
+    return None
+
+
+def rename_map(names: list[str], rule: Callable[[str], Optional[str]]) -> dict[str, str]:
+    """Computes old -> new names of all bones up front, skipping no-ops"""
+    mapping = {}
+    for name in names:
+        new_name = rule(name)
+        if new_name is not None and new_name != name:
+            mapping[name] = new_name
+    return mapping
+
+
+def find_collisions(mapping: dict[str, str], existing: list[str]) -> list[str]:
+    """Returns new names clashing with each other or with bones which keep their name"""
+    kept = set(existing) - set(mapping)
+    seen = set()
+    collisions = []
+    for old, new in mapping.items():
+        if new in kept or new in seen:
+            collisions.append(f"{old} -> {new}")
+        seen.add(new)
+    return collisions
+
+
+def temporary_name(name: str, taken: set[str]) -> str:
+    """Name for name unused by any bone or rename, so Blender does not number it"""
+    temporary = f"{name}.rename"
+    number = 1
+    while temporary in taken:
+        temporary = f"{name}.rename.{number}"
+        number += 1
+    taken.add(temporary)
+    return temporary
+
+
+def rename_order(mapping: dict[str, str], existing: list[str] = ()) -> list[tuple[str, str]]:
+    """Orders renames so no bone is renamed to a name still in use,
+    cycles are broken with a temporary name not used by existing bones or the mapping"""
+    pending = dict(mapping)
+    taken = set(existing) | set(mapping) | set(mapping.values())
+    order = []
+    while pending:
+        ready = [old for old, new in pending.items() if new not in pending]
+        if not ready:
+            old = next(iter(pending))
+            temporary = temporary_name(old, taken)
+            order.append((old, temporary))
+            pending[temporary] = pending.pop(old)
+            continue
+        for old in ready:
+            order.append((old, pending.pop(old)))
+    return order
+
+
+def rename_armature_bones(rig: bpy.types.Object, rule: Callable[[str], Optional[str]],
+                          names: Optional[list[str]] = None) -> str:
+    """Renames bones of rig, or only given bones, by rule.
+    Full mapping is computed and checked for collisions before anything is renamed.
+    Blender's name setter updates vertex groups, constraints and driver targets and paths.
+    Returns summary, raises ValueError on collisions"""
+    start = time.perf_counter()
+    bones = rig.data.edit_bones if rig.mode == 'EDIT' else rig.data.bones
+    existing = [bone.name for bone in bones]
+    mapping = rename_map(existing if names is None else names, rule)
+    collisions = find_collisions(mapping, existing)
+    if collisions:
+        raise ValueError(f"Bone names collide: {', '.join(collisions)}")
+    for old, new in rename_order(mapping, existing):
+        bones[old].name = new
+    return f"Renamed {len(mapping)} bones in {time.perf_counter() - start:.3f} s"
+
 
 class RenameBones(bpy.types.Operator):
     """Changes from prefix to suffix"""
     bl_label = "DAZ to Blender"
     bl_idname = "view3d.rename_bones"
-    
+    bl_options = {'REGISTER', 'UNDO'}
+
     def execute(self, context):
-        if(context.mode not in ["EDIT_ARMATURE", "OBJECT"]):
-            return ('CANCELED')
-        
-        if(context.mode == "EDIT_ARMATURE"):
-            self.rename_bones(context.visible_bones)
-        elif(context.mode == "OBJECT"):
-            bones = context.active_object.data.bones
-            self.rename_bones(bones)
-        return {'FINISHED'}
-    
-    
-    def rename_bones(self, bones):
-        for bone in bones:
-            if(bone.name[0] == 'l' and bone.name[1].isupper()):
-                bone.name = bone.name[1:] + ".L"
-            elif(bone.name[0] == 'r' and bone.name[1].isupper()):
-                bone.name = bone.name[1:] + ".R"
+        return rename_bones(self, context, daz_to_blender)
+
 
 class RenameBonesToDaz(bpy.types.Operator):
     """Changes from suffix to prefix"""
     bl_label = "Blender to DAZ"
     bl_idname = "view3d.rename_bones_to_daz"
-    
+    bl_options = {'REGISTER', 'UNDO'}
+
     def execute(self, context):
-        if(bpy.context.mode not in ["EDIT_ARMATURE", "OBJECT"]):
-            return ('CANCELED')
-        
-        if(bpy.context.mode == "EDIT_ARMATURE"):
-            self.rename_bones(context.visible_bones)
-        elif(bpy.context.mode == "OBJECT"):
-            for armature in bpy.data.armatures:
-                bones = armature.bones
-                self.rename_bones(bones)
-        return {'FINISHED'}
-    
-    
-    def rename_bones(self, bones):
-        for bone in bones:
-            if(bone.name[-2] == '.'):
-                if(bone.name[-1] == 'L'):
-                    bone.name = 'l' + bone.name[:-2]
-                elif(bone.name[-1] == 'R'):
-                    bone.name = 'r' + bone.name[:-2]
+        return rename_bones(self, context, blender_to_daz)
+
+
+def rename_bones(operator: bpy.types.Operator, context: bpy.types.Context, rule: Callable[[str], Optional[str]]):
+    """Renames visible bones in edit mode or all bones in object mode of active armature"""
+    if context.mode not in ["EDIT_ARMATURE", "OBJECT"]:
+        return {'CANCELLED'}
+    rig = context.active_object
+    if rig is None or rig.type != 'ARMATURE':
+        operator.report({'ERROR'}, "Active object is not an armature")
+        return {'CANCELLED'}
+    names = [bone.name for bone in context.visible_bones] if context.mode == "EDIT_ARMATURE" else None
+    try:
+        summary = rename_armature_bones(rig, rule, names)
+    except ValueError as error:
+        operator.report({'ERROR'}, str(error))
+        return {'CANCELLED'}
+    print(summary)
+    operator.report({'INFO'}, summary)
+    return {'FINISHED'}
+
 
 def register():
     bpy.utils.register_class(RenameBones)
@@ -56,4 +132,4 @@ def register():
 
 def unregister():
     bpy.utils.unregister_class(RenameBones)
-    bpy.utils.unregister_class(RenameBonesToDaz)
\ No newline at end of file
+    bpy.utils.unregister_class(RenameBonesToDaz)
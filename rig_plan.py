@@ -0,0 +1,324 @@
+import re
+import math
+from backend import bpy, Vector
+from typing import NamedTuple, Optional
+from rig_utils import *
+import armature_model as model
+from backend import model_backend
+from armature_layers import armature_layers as al, set_if_changed
+
+# Parent value of BoneSpec that leaves parent of the bone untouched
+KEEP_PARENT = ''
+# Quoted name in data path like 'key_blocks["name"].value' or '["name"]'
+QUOTED_NAME = re.compile(r'\["((?:[^"\\]|\\.)*)"\]')
+
+
+class BoneSpec(NamedTuple):
+    """Edit bone to create or change.
+    kind is one of EXTRUDE, DUPLICATE, NEW or EXISTING,
+    source is the bone extruded or duplicated from,
+    snap_to holds move_to_bone arguments (bone, src_head, dst_head),
+    level moves tail to the height of head, roll is in degrees"""
+    name: str
+    source: Optional[str] = None
+    kind: str = 'EXISTING'
+    vector: tuple = (0, 0, 0)
+    orient_type: str = 'GLOBAL'
+    from_head: bool = False
+    head: Optional[tuple] = None
+    tail: Optional[tuple] = None
+    parent: Optional[str] = KEEP_PARENT
+    length: Optional[float] = None
+    snap_to: Optional[tuple] = None
+    translate: Optional[tuple] = None
+    translate_orient: str = 'GLOBAL'
+    level: bool = False
+    roll: Optional[float] = None
+    layers: Optional[list] = None
+    use_deform: Optional[bool] = None
+    use_inherit_rotation: Optional[bool] = None
+
+
+class DriverRetarget(NamedTuple):
+    """Retargets armature drivers of shape key or property match to bone_target,
+    optionally replacing expression. Only first variable is retargeted
+    unless all_variables is set"""
+    match: str
+    bone_target: str
+    expression: Optional[str] = None
+    all_variables: bool = False
+
+
+class RigPlan:
+    """Declarative description of rig changes executed by execute_plan"""
+
+    def __init__(self):
+        self.bones: list[BoneSpec] = []
+        self.removed_constraints: list[tuple[str, str]] = []
+        self.constraints: list[ConstraintSpec] = []
+        self.constraint_edits: list[tuple[str, object, dict]] = []
+        self.pose_props: dict[str, dict] = {}
+        self.groups: dict[str, str] = {}
+        self.custom_shapes: dict[str, Optional[bpy.types.Object]] = {}
+        self.drivers: list[DriverRetarget] = []
+        self.rest_pose: list[str] = []
+
+    def pose(self, bone_name, **props):
+        """Sets pose bone properties, e.g. lock_location"""
+        self.pose_props.setdefault(bone_name, {}).update(props)
+
+    def extend(self, other: 'RigPlan'):
+        """Appends other plan to this one, returns self"""
+        self.bones += other.bones
+        self.removed_constraints += other.removed_constraints
+        self.constraints += other.constraints
+        self.constraint_edits += other.constraint_edits
+        for bone_name, props in other.pose_props.items():
+            self.pose(bone_name, **props)
+        self.groups.update(other.groups)
+        self.custom_shapes.update(other.custom_shapes)
+        self.drivers += other.drivers
+        self.rest_pose += other.rest_pose
+        return self
+
+
+def build_bone(armature: bpy.types.Armature, spec: BoneSpec, lookup: BoneLookup = None):
+    """Creates or changes edit bone described by spec, expects edit mode.
+    Bones are created through data API, so selection is not needed"""
+
+    edit_bones = armature.edit_bones
+    if spec.kind == 'EXTRUDE':
+        parent = spec.source if spec.parent == KEEP_PARENT else spec.parent
+        bone = new_extruded_bone(armature, spec.source, spec.vector, spec.name, parent,
+                                 spec.orient_type, spec.from_head, lookup)
+    elif spec.kind == 'DUPLICATE':
+        bone = new_duplicated_bone(armature, spec.source, spec.name, lookup=lookup)
+    elif spec.kind == 'NEW':
+        bone = edit_bones.new(spec.name)
+    else:
+        bone = get_edit_bone(armature, spec.name, lookup)
+    if spec.head is not None:
+        bone.head = spec.head
+    if spec.tail is not None:
+        bone.tail = spec.tail
+    if spec.parent != KEEP_PARENT:
+        bone.parent = get_edit_bone(armature, spec.parent, lookup) if spec.parent is not None else None
+    if spec.length is not None:
+        bone.length = spec.length
+    if spec.snap_to is not None:
+        move_to_bone(armature, spec.name, *spec.snap_to, lookup=lookup)
+    if spec.translate is not None:
+        bone.translate(orientation_matrix(bone, spec.translate_orient) @ Vector(spec.translate))
+    if spec.level:
+        bone.tail[2] = bone.head[2]
+    if spec.roll is not None:
+        bone.roll = math.radians(spec.roll)
+    if spec.layers is not None:
+        bone.layers = spec.layers
+    if spec.use_deform is not None:
+        bone.use_deform = spec.use_deform
+    if spec.use_inherit_rotation is not None:
+        bone.use_inherit_rotation = spec.use_inherit_rotation
+
+
+def apply_pose(rig: bpy.types.Object, plan: RigPlan, lookup: BoneLookup = None):
+    """Applies constraints, pose properties, groups and custom shapes of plan"""
+
+    lookup = lookup or BoneLookup(rig)
+    for spec in plan.bones:
+        if spec.kind == 'DUPLICATE':
+            copy_pose_bone(rig, spec.source, spec.name, lookup=lookup)
+    for bone_name, constraint in plan.removed_constraints:
+        constraints = lookup.pose_bone(bone_name).constraints
+        if constraint in constraints:
+            constraints.remove(constraints[constraint])
+    add_constraints(rig, plan.constraints, lookup)
+    for bone_name, constraint, props in plan.constraint_edits:
+        constraint = lookup.pose_bone(bone_name).constraints[constraint]
+        for attr, value in props.items():
+            setattr(constraint, attr, value)
+    for bone_name, props in plan.pose_props.items():
+        bone = lookup.pose_bone(bone_name)
+        for attr, value in props.items():
+            setattr(bone, attr, value)
+    assign_bone_groups(rig, plan.groups, lookup)
+    for bone_name, shape in plan.custom_shapes.items():
+        lookup.pose_bone(bone_name).custom_shape = shape
+    if plan.rest_pose:
+        apply_rest_pose(rig, plan.rest_pose, lookup)
+
+
+def apply_rest_pose(rig: bpy.types.Object, bone_names: list[str], lookup: BoneLookup):
+    """Applies current pose of given bones as their rest pose
+    with a single operator call, all layers are shown meanwhile
+    so hidden bones can be selected"""
+
+    with al.preserved(rig, al.all_layers) as armature:
+        posemode()
+        for bone in armature.bones:
+            set_if_changed(bone, 'select', False)
+        for bone_name in bone_names:
+            lookup.pose_bone(bone_name).bone.select = True
+        bpy.context.view_layer.update()
+        bpy.ops.pose.armature_apply(selected=True)
+
+
+def driver_name(data_path: str) -> str:
+    """Returns shape key or property name driven by data path,
+    the last quoted name in it or the data path itself"""
+
+    names = QUOTED_NAME.findall(data_path)
+    return names[-1] if names else data_path
+
+
+def index_drivers(owner: bpy.types.ID) -> dict[str, list[bpy.types.FCurve]]:
+    """Groups driver fcurves of owner by driven name in one pass"""
+
+    index = {}
+    if owner.animation_data is None:
+        return index
+    for fcurve in owner.animation_data.drivers:
+        index.setdefault(driver_name(fcurve.data_path), []).append(fcurve)
+    return index
+
+
+def find_drivers(index: dict[str, list[bpy.types.FCurve]], name: str) -> list[bpy.types.FCurve]:
+    """Returns drivers of given name, falling back to names containing it"""
+
+    if name in index:
+        return index[name]
+    return [fcurve for key, fcurves in index.items() if name in key for fcurve in fcurves]
+
+
+def apply_drivers(rig: bpy.types.Object, plan: RigPlan, index: dict = None):
+    """Applies driver retargets of plan as rules
+    against an index built with a single pass over armature drivers"""
+
+    if not plan.drivers:
+        return
+    if index is None:
+        index = index_drivers(rig.data)
+    for retarget in plan.drivers:
+        for fcurve in find_drivers(index, retarget.match):
+            variables = fcurve.driver.variables
+            if not retarget.all_variables:
+                variables = variables[:1]
+            for var in variables:
+                try:
+                    var.targets[0].bone_target = retarget.bone_target
+                except AttributeError:
+                    pass
+            if retarget.expression is not None:
+                fcurve.driver.expression = retarget.expression
+
+
+class PreflightReport(NamedTuple):
+    """Problems found by preflight, errors abort the plan,
+    warnings are driver rules matching nothing, as retarget rules are optional"""
+    errors: list[str]
+    warnings: list[str]
+    drivers: dict
+
+
+class PreflightError(ValueError):
+    """Raised by execute_plan before the first change when plan does not fit the rig"""
+
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__(f"Nothing changed, {len(errors)} problems found:\n" + "\n".join(errors))
+
+
+def constraint_name(spec: ConstraintSpec) -> str:
+    """Name constraint of spec gets, unless Blender adds a number to it"""
+    return spec.props.get('name') or model.CONSTRAINT_NAMES.get(spec.type, spec.type.replace('_', ' ').title())
+
+
+def preflight(rig: bpy.types.Object, plan: RigPlan) -> PreflightReport:
+    """Checks every bone, constraint and driver the plan reads or creates
+    against sets built in a single pass over pose bones and armature drivers,
+    so a plan that would fail halfway is rejected before anything is changed"""
+
+    duplicated = {spec.name: spec.source for spec in plan.bones if spec.kind == 'DUPLICATE'}
+    inspected = {bone_name for bone_name, _, _ in plan.constraint_edits} | set(duplicated.values())
+    available = set()
+    constraints = {}
+    for bone in rig.pose.bones:
+        available.add(bone.name)
+        if bone.name in inspected:
+            constraints[bone.name] = [constraint.name for constraint in bone.constraints]
+    if rig.mode == 'EDIT':
+        # Pose bones lag behind edit bones until edit mode is left
+        available = {bone.name for bone in rig.data.edit_bones}
+    errors = []
+    for spec in plan.bones:
+        reads = [spec.source] if spec.kind in ('EXTRUDE', 'DUPLICATE') else []
+        if spec.kind == 'EXISTING':
+            reads.append(spec.name)
+        if spec.parent:
+            reads.append(spec.parent)
+        if spec.snap_to is not None:
+            reads.append(spec.snap_to[0])
+        errors += [f"{spec.name}: bone {name} not found" for name in reads if name not in available]
+        if spec.kind != 'EXISTING':
+            if spec.name in available:
+                errors.append(f"{spec.name}: bone already exists")
+            available.add(spec.name)
+    for name, source in duplicated.items():
+        constraints[name] = list(constraints.get(source, []))
+    for spec in plan.constraints:
+        constraints.setdefault(spec.bone_name, []).append(constraint_name(spec))
+    reads = [(bone_name, f"removing {constraint}") for bone_name, constraint in plan.removed_constraints]
+    for spec in plan.constraints:
+        reads.append((spec.bone_name, f"{spec.type} constraint"))
+        reads += [(spec.props[attr], f"{spec.type} constraint of {spec.bone_name}")
+                  for attr in ('subtarget', 'pole_subtarget') if spec.props.get(attr)]
+    for bone_name, key, _ in plan.constraint_edits:
+        reads.append((bone_name, f"editing constraint {key}"))
+        names = constraints.get(bone_name, [])
+        if not (-len(names) <= key < len(names) if isinstance(key, int) else key in names):
+            errors.append(f"{bone_name}: constraint {key} not found")
+    reads += [(bone_name, "pose properties") for bone_name in plan.pose_props]
+    reads += [(bone_name, f"bone group {group}") for bone_name, group in plan.groups.items()]
+    reads += [(bone_name, "custom shape") for bone_name in plan.custom_shapes]
+    reads += [(bone_name, "rest pose") for bone_name in plan.rest_pose]
+    reads += [(retarget.bone_target, f"driver {retarget.match}") for retarget in plan.drivers]
+    errors += [f"{user}: bone {bone_name} not found" for bone_name, user in reads if bone_name not in available]
+    index = index_drivers(rig.data) if plan.drivers else {}
+    warnings = [f"{retarget.match}: no driver to retarget" for retarget in plan.drivers
+                if not find_drivers(index, retarget.match)]
+    return PreflightReport(list(dict.fromkeys(errors)), warnings, index)
+
+
+def execute_plan(rig: bpy.types.Object, plan: RigPlan):
+    """Executes plan in three phases: all edit bone work,
+    then all pose bone work, then all driver work,
+    so number of mode switches does not depend on number of bones.
+    Raises PreflightError before any change if plan does not fit the rig"""
+
+    report = preflight(rig, plan)
+    if report.errors:
+        raise PreflightError(report.errors)
+    for warning in report.warnings:
+        print(warning)
+    set_if_changed(rig.data, 'use_mirror_x', False)
+    lookup = BoneLookup(rig)
+    if plan.bones:
+        with edit_session(rig):
+            for spec in plan.bones:
+                build_bone(rig.data, spec, lookup)
+    apply_pose(rig, plan, lookup)
+    apply_drivers(rig, plan, report.drivers)
+    posemode()
+
+
+def dry_run(rig: bpy.types.Object, plan: RigPlan) -> list[str]:
+    """Executes plan with the same helpers on armature_model copy of rig (or on the model rig itself)
+    and returns its problems, the scene is not changed"""
+
+    model_rig = rig if isinstance(rig, model.ModelRig) else model.ModelRig.from_rig(rig)
+    with model_backend(model_rig):
+        report = preflight(model_rig, plan)
+        if report.errors:
+            return report.errors + report.warnings
+        execute_plan(model_rig, plan)
+    return report.warnings
@@ -1,166 +1,244 @@
-import bpy
+from backend import bpy
 from bone_names import *
 from rig_utils import *
+from rig_plan import PreflightError
+from widget_meshes import custom_shape_transform, widget_mesh
 
-# Relies on having boneWidget! https://github.com/waylow/boneWidget
+# WidgetCache relies on having boneWidget! https://github.com/waylow/boneWidget
+# NativeWidgets generates the same shapes without it
 
-def shape_finger_bones(context: bpy.types.Context):
+# Custom property of widget objects holding their cache key
+WIDGET_KEY = "marci_widget"
+
+
+def is_removed(obj: bpy.types.Object) -> bool:
+    try:
+        return obj.name not in bpy.data.objects
+    except ReferenceError:
+        return True
+
+
+class WidgetCache:
+    """Widgets keyed by (shape, size, slide, rotation),
+    bones sharing a key share one widget object and mesh"""
+
+    def __init__(self):
+        self.widgets: dict[str, bpy.types.Object] = {}
+        self.replaced: set[bpy.types.Object] = set()
+        for obj in bpy.data.objects:
+            if WIDGET_KEY in obj:
+                self.widgets[obj[WIDGET_KEY]] = obj
+
+    @staticmethod
+    def key(shape: str, global_size: float, slide: float, rotation: tuple) -> str:
+        angles = ' '.join(f"{math.degrees(angle):g}" for angle in rotation)
+        return f"{shape} {global_size:g} {slide:g} {angles}"
+
+    def assign(self, context: bpy.types.Context, bone_names: list[str], shape: str,
+               global_size: float = 1, slide: float = 0, rotation: tuple = (0, 0, 0)):
+        """Assigns cached widget to bones, creating it with boneWidget on first use"""
+        rig = context.active_object
+        pose_bones = [rig.pose.bones[name] for name in bone_names]
+        self.replaced.update(bone.custom_shape for bone in pose_bones if bone.custom_shape)
+        key = self.key(shape, global_size, slide, rotation)
+        widget = self.widgets.get(key)
+        if widget is None or is_removed(widget):
+            widget = self.create(context, pose_bones[0], shape, global_size, slide, rotation)
+            widget[WIDGET_KEY] = key
+            widget.name = widget.data.name = f"WGT-{key}"
+            self.widgets[key] = widget
+        for bone in pose_bones:
+            bone.custom_shape = widget
+
+    @staticmethod
+    def create(context: bpy.types.Context, pose_bone: bpy.types.PoseBone, shape: str,
+               global_size: float, slide: float, rotation: tuple) -> bpy.types.Object:
+        posemode()
+        for bone in context.active_object.data.bones:
+            bone.select = False
+        pose_bone.bone.select = True
+        context.active_object.data.bones.active = pose_bone.bone
+        context.scene.widget_list = shape
+        bpy.ops.bonewidget.create_widget(global_size=global_size, slide=slide, rotation=rotation)
+        return pose_bone.custom_shape
+
+    def collect_garbage(self) -> int:
+        """Removes cached and replaced widgets no bone uses anymore, returns their number"""
+        used = {bone.custom_shape for obj in bpy.data.objects if obj.type == 'ARMATURE'
+                for bone in obj.pose.bones if bone.custom_shape}
+        candidates = self.replaced | set(self.widgets.values())
+        removed = 0
+        for widget in candidates:
+            if is_removed(widget) or widget in used:
+                continue
+            if WIDGET_KEY not in widget and not widget.name.startswith("WGT-"):
+                continue
+            self.widgets.pop(widget.get(WIDGET_KEY), None)
+            mesh = widget.data
+            bpy.data.objects.remove(widget)
+            if mesh is not None and mesh.users == 0:
+                bpy.data.meshes.remove(mesh)
+            removed += 1
+        self.replaced.clear()
+        return removed
+
+
+class NativeWidgets(WidgetCache):
+    """Built-in widgets, one mesh per shape generated with NumPy,
+    size, slide and rotation are set as custom shape transform of each bone,
+    works without selection, operators or boneWidget"""
+
+    @staticmethod
+    def key(shape: str, *args) -> str:
+        return f"native {shape}"
+
+    def assign(self, context: bpy.types.Context, bone_names: list[str], shape: str,
+               global_size: float = 1, slide: float = 0, rotation: tuple = (0, 0, 0)):
+        """Assigns widget of shape to bones, creating its mesh on first use"""
+        rig = context.active_object
+        key = self.key(shape)
+        widget = self.widgets.get(key)
+        if widget is None or is_removed(widget):
+            widget = bpy.data.objects.new(f"WGT-{key}", widget_mesh(f"WGT-{key}", shape))
+            widget[WIDGET_KEY] = key
+            self.widgets[key] = widget
+        for name in bone_names:
+            bone = rig.pose.bones[name]
+            if bone.custom_shape is not None and bone.custom_shape != widget:
+                self.replaced.add(bone.custom_shape)
+            bone.custom_shape = widget
+            scale, translation, rotation_euler = custom_shape_transform(bone.bone.length, global_size,
+                                                                        slide, rotation)
+            bone.custom_shape_scale_xyz = scale
+            bone.custom_shape_translation = translation
+            bone.custom_shape_rotation_euler = rotation_euler
+
+
+class ShapedBones(WidgetCache):
+    """Collects names of bones shape functions would assign widgets to, changing nothing"""
+
+    def __init__(self):
+        self.names: set[str] = set()
+
+    def assign(self, context: bpy.types.Context, bone_names: list[str], shape: str, *args, **kwargs):
+        self.names.update(bone_names)
+
+
+def widget_cache(context: bpy.types.Context) -> WidgetCache:
+    """Built-in widgets when enabled or when boneWidget is not installed"""
+    if context.scene.native_widgets or not hasattr(bpy.types, 'BONEWIDGET_OT_create_widget'):
+        return NativeWidgets()
+    return WidgetCache()
+
+
+def missing_bones(context: bpy.types.Context, shaper, available: set[str]) -> list[str]:
+    shaped = ShapedBones()
+    shaper(context, shaped)
+    return sorted(shaped.names - available)
+
+
+def shape_bones(context: bpy.types.Context, shapers: list, optional: list = (), groups: dict = None):
+    """Runs shape functions with one widget cache and assigns bone groups.
+    Bones of all of them are checked against a set built in a single pass over pose bones
+    before the first widget is assigned, raises PreflightError if a required bone is missing.
+    Optional shape functions are skipped when bones they shape are missing"""
+    rig = context.active_object
+    groups = groups or {}
+    available = {bone.name for bone in rig.pose.bones}
+    errors = [f"{shaper.__name__}: bone {name} not found"
+              for shaper in shapers for name in missing_bones(context, shaper, available)]
+    errors += [f"bone group {group}: bone {name} not found" for name, group in groups.items()
+               if name not in available]
+    if errors:
+        raise PreflightError(errors)
+    optional = [shaper for shaper in optional if not missing_bones(context, shaper, available)]
+    cache = widget_cache(context)
+    for shaper in list(shapers) + optional:
+        shaper(context, cache)
+    cache.collect_garbage()
+    assign_bone_groups(rig, groups)
+
+
+def run_shape_operator(operator: bpy.types.Operator, context: bpy.types.Context, *args, **kwargs) -> set[str]:
+    """Runs shape_bones, bones missing from the rig are reported as operator error"""
+    try:
+        shape_bones(context, *args, **kwargs)
+    except PreflightError as error:
+        print(error)
+        operator.report({'ERROR'}, str(error))
+        return {'CANCELLED'}
+    return {'FINISHED'}
+
+def shape_finger_bones(context: bpy.types.Context, cache: WidgetCache):
     """Creates circular shapes for finger bones"""
-    posemode()
-    deselect_all()
-    arm = context.active_object.data
-    for side in SIDES:
-        for finger in FINGERS:
-            for i in range(1, 4):
-                select_bone(arm, f"{finger}{i}{side()}", True)
-    context.scene.widget_list = 'Circle'
-    bpy.ops.bonewidget.create_widget(global_size=0.3, slide=1, rotation=(0, 0, 0))
-
-def colorize_finger_bones(context: bpy.types.Context):
-    """Assigns finger bones to different groups for improved readability"""
+    bones = [f"{finger}{i}{side()}" for side in SIDES for finger in FINGERS for i in range(1, 4)]
+    cache.assign(context, bones, 'Circle', global_size=0.3, slide=1)
+
+def finger_groups() -> dict[str, str]:
+    """Finger bones in different groups for improved readability"""
     groups = [BoneGroups.ctrl, BoneGroups.fk_wo_ik, BoneGroups.sk_ctrl, BoneGroups.fk, BoneGroups.poles]
-    arm = context.active_object.data
-    for side in SIDES:
-        for j, finger in enumerate(FINGERS):
-            for i in range(1, 4):
-                deselect_all()
-                select_bone(arm, f"{finger}{i}{side()}", True)
-                assign_selected_to_bone_group(context, groups[j])
+    return {f"{finger}{i}{side()}": groups[j] for side in SIDES
+            for j, finger in enumerate(FINGERS) for i in range(1, 4)}
 
-def shape_leg_bones(context: bpy.types.Context):
+def shape_leg_bones(context: bpy.types.Context, cache: WidgetCache):
     """Creates shapes for leg and foot bones"""
-    posemode()
-    deselect_all()
-    arm = context.active_object.data
     for side in SIDES:
-        select_bone(arm, side(LEG_BONES[0]))
-        select_bone(arm, side(LEG_BONES[2]), True)
-        select_bone(arm, side(FOOT_BONES[1]), True)
-        context.scene.widget_list = 'FK Limb 2'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=0, rotation=(0, 0, 0))
-        select_bone(arm, side(LEG_BONES[1]))
-        context.scene.widget_list = 'Roll 1'
-        bpy.ops.bonewidget.create_widget(global_size=0.3, slide=0.5, rotation=(0, 0, math.radians(90)))
-        deselect_all()
-        for toe in TOES:
-            select_bone(arm, side(toe), True)
-            select_bone(arm, side(toe + '_2'), True)
-        context.scene.widget_list = 'Circle'
-        bpy.ops.bonewidget.create_widget(global_size=0.3, slide=1, rotation=(0, 0, 0))
-        select_bone(arm, side(FOOT_BONES[0]))
-        context.scene.widget_list = 'Sphere'
-        bpy.ops.bonewidget.create_widget(global_size=4, slide=0, rotation=(0, 0, 0))
-        select_bone(arm, side(FOOT_BONES[2]))
-
-def colorize_toe_bones(context: bpy.types.Context):
-    """Assigns finger bones to different groups for improved readability"""
+        cache.assign(context, [side(LEG_BONES[0]), side(LEG_BONES[2]), side(FOOT_BONES[1])], 'FK Limb 2')
+        cache.assign(context, [side(LEG_BONES[1])], 'Roll 1', 0.3, 0.5, (0, 0, math.radians(90)))
+        toes = [side(toe + suffix) for toe in TOES for suffix in ('', '_2')]
+        cache.assign(context, toes, 'Circle', 0.3, 1)
+        cache.assign(context, [side(FOOT_BONES[0])], 'Sphere', 4)
+
+def toe_groups() -> dict[str, str]:
+    """Toe bones in different groups for improved readability"""
     groups = [BoneGroups.ctrl, BoneGroups.fk_wo_ik, BoneGroups.sk_ctrl, BoneGroups.fk, BoneGroups.poles]
-    arm = context.active_object.data
-    for side in SIDES:
-        for j, toe in enumerate(TOES):
-            select_bone(arm, side(toe))
-            select_bone(arm, side(toe + '_2'), True)
-            assign_selected_to_bone_group(context, groups[j])
+    return {side(toe + suffix): groups[j] for side in SIDES
+            for j, toe in enumerate(TOES) for suffix in ('', '_2')}
 
-def shape_leg_ik_bones(context: bpy.types.Context):
+def shape_leg_ik_bones(context: bpy.types.Context, cache: WidgetCache):
     """Creates shapes for leg IK bones"""
-    posemode()
-    arm = context.active_object.data
     for side in SIDES:
-        select_bone(arm, side(LEG_CONTROLLER))
-        context.scene.widget_list = 'Cube'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=0, rotation=(0, 0, 0))
-        select_bone(arm, side(LEG_POLE))
-        context.scene.widget_list = 'Rhomboid'
-        bpy.ops.bonewidget.create_widget(global_size=4, slide=0, rotation=(math.radians(90), 0, 0))
-
-def shape_foot_rocker(context: bpy.types.Context):
+        cache.assign(context, [side(LEG_CONTROLLER)], 'Cube')
+        cache.assign(context, [side(LEG_POLE)], 'Rhomboid', 4, 0, (math.radians(90), 0, 0))
+
+def shape_foot_rocker(context: bpy.types.Context, cache: WidgetCache):
     """Creates shapes for foot rocker bones"""
-    posemode()
-    arm = context.active_object.data
     for side in SIDES:
-        select_bone(arm, side(FOOT_ROCKER))
-        context.scene.widget_list = 'Chest'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=1.5, rotation=(0, 0, 0))
-        select_bone(arm, side(mch_bone(TOE)))
-        context.scene.widget_list = 'Chest'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=1, rotation=(0, 0, 0))
-
-def shape_arm_bones(context: bpy.types.Context):
+        cache.assign(context, [side(FOOT_ROCKER)], 'Chest', 1, 1.5)
+        cache.assign(context, [side(mch_bone(TOE))], 'Chest', 1, 1)
+
+def shape_arm_bones(context: bpy.types.Context, cache: WidgetCache):
     """Creates shapes for arm bones"""
-    posemode()
-    arm = context.active_object.data
     for side in SIDES:
-        select_bone(arm, side(ARM_BONES[0]))
-        select_bone(arm, side(ARM_BONES[2]), True)
-        context.scene.widget_list = 'FK Limb 2'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=0, rotation=(0, 0, 0))
-        select_bone(arm, side(ARM_BONES[1]))
-        select_bone(arm, side(ARM_BONES[3]), True)
-        context.scene.widget_list = 'Roll 1'
-        bpy.ops.bonewidget.create_widget(global_size=0.3, slide=0.5, rotation=(0, 0, math.radians(90)))
-        select_bone(arm, side(HAND))
-        context.scene.widget_list = 'Sphere'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=0, rotation=(0, 0, 0))
-        select_bone(arm, side(COLLAR))
-        context.scene.widget_list = 'Clavicle'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=0.6, rotation=(0, 0, 0))
-
-def shape_arm_ik_bones(context: bpy.types.Context):
+        cache.assign(context, [side(ARM_BONES[0]), side(ARM_BONES[2])], 'FK Limb 2')
+        cache.assign(context, [side(ARM_BONES[1]), side(ARM_BONES[3])], 'Roll 1', 0.3, 0.5, (0, 0, math.radians(90)))
+        cache.assign(context, [side(HAND)], 'Sphere')
+        cache.assign(context, [side(COLLAR)], 'Clavicle', 1, 0.6)
+
+def shape_arm_ik_bones(context: bpy.types.Context, cache: WidgetCache):
     """Creates shapes for arm IK bones"""
-    posemode()
-    arm = context.active_object.data
     for side in SIDES:
-        select_bone(arm, side(HAND_CTRL))
-        context.scene.widget_list = 'Cube'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=0, rotation=(0, 0, 0))
-        select_bone(arm, side(ARM_POLE))
-        context.scene.widget_list = 'Pyramid'
-        bpy.ops.bonewidget.create_widget(global_size=4, slide=0, rotation=(0, 0, 0))
+        cache.assign(context, [side(HAND_CTRL)], 'Cube')
+        cache.assign(context, [side(ARM_POLE)], 'Pyramid', 4)
 
 
-def shape_spine_bones(context: bpy.types.Context):
+def spine_groups() -> dict[str, str]:
+    groups = {SPINE_BONES[0]: BoneGroups.ctrl}
+    groups.update({bone: BoneGroups.fk_wo_ik for bone in SPINE_BONES[1:]})
+    groups.update({side(PECTORAL): BoneGroups.fk for side in SIDES})
+    return groups
+
+def shape_spine_bones(context: bpy.types.Context, cache: WidgetCache):
     """Creates shapes for spine and root bones"""
-    posemode()
-    arm = context.active_object.data
-    select_bone(arm, "Root")
-    bpy.context.scene.widget_list = 'Root 1'
-    bpy.ops.bonewidget.create_widget(global_size=2, rotation=(math.radians(90), 0, 0))
-    select_bone(arm, SPINE_BONES[0])
-    assign_selected_to_bone_group(context, BoneGroups.ctrl)
-    bpy.context.scene.widget_list = 'Cube'
-    bpy.ops.bonewidget.create_widget(global_size=0.7, slide=0.5, rotation=(0, 0, 0))
-    select_bone(arm, SPINE_BONES[1])
-    assign_selected_to_bone_group(context, BoneGroups.fk_wo_ik)
-    bpy.context.scene.widget_list = 'FK Limb 1'
-    bpy.ops.bonewidget.create_widget(global_size=0.7, slide=0.5, rotation=(0, 0, 0))
-    select_bone(arm, SPINE_BONES[2])
-    assign_selected_to_bone_group(context, BoneGroups.fk_wo_ik)
-    bpy.context.scene.widget_list = 'Torso'
-    bpy.ops.bonewidget.create_widget(global_size=1.7, slide=0, rotation=(1.5708, 0, 0))
-    select_bone(arm, SPINE_BONES[3])
-    assign_selected_to_bone_group(context, BoneGroups.fk_wo_ik)
-    bpy.context.scene.widget_list = 'Plane'
-    bpy.ops.bonewidget.create_widget(global_size=1.5, slide=0, rotation=(0, 0, 0))
-    select_bone(arm, SPINE_BONES[4])
-    assign_selected_to_bone_group(context, BoneGroups.fk_wo_ik)
-    bpy.context.scene.widget_list = 'Circle'
-    bpy.ops.bonewidget.create_widget(global_size=0.7, slide=0, rotation=(0, 0, 0))
-    select_bone(arm, SPINE_BONES[5])
-    assign_selected_to_bone_group(context, BoneGroups.fk_wo_ik)
-    bpy.context.scene.widget_list = 'Chest'
-    bpy.ops.bonewidget.create_widget(global_size=1.5, slide=-0.3, rotation=(0, 0, 0))
-    select_bone(arm, SPINE_BONES[6])
-    select_bone(arm, SPINE_BONES[7], True)
-    select_bone(arm, SPINE_BONES[8], True)
-    assign_selected_to_bone_group(context, BoneGroups.fk_wo_ik)
-    bpy.context.scene.widget_list = 'FK Limb 1'
-    bpy.ops.bonewidget.create_widget(global_size=1, slide=0, rotation=(0, 0, 0))
-    for side in SIDES:
-        select_bone(arm, side(PECTORAL))
-        assign_selected_to_bone_group(context, BoneGroups.fk)
-        bpy.context.scene.widget_list = 'Paddle (rounded)'
-        bpy.ops.bonewidget.create_widget(global_size=1, slide=0, rotation=(0, 0, 0))
+    cache.assign(context, ["Root"], 'Root 1', 2, 0, (math.radians(90), 0, 0))
+    cache.assign(context, [SPINE_BONES[0]], 'Cube', 0.7, 0.5)
+    cache.assign(context, [SPINE_BONES[1]], 'FK Limb 1', 0.7, 0.5)
+    cache.assign(context, [SPINE_BONES[2]], 'Torso', 1.7, 0, (1.5708, 0, 0))
+    cache.assign(context, [SPINE_BONES[3]], 'Plane', 1.5)
+    cache.assign(context, [SPINE_BONES[4]], 'Circle', 0.7)
+    cache.assign(context, [SPINE_BONES[5]], 'Chest', 1.5, -0.3)
+    cache.assign(context, SPINE_BONES[6:9], 'FK Limb 1')
+    cache.assign(context, [side(PECTORAL) for side in SIDES], 'Paddle (rounded)')
 
 
 
@@ -168,47 +246,34 @@ class ShapeFingerBones(bpy.types.Operator):
     """Creates circular shapes for finger bones and assigns colors"""
     bl_label = "Shape finger bones"
     bl_idname = "view3d.shape_finger_bones"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        shape_finger_bones(context)
-        colorize_finger_bones(context)
-        return {'FINISHED'}
+        return run_shape_operator(self, context, [shape_finger_bones], groups=finger_groups())
 
 class ShapeLegBones(bpy.types.Operator):
     """Creates shapes for leg bones"""
     bl_label = "Shape leg bones"
     bl_idname = "view3d.shape_leg_bones"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        shape_leg_bones(context)
-        colorize_toe_bones(context)
-        try:
-            shape_leg_ik_bones(context)
-        except Exception:
-            pass
-        try:
-            shape_foot_rocker(context)
-        except Exception:
-            pass
-        return {'FINISHED'}
+        return run_shape_operator(self, context, [shape_leg_bones], [shape_leg_ik_bones, shape_foot_rocker],
+                                  toe_groups())
 
 class ShapeArmBones(bpy.types.Operator):
     """Creates shapes for arm bones"""
     bl_label = "Shape arm bones"
     bl_idname = "view3d.shape_arm_bones"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        shape_arm_bones(context)
-        try:
-            shape_arm_ik_bones(context)
-        except Exception:
-            pass
-        return {'FINISHED'}
+        return run_shape_operator(self, context, [shape_arm_bones], [shape_arm_ik_bones])
 
 class ShapeSpineBones(bpy.types.Operator):
     """Creates shapes for spine bones"""
     bl_label = "Shape spine bones"
     bl_idname = "view3d.shape_spine_bones"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        shape_spine_bones(context)
-        return {'FINISHED'}
+        return run_shape_operator(self, context, [shape_spine_bones], groups=spine_groups())
 
 classes = [ShapeFingerBones, ShapeLegBones, ShapeArmBones, ShapeSpineBones]
 
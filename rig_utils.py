@@ -1,5 +1,8 @@
 import math
-import bpy
+from backend import bpy, Matrix, Vector
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from bone_names import BONE_GROUP_COLORS
 
 def deselect_all():
     """Deselects all bones in current mode"""
@@ -13,8 +16,10 @@ def objectmode():
     """Switches to object mode if not in it"""
     if bpy.context.mode == "POSE":
         bpy.ops.object.posemode_toggle()
+        invalidate_bone_lookups()
     elif bpy.context.mode == "EDIT_ARMATURE":
         bpy.ops.object.editmode_toggle()
+        invalidate_bone_lookups()
 
 
 def posemode() -> None:
@@ -22,6 +27,7 @@ def posemode() -> None:
 
     if bpy.context.mode != "POSE":
         bpy.ops.object.posemode_toggle()
+        invalidate_bone_lookups()
 
 
 def editmode():
@@ -29,24 +35,122 @@ def editmode():
 
     if bpy.context.mode != "EDIT_ARMATURE":
         bpy.ops.object.editmode_toggle()
+        invalidate_bone_lookups()
 
 
-def select_bone(armature, bone_name, multiple=False, head = True, tail = True):
+_edit_session_depth = 0
+
+
+def leave_editmode():
+    """Leaves edit mode unless inside edit_session"""
+
+    if _edit_session_depth == 0 and bpy.context.mode == "EDIT_ARMATURE":
+        bpy.ops.object.editmode_toggle()
+        invalidate_bone_lookups()
+
+
+@contextmanager
+def edit_session(rig):
+    """Keeps rig in edit mode for all geometry helpers called inside,
+    edit bones are committed once when the outermost session exits.
+    Sessions can be nested, pose helpers should not be called inside"""
+
+    global _edit_session_depth
+    if _edit_session_depth == 0:
+        bpy.context.view_layer.objects.active = rig
+        editmode()
+    _edit_session_depth += 1
+    try:
+        yield rig.data.edit_bones
+    finally:
+        _edit_session_depth -= 1
+        leave_editmode()
+
+
+_lookup_generation = 0
+
+
+def invalidate_bone_lookups():
+    """Marks all BoneLookup caches as stale,
+    called on mode switches and renames"""
+
+    global _lookup_generation
+    _lookup_generation += 1
+
+
+class BoneLookup:
+    """Name to pose bone, bone and edit bone cache of a rig,
+    built once per operator run and passed to rig_utils helpers as lookup.
+    Each table is filled in one pass on first use and dropped
+    on mode switches and renames done through rig_utils"""
+
+    def __init__(self, rig):
+        self.rig = rig
+        self.generation = _lookup_generation
+        self.pose_bones = {}
+        self.bones = {}
+        self.edit_bones = {}
+
+    def clear(self):
+        self.pose_bones.clear()
+        self.bones.clear()
+        self.edit_bones.clear()
+        self.generation = _lookup_generation
+
+    def _get(self, table, collection, name):
+        if self.generation != _lookup_generation:
+            self.clear()
+        if not table:
+            table.update((bone.name, bone) for bone in collection)
+        bone = table.get(name)
+        if bone is None:
+            # Bone created after the table was filled
+            bone = table[name] = collection[name]
+        return bone
+
+    def pose_bone(self, name):
+        return self._get(self.pose_bones, self.rig.pose.bones, name)
+
+    def bone(self, name):
+        return self._get(self.bones, self.rig.data.bones, name)
+
+    def edit_bone(self, name):
+        return self._get(self.edit_bones, self.rig.data.edit_bones, name)
+
+
+def get_pose_bone(bone_name, lookup=None):
+    """Returns pose bone of active object, through lookup if given"""
+
+    if lookup is not None:
+        return lookup.pose_bone(bone_name)
+    return bpy.context.object.pose.bones[bone_name]
+
+
+def get_edit_bone(armature, bone_name, lookup=None):
+    """Returns edit bone of armature, through lookup if given"""
+
+    if lookup is not None:
+        return lookup.edit_bone(bone_name)
+    return armature.edit_bones[bone_name]
+
+
+def select_bone(armature, bone_name, multiple=False, head = True, tail = True, lookup=None):
     """Selects given bone"""
 
     if not multiple:
         deselect_all()
     if bpy.context.mode == "POSE":
-        bone = bpy.context.object.pose.bones[bone_name]
+        bone = get_pose_bone(bone_name, lookup)
         armature.bones.active = bone.bone
     if bpy.context.mode == "EDIT_ARMATURE":
-        armature.edit_bones.active = armature.edit_bones[bone_name]
-        armature.edit_bones[bone_name].select = True
-        armature.edit_bones[bone_name].select_head = head
-        armature.edit_bones[bone_name].select_tail = tail
+        bone = get_edit_bone(armature, bone_name, lookup)
+        armature.edit_bones.active = bone
+        bone.select = True
+        bone.select_head = head
+        bone.select_tail = tail
 
 
-def extrude_bone(armature, from_bone, vec, name, parent="Root", orient_type="GLOBAL", from_head=False):
+def extrude_bone(armature, from_bone, vec, name, parent="Root", orient_type="GLOBAL", from_head=False, lookup=None):
     """Extrudes bone from selected bone in direction of given vector,
     renames it, turns off deform, disconnects
     and parents to give bone (Root bone by default),
@@ -55,34 +159,108 @@ def extrude_bone(armature, from_bone, vec, name, parent="Root", orient_type="GLO
     editmode()
     deselect_all()
     if not from_head:
-        armature.edit_bones[from_bone].select_tail = True
+        get_edit_bone(armature, from_bone, lookup).select_tail = True
     else:
-        armature.edit_bones[from_bone].select_head = True
+        get_edit_bone(armature, from_bone, lookup).select_head = True
     bpy.ops.armature.extrude_move(ARMATURE_OT_extrude={"forked": False},
                                   TRANSFORM_OT_translate={"value": vec,
                                   "orient_type": orient_type})
-    armature.edit_bones[from_bone + ".001"].name = name
-    armature.edit_bones[name].use_deform = False
-    armature.edit_bones[name].use_connect = False
+    bone = armature.edit_bones[from_bone + ".001"]
+    bone.name = name
+    invalidate_bone_lookups()
+    bone.use_deform = False
+    bone.use_connect = False
     if parent is not None:
-        armature.edit_bones[name].parent = armature.edit_bones[parent]
+        bone.parent = get_edit_bone(armature, parent, lookup)
     else:
-        armature.edit_bones[name].parent = None
-    bpy.ops.object.editmode_toggle()
+        bone.parent = None
+    leave_editmode()
 
 
-def duplicate_bone(armature, bone_name, name=None, parent=None, length=None):
+def duplicate_bone(armature, bone_name, name=None, parent=None, length=None, lookup=None):
     editmode()
-    select_bone(armature, bone_name)
+    select_bone(armature, bone_name, lookup=lookup)
     bpy.ops.armature.duplicate()
     bone = bpy.context.selected_bones[0]
     
     if parent is not None:
-        bone.parent = armature.edit_bones[parent]
+        bone.parent = get_edit_bone(armature, parent, lookup)
     if name is not None:
         bone.name = name
+        invalidate_bone_lookups()
+    if length is not None:
+        bone.length = length
+
+
+def orientation_matrix(bone, orient_type="GLOBAL"):
+    """Returns rotation of transform orientation for edit bone,
+    LOCAL and NORMAL both follow the axes of the bone"""
+
+    if orient_type in ("LOCAL", "NORMAL"):
+        return bone.matrix.to_3x3()
+    return Matrix.Identity(3)
+
+
+def new_extruded_bone(armature, from_bone, vec, name, parent="Root", orient_type="GLOBAL", from_head=False, lookup=None):
+    """Creates bone starting at tail (or head) of given bone
+    and pointing along vector in given orientation,
+    same as extrude_bone but without operators and selection.
+    Returns created edit bone, expects edit mode"""
+
+    source = get_edit_bone(armature, from_bone, lookup)
+    start = source.head if from_head else source.tail
+    bone = armature.edit_bones.new(name)
+    bone.head = start
+    bone.tail = start + orientation_matrix(source, orient_type) @ Vector(vec)
+    bone.roll = source.roll
+    bone.layers = source.layers[:]
+    bone.use_deform = False
+    bone.use_connect = False
+    bone.parent = get_edit_bone(armature, parent, lookup) if parent is not None else None
+    return bone
+
+
+# Edit bone properties copied by new_duplicated_bone
+DUPLICATED_PROPS = ['roll', 'layers', 'use_deform', 'use_inherit_rotation',
+                    'inherit_scale', 'use_local_location', 'bbone_segments']
+
+
+def new_duplicated_bone(armature, bone_name, name, parent=None, length=None, lookup=None):
+    """Creates copy of given bone, same as duplicate_bone
+    but without operators and selection, parent of original is kept
+    unless given. Returns created edit bone, expects edit mode.
+    Pose data is not copied, see copy_pose_bone"""
+
+    source = get_edit_bone(armature, bone_name, lookup)
+    bone = armature.edit_bones.new(name)
+    bone.head = source.head
+    bone.tail = source.tail
+    for prop in DUPLICATED_PROPS:
+        setattr(bone, prop, getattr(source, prop))
+    bone.parent = source.parent if parent is None else get_edit_bone(armature, parent, lookup)
     if length is not None:
         bone.length = length
+    return bone
+
+
+def copy_pose_bone(rig, bone_name, name, constraints=True, lookup=None):
+    """Copies rotation mode, locks, custom shape, group
+    and optionally constraints from one pose bone to another,
+    what bpy.ops.armature.duplicate does for duplicated bones"""
+
+    pose_bones = rig.pose.bones
+    source = lookup.pose_bone(bone_name) if lookup else pose_bones[bone_name]
+    bone = lookup.pose_bone(name) if lookup else pose_bones[name]
+    bone.rotation_mode = source.rotation_mode
+    bone.lock_location = source.lock_location
+    bone.lock_rotation = source.lock_rotation
+    bone.lock_rotation_w = source.lock_rotation_w
+    bone.lock_scale = source.lock_scale
+    bone.custom_shape = source.custom_shape
+    bone.bone_group = source.bone_group
+    if constraints:
+        for constraint in source.constraints:
+            bone.constraints.copy(constraint)
 
 
 def add_bone(bone_name):
@@ -90,40 +268,42 @@ def add_bone(bone_name):
     bpy.ops.armature.bone_primitive_add(name=bone_name)
 
 
-def move_bone(armature, name, position):
+def move_bone(armature, name, position, lookup=None):
     """Moves bone in direction of given vector"""
 
     editmode()
-    armature.edit_bones[name].translate(position)
-    bpy.ops.object.editmode_toggle()
+    get_edit_bone(armature, name, lookup).translate(position)
+    leave_editmode()
 
 
-def move_to_bone(armature, bone_to_move_name, bone_tail_name, src_head = False, dst_head = False):
+def move_to_bone(armature, bone_to_move_name, bone_tail_name, src_head = False, dst_head = False, lookup=None):
     """Moves bone head/tail to tail/head of other bone"""
 
     editmode()
-    vector = armature.edit_bones[bone_to_move_name].vector
+    bone = get_edit_bone(armature, bone_to_move_name, lookup)
+    target = get_edit_bone(armature, bone_tail_name, lookup)
+    vector = bone.vector
     if dst_head:
-        vector2 = armature.edit_bones[bone_tail_name].head
+        vector2 = target.head
     else:
-        vector2 = armature.edit_bones[bone_tail_name].tail
+        vector2 = target.tail
     if src_head:
-        armature.edit_bones[bone_to_move_name].head = vector2
-        armature.edit_bones[bone_to_move_name].tail = vector2 - vector
+        bone.head = vector2
+        bone.tail = vector2 - vector
     else:
-        armature.edit_bones[bone_to_move_name].tail = vector2 + vector
-        armature.edit_bones[bone_to_move_name].head = vector2
+        bone.tail = vector2 + vector
+        bone.head = vector2
         
-    bpy.ops.object.editmode_toggle()    
+    leave_editmode()    
 
 
 def add_ik_modifier(rig, bone_name, chain_length=0,
-                    target_name=None, pole_name=None, pole_angle=0):
+                    target_name=None, pole_name=None, pole_angle=0, lookup=None):
     """Adds IK modifier to bone"""
 
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(rig.data, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(rig.data, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='IK')
     constraint = bone.constraints[-1]
     constraint.chain_count = chain_length
@@ -134,12 +314,12 @@ def add_ik_modifier(rig, bone_name, chain_length=0,
         constraint.pole_target = rig
         constraint.pole_subtarget = pole_name
     constraint.pole_angle = math.radians(pole_angle)
-    bpy.ops.object.posemode_toggle()
+    objectmode()
 
 
-def remove_constraint(rig, bone_name, constraint):
+def remove_constraint(rig, bone_name, constraint, lookup=None):
     posemode()
-    bone = rig.pose.bones[bone_name]
+    bone = lookup.pose_bone(bone_name) if lookup else rig.pose.bones[bone_name]
     try:
         bone.constraints.remove(bone.constraints[constraint])
     except KeyError:
@@ -148,13 +328,13 @@ def remove_constraint(rig, bone_name, constraint):
 
 def add_limit_loc_constraint(armature, bone_name, 
                              min_x=None, min_y=None, min_z=None,
-                             max_x=None, max_y=None, max_z=None):
+                             max_x=None, max_y=None, max_z=None, lookup=None):
     """Adds Limit Location Constraint to a bone
     and sets it to local and to affect transform"""
 
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(armature, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(armature, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='LIMIT_LOCATION')
     constraint = bone.constraints[-1]
     constraint.owner_space = 'LOCAL'
@@ -182,12 +362,12 @@ def add_limit_loc_constraint(armature, bone_name,
 def add_limit_rotation_constraint(armature, bone_name, axis="xyz",
                                   min_x=0, min_y=0, min_z=0,
                                   max_x=0, max_y=0, max_z=0,
-                                  affect_transform=True):
+                                  affect_transform=True, lookup=None):
     """Adds Limit Rotation constraint to the bone in local space"""
 
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(armature, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(armature, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='LIMIT_ROTATION')
     constraint = bone.constraints[-1]
     constraint.use_limit_x = axis.lower().__contains__("x")
@@ -204,38 +384,38 @@ def add_limit_rotation_constraint(armature, bone_name, axis="xyz",
     return constraint
 
 
-def add_copy_transforms_constraint(rig, bone_name, subtarget, influence=1.0):
+def add_copy_transforms_constraint(rig, bone_name, subtarget, influence=1.0, lookup=None):
     """Adds Copy Transforms modifier to the bone"""
 
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(rig.data, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(rig.data, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='COPY_TRANSFORMS')
     bone.constraints[-1].target = rig
     bone.constraints[-1].subtarget = subtarget
     bone.constraints[-1].influence = influence
 
 
-def add_damped_track_modifier(rig, bone_name, subtarget):
+def add_damped_track_modifier(rig, bone_name, subtarget, lookup=None):
     """Adds Damped Track modifier to the bone"""
 
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(rig.data, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(rig.data, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='DAMPED_TRACK')
     constraint = bone.constraints[-1]
     constraint.target = rig
     constraint.subtarget = subtarget
 
 
-def add_locked_track_constraint(rig, bone_name, subtarget, head_tail = 0.0, track_axis = 'TRACK_Y', lock_axis = 'LOCK_Z'):
+def add_locked_track_constraint(rig, bone_name, subtarget, head_tail = 0.0, track_axis = 'TRACK_Y', lock_axis = 'LOCK_Z', lookup=None):
     """Adds Locked Track constraint to the bone
        Track axes - TRACK_X, TRACK_NEGATIVE_X, TRACK_Y, TRACK_NEGATIVE_Y, TRACK_Z, TRACK_NEGATIVE_Z
        Locked axes - LOCK_X, LOCK_Y, LOCK_Z"""
 
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(rig.data, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(rig.data, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='LOCKED_TRACK')
     constraint = bone.constraints[-1]
     constraint.target = rig
@@ -245,24 +425,24 @@ def add_locked_track_constraint(rig, bone_name, subtarget, head_tail = 0.0, trac
     constraint.lock_axis = lock_axis
 
 
-def constraint_ik_rotation(armature, bone_name, x_axis = True, y_axis = False, z_axis = True):
+def constraint_ik_rotation(armature, bone_name, x_axis = True, y_axis = False, z_axis = True, lookup=None):
     """Constraints rotation of bone"""
 
     posemode()
     deselect_all()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(armature, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(armature, bone_name, lookup=lookup)
     bone.lock_ik_x = x_axis
     bone.lock_ik_y = y_axis
     bone.lock_ik_z = z_axis
-    bpy.ops.object.posemode_toggle()
+    objectmode()
 
 
-def add_copy_rotation_constraint(rig, bone_name, target_name, axis='xyz', mix_mode='ADD', target_space='LOCAL_WITH_PARENT', owner_space='LOCAL', name=''):
+def add_copy_rotation_constraint(rig, bone_name, target_name, axis='xyz', mix_mode='ADD', target_space='LOCAL_WITH_PARENT', owner_space='LOCAL', name='', lookup=None):
     """Adds Copy Rotation constraint to the bone in local space"""
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(rig.data, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(rig.data, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='COPY_ROTATION')
     constraint = bone.constraints[-1]
     if name is not '':
@@ -277,11 +457,11 @@ def add_copy_rotation_constraint(rig, bone_name, target_name, axis='xyz', mix_mo
     constraint.owner_space = owner_space
 
 
-def add_shrinkwrap(armature, bone_name, target):
+def add_shrinkwrap(armature, bone_name, target, lookup=None):
     """Adds Shrinkwrap Relationship to bone with object as target"""
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(armature, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(armature, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='SHRINKWRAP')
     constraint = bone.constraints[-1]
     constraint.target = bpy.data.objects[target]
@@ -315,13 +495,14 @@ def add_transformation_constraint(
     map_to_y_from = 'Y',
     map_to_z_from = 'Z',
     mix = 'ADD',
-    name = ''):
+    name = '',
+    lookup = None):
     """Adds Transformation constraint"""
     posemode()
     rig = context.active_object
     armature = rig.data
-    bone = context.object.pose.bones[bone_name]
-    select_bone(armature, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(armature, bone_name, lookup=lookup)
     bpy.ops.pose.constraint_add(type='TRANSFORM')
     constraint = bone.constraints[-1]
     constraint.target = rig
@@ -382,6 +563,209 @@ def add_transformation_constraint(
         constraint.mix_mode_scale = mix
 
 
+class ConstraintSpec(NamedTuple):
+    """Constraint description for add_constraints,
+    props are set on the constraint in given order,
+    index moves constraint to that position in the stack"""
+    bone_name: str
+    type: str
+    props: dict
+    index: Optional[int] = None
+
+
+def add_constraints(rig, specs, lookup=None):
+    """Adds all constraints described by specs directly to pose bones,
+    without selection and operators, returns created constraints"""
+
+    if bpy.context.mode == 'EDIT_ARMATURE':
+        objectmode()
+    pose_bones = rig.pose.bones
+    constraints = []
+    for spec in specs:
+        bone = lookup.pose_bone(spec.bone_name) if lookup else pose_bones[spec.bone_name]
+        bone_constraints = bone.constraints
+        constraint = bone_constraints.new(spec.type)
+        for attr, value in spec.props.items():
+            setattr(constraint, attr, value)
+        if spec.index is not None:
+            bone_constraints.move(len(bone_constraints) - 1, spec.index)
+        constraints.append(constraint)
+    return constraints
+
+
+def ik_spec(rig, bone_name, chain_length=0,
+            target_name=None, pole_name=None, pole_angle=0):
+    """Spec of IK constraint, same as add_ik_modifier"""
+
+    props = {'chain_count': chain_length}
+    if target_name is not None:
+        props['target'] = rig
+        props['subtarget'] = target_name
+    if pole_name is not None:
+        props['pole_target'] = rig
+        props['pole_subtarget'] = pole_name
+    props['pole_angle'] = math.radians(pole_angle)
+    return ConstraintSpec(bone_name, 'IK', props)
+
+
+def limit_loc_spec(bone_name,
+                   min_x=None, min_y=None, min_z=None,
+                   max_x=None, max_y=None, max_z=None):
+    """Spec of Limit Location constraint, same as add_limit_loc_constraint"""
+
+    props = {'owner_space': 'LOCAL', 'use_transform_limit': True}
+    limits = {'min_x': min_x, 'min_y': min_y, 'min_z': min_z,
+              'max_x': max_x, 'max_y': max_y, 'max_z': max_z}
+    for limit, value in limits.items():
+        if value is not None:
+            props['use_' + limit] = True
+            props[limit] = value
+    return ConstraintSpec(bone_name, 'LIMIT_LOCATION', props)
+
+
+def limit_rotation_spec(bone_name, axis="xyz",
+                        min_x=0, min_y=0, min_z=0,
+                        max_x=0, max_y=0, max_z=0,
+                        affect_transform=True):
+    """Spec of Limit Rotation constraint, same as add_limit_rotation_constraint"""
+
+    axis = axis.lower()
+    props = {
+        'use_limit_x': "x" in axis,
+        'min_x': math.radians(min_x),
+        'max_x': math.radians(max_x),
+        'use_limit_y': "y" in axis,
+        'min_y': math.radians(min_y),
+        'max_y': math.radians(max_y),
+        'use_limit_z': "z" in axis,
+        'min_z': math.radians(min_z),
+        'max_z': math.radians(max_z),
+        'use_transform_limit': affect_transform,
+        'owner_space': 'LOCAL'
+    }
+    return ConstraintSpec(bone_name, 'LIMIT_ROTATION', props)
+
+
+def copy_transforms_spec(rig, bone_name, subtarget, influence=1.0):
+    """Spec of Copy Transforms constraint, same as add_copy_transforms_constraint"""
+
+    props = {'target': rig, 'subtarget': subtarget, 'influence': influence}
+    return ConstraintSpec(bone_name, 'COPY_TRANSFORMS', props)
+
+
+def damped_track_spec(rig, bone_name, subtarget):
+    """Spec of Damped Track constraint, same as add_damped_track_modifier"""
+
+    return ConstraintSpec(bone_name, 'DAMPED_TRACK', {'target': rig, 'subtarget': subtarget})
+
+
+def locked_track_spec(rig, bone_name, subtarget, head_tail=0.0, track_axis='TRACK_Y', lock_axis='LOCK_Z'):
+    """Spec of Locked Track constraint, same as add_locked_track_constraint"""
+
+    props = {
+        'target': rig,
+        'subtarget': subtarget,
+        'head_tail': head_tail,
+        'track_axis': track_axis,
+        'lock_axis': lock_axis
+    }
+    return ConstraintSpec(bone_name, 'LOCKED_TRACK', props)
+
+
+def copy_rotation_spec(rig, bone_name, target_name, axis='xyz', mix_mode='ADD',
+                       target_space='LOCAL_WITH_PARENT', owner_space='LOCAL', name='', index=None):
+    """Spec of Copy Rotation constraint, same as add_copy_rotation_constraint"""
+
+    axis = axis.lower()
+    props = {'name': name} if name else {}
+    props.update({
+        'target': rig,
+        'subtarget': target_name,
+        'use_x': "x" in axis,
+        'use_y': "y" in axis,
+        'use_z': "z" in axis,
+        'mix_mode': mix_mode,
+        'target_space': target_space,
+        'owner_space': owner_space
+    })
+    return ConstraintSpec(bone_name, 'COPY_ROTATION', props, index)
+
+
+def shrinkwrap_spec(bone_name, target):
+    """Spec of Shrinkwrap constraint on top of the stack, same as add_shrinkwrap"""
+
+    props = {
+        'target': bpy.data.objects[target],
+        'shrinkwrap_type': 'PROJECT',
+        'project_axis': 'POS_Y',
+        'project_limit': 0.05
+    }
+    return ConstraintSpec(bone_name, 'SHRINKWRAP', props, 0)
+
+
+# Property suffix and value conversion of Transformation constraint per map type
+TRANSFORM_MAPS = {
+    'LOCATION': ('', float),
+    'ROTATION': ('_rot', math.radians),
+    'SCALE': ('_scale', float)
+}
+
+
+def transformation_spec(
+    rig,
+    bone_name: str,
+    target: str,
+    target_space = 'LOCAL',
+    owner_space = 'LOCAL',
+    map_from = 'LOCATION',
+    map_to = 'LOCATION',
+    from_min_x = 0,
+    from_max_x = 0,
+    from_min_y = 0,
+    from_max_y = 0,
+    from_min_z = 0,
+    from_max_z = 0,
+    to_min_x = 0,
+    to_max_x = 0,
+    to_min_y = 0,
+    to_max_y = 0,
+    to_min_z = 0,
+    to_max_z = 0,
+    map_to_x_from = 'X',
+    map_to_y_from = 'Y',
+    map_to_z_from = 'Z',
+    mix = 'ADD',
+    name = '',
+    index = None):
+    """Spec of Transformation constraint, same as add_transformation_constraint"""
+
+    props = {'name': name} if name else {}
+    props.update({
+        'target': rig,
+        'subtarget': target,
+        'target_space': target_space,
+        'owner_space': owner_space,
+        'map_from': map_from,
+        'map_to': map_to,
+        'map_to_x_from': map_to_x_from,
+        'map_to_y_from': map_to_y_from,
+        'map_to_z_from': map_to_z_from
+    })
+    suffix, convert = TRANSFORM_MAPS[map_from]
+    from_values = {'from_min_x': from_min_x, 'from_max_x': from_max_x,
+                   'from_min_y': from_min_y, 'from_max_y': from_max_y,
+                   'from_min_z': from_min_z, 'from_max_z': from_max_z}
+    for prop, value in from_values.items():
+        props[prop + suffix] = convert(value)
+    suffix, convert = TRANSFORM_MAPS[map_to]
+    to_values = {'to_min_x': to_min_x, 'to_max_x': to_max_x,
+                 'to_min_y': to_min_y, 'to_max_y': to_max_y,
+                 'to_min_z': to_min_z, 'to_max_z': to_max_z}
+    for prop, value in to_values.items():
+        props[prop + suffix] = convert(value)
+    props['mix_mode' + suffix] = mix
+    return ConstraintSpec(bone_name, 'TRANSFORM', props, index)
+
 def add_vertex_subtract(from_group, group, prefix = ""):
     bpy.ops.object.modifier_add(type='VERTEX_WEIGHT_MIX')
     modifier = bpy.context.object.modifiers[-1]
@@ -393,12 +777,12 @@ def add_vertex_subtract(from_group, group, prefix = ""):
     bpy.ops.object.modifier_move_to_index(modifier=modifier.name, index=0)
 
 
-def lock_bone_rot(armature, bone_name, axis = 'xyz'):
+def lock_bone_rot(armature, bone_name, axis = 'xyz', lookup=None):
     """Locks bone rotation along given axis"""
 
     posemode()
-    bone = bpy.context.object.pose.bones[bone_name]
-    select_bone(armature, bone_name)
+    bone = get_pose_bone(bone_name, lookup)
+    select_bone(armature, bone_name, lookup=lookup)
     bone.lock_rotation[0] = axis.lower().__contains__("x")
     bone.lock_rotation[1] = axis.lower().__contains__("y")
     bone.lock_rotation[2] = axis.lower().__contains__("z")
@@ -413,6 +797,22 @@ def assign_selected_to_bone_group(context, bone_group):
     print(f"Bone group with name {bone_group} not found")
 
 
+def assign_bone_groups(rig, groups, lookup=None):
+    """Assigns bones to groups given as {bone_name: group_name} in a single pass,
+    missing groups are created with colors of create_bone_groups"""
+
+    lookup = lookup or BoneLookup(rig)
+    bone_groups = rig.pose.bone_groups
+    handles = {}
+    for name in set(groups.values()):
+        handles[name] = bone_groups.get(name)
+        if handles[name] is None:
+            handles[name] = bone_groups.new(name=name)
+            handles[name].color_set = BONE_GROUP_COLORS.get(name, 'DEFAULT')
+    for bone_name, group in groups.items():
+        lookup.pose_bone(bone_name).bone_group = handles[group]
+
+
 def create_bone_group(bone_groups, name='Group', color_set='DEFAULT'):
     for group in bone_groups:
         if group.name == name:
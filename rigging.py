@@ -1,9 +1,9 @@
 import math
-import bpy
-from mathutils import Vector
+from backend import bpy
 from armature_layers import armature_layers as al
 from bone_names import *
 from rig_utils import *
+from rig_plan import *
 
 def rig_fingers_ik(arm: bpy.types.Armature):
     """Adds IK, constraints and controllers to each finger"""
@@ -19,154 +19,181 @@ def rig_fingers_ik(arm: bpy.types.Armature):
         constraint_ik_rotation(f"{finger}3.R", False, True, False)
         
 
-def add_finger_controller(context: bpy.types.Context):
-    """Adds Copy Rotation based rig for fingers"""
-    rig = context.active_object
-    arm = rig.data
+def plan_finger_controller(rig: bpy.types.Object) -> RigPlan:
+    """Plan of Copy Rotation based rig for fingers"""
+    plan = RigPlan()
+    grab_constraint = "MARCi Grab"
+    clench_constraint = "MARCi Clench"
     for side in SIDES:
         finger_ctrl = side(FINGER_CTRL)
-        extrude_bone(arm, side(HAND), (0, 0.1, 0), finger_ctrl, side(HAND), 'NORMAL')
-        editmode()
-        if side() == '.L':
-            rig.data.edit_bones[finger_ctrl].roll = math.radians(-130)
-        else:
-            rig.data.edit_bones[finger_ctrl].roll = math.radians(130)
-        posemode()
-        select_bone(arm, finger_ctrl)
-        context.active_pose_bone.lock_location[0] = True
-        context.active_pose_bone.lock_location[2] = True
-        assign_selected_to_bone_group(bpy.context, BoneGroups.sk_ctrl)
-        add_limit_rotation_constraint(arm, finger_ctrl, axis='xyz', max_x=110, min_x=-50, max_y=5, min_y=-5, max_z=18, min_z=-18)
-        add_limit_loc_constraint(arm, finger_ctrl, min_y = -0.1, max_y = 0)
+        plan.bones.append(BoneSpec(finger_ctrl, side(HAND), 'EXTRUDE', (0, 0.1, 0), 'NORMAL',
+                                   parent=side(HAND), roll=-130 if side() == '.L' else 130))
+        plan.pose(finger_ctrl, lock_location=(True, False, True))
+        plan.groups[finger_ctrl] = BoneGroups.sk_ctrl
+        plan.constraints.append(limit_rotation_spec(finger_ctrl, axis='xyz', max_x=110, min_x=-50,
+                                                    max_y=5, min_y=-5, max_z=18, min_z=-18))
+        plan.constraints.append(limit_loc_spec(finger_ctrl, min_y = -0.1, max_y = 0))
         for finger in FINGERS[1:]:
             for i in range (1, 4):
-                grab_constraint = "MARCi Grab"
-                clench_constraint = "MARCi Clench"
                 f = side(f"{finger}{i}")
                 axis = 'xyz'
                 if i > 1:
                     axis = 'x'
                 if i < 3:
-                    add_copy_rotation_constraint(rig, f, finger_ctrl, axis, target_space='LOCAL', name=grab_constraint)
-                add_transformation_constraint(context, f, finger_ctrl,
-                                              map_to='ROTATION', map_to_x_from='Y',
-                                              from_min_y=-0.1, to_min_x = 90,
-                                              name=clench_constraint)
-                posemode()
-                select_bone(arm, f)
-                bpy.ops.constraint.move_to_index(constraint=grab_constraint, owner='BONE', index=0)
-                bpy.ops.constraint.move_to_index(constraint=clench_constraint, owner='BONE', index=0)
+                    plan.constraints.append(copy_rotation_spec(rig, f, finger_ctrl, axis, target_space='LOCAL',
+                                                               name=grab_constraint, index=0))
+                plan.constraints.append(transformation_spec(rig, f, finger_ctrl,
+                                                            map_to='ROTATION', map_to_x_from='Y',
+                                                            from_min_y=-0.1, to_min_x = 90,
+                                                            name=clench_constraint, index=0))
+    return plan
 
-                
-           
+
+def add_finger_controller(context: bpy.types.Context):
+    """Adds Copy Rotation based rig for fingers"""
+    rig = context.active_object
+    execute_plan(rig, plan_finger_controller(rig))
 
 
 def create_bone_groups(context):
     """Create bone groups for color coding"""
     #TODO: Naming is obsolete
     bone_groups = context.active_object.pose.bone_groups
-    create_bone_group(bone_groups, BoneGroups.ctrl, 'THEME03')
-    create_bone_group(bone_groups, BoneGroups.poles, 'THEME06')
-    create_bone_group(bone_groups, BoneGroups.fk, 'THEME09')
-    create_bone_group(bone_groups, BoneGroups.sk_ctrl, 'THEME01')
-    create_bone_group(bone_groups, BoneGroups.fk_wo_ik, 'THEME04')
+    for name, color_set in BONE_GROUP_COLORS.items():
+        create_bone_group(bone_groups, name, color_set)
 
-def rig_arm(rig):
-    """Adds IK, pole and controller to arm"""
-    rig.data.use_mirror_x = False
-    armature = rig.data
+def plan_arm(rig: bpy.types.Object) -> RigPlan:
+    """Plan of IK, pole and controller for arm"""
+    plan = RigPlan()
     for side in SIDES:
         hand_ctrl = side(HAND_CTRL)
-        duplicate_bone(armature, side(HAND), hand_ctrl, "Root", 0.1)
-        move_to_bone(armature, hand_ctrl, side(ARM_BONES[3]))
-        posemode()
-        select_bone(armature, hand_ctrl)
-        bpy.context.active_pose_bone.lock_location[0] = False
-        bpy.context.active_pose_bone.lock_location[1] = False
-        bpy.context.active_pose_bone.lock_location[2] = False
-        try:
-            bpy.ops.constraint.delete(constraint="Limit Rotation", owner='BONE')
-        except Exception:
-            pass
-        assign_selected_to_bone_group(bpy.context, BoneGroups.ctrl)
-        select_bone(armature, side(HAND))
-        bpy.context.active_bone.use_inherit_rotation = False
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk)
-        add_copy_rotation_constraint(rig, side(HAND), hand_ctrl, "xyz")
         arm_pole = side(ARM_POLE)
-        extrude_bone(armature, side(ARM_BONES[1]), (0, 0.02, 0), arm_pole)
-        move_bone(armature, arm_pole, Vector((0, 0.2, 0)))
-        posemode()
-        select_bone(armature, arm_pole)
-        assign_selected_to_bone_group(bpy.context, BoneGroups.poles)
-        add_ik_modifier(rig, side(ARM_BONES[3]), 4, hand_ctrl, arm_pole, -90)
-        constraint_ik_rotation(armature, side(ARM_BONES[1]))
-        constraint_ik_rotation(armature, side(ARM_BONES[3]))
-        posemode()
-        select_bone(armature, side(ARM_BONES[0]))
-        select_bone(armature, side(ARM_BONES[2]), True)
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk)
-        select_bone(armature, side(ARM_BONES[1]))
-        select_bone(armature, side(ARM_BONES[3]), True)
-        select_bone(armature, side(COLLAR), True)
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk_wo_ik)
-        
+        plan.bones += [
+            BoneSpec(hand_ctrl, side(HAND), 'DUPLICATE', parent="Root", length=0.1,
+                     snap_to=(side(ARM_BONES[3]), False, False)),
+            BoneSpec(side(HAND), use_inherit_rotation=False),
+            BoneSpec(arm_pole, side(ARM_BONES[1]), 'EXTRUDE', (0, 0.02, 0), parent="Root",
+                     translate=(0, 0.2, 0))
+        ]
+        plan.removed_constraints.append((hand_ctrl, "Limit Rotation"))
+        plan.pose(hand_ctrl, lock_location=(False, False, False))
+        plan.constraints.append(copy_rotation_spec(rig, side(HAND), hand_ctrl, "xyz"))
+        plan.constraints.append(ik_spec(rig, side(ARM_BONES[3]), 4, hand_ctrl, arm_pole, -90))
+        plan.pose(side(ARM_BONES[1]), lock_ik_x=True, lock_ik_y=False, lock_ik_z=True)
+        plan.pose(side(ARM_BONES[3]), lock_ik_x=True, lock_ik_y=False, lock_ik_z=True)
+        plan.groups.update({
+            hand_ctrl: BoneGroups.ctrl,
+            side(HAND): BoneGroups.fk,
+            arm_pole: BoneGroups.poles,
+            side(ARM_BONES[0]): BoneGroups.fk,
+            side(ARM_BONES[2]): BoneGroups.fk,
+            side(ARM_BONES[1]): BoneGroups.fk_wo_ik,
+            side(ARM_BONES[3]): BoneGroups.fk_wo_ik,
+            side(COLLAR): BoneGroups.fk_wo_ik
+        })
+    return plan
 
 
-def rig_leg(rig):
+def rig_arm(rig):
     """Adds IK, pole and controller to arm"""
-    rig.data.use_mirror_x = False
+    execute_plan(rig, plan_arm(rig))
+
+
+def plan_leg(rig: bpy.types.Object) -> RigPlan:
+    """Plan of IK, pole and controller for leg"""
+    plan = RigPlan()
     for side in SIDES:
         leg_ctrl = side(LEG_CONTROLLER)
-        extrude_bone(rig.data, side(LEG_BONES[2]), (0, -0.1, 0), leg_ctrl)
-        move_to_bone(rig.data, leg_ctrl, side(LEG_BONES[2]))
-        editmode()
-        if side() == '.L':
-            rig.data.edit_bones[leg_ctrl].roll = math.radians(180)
-        else:
-            rig.data.edit_bones[leg_ctrl].roll = math.radians(-180)
-        posemode()
-        select_bone(rig.data, leg_ctrl)
-        bpy.ops.constraint.delete(constraint="Limit Rotation", owner='BONE')
-        assign_selected_to_bone_group(bpy.context, BoneGroups.ctrl)
-        select_bone(rig.data, side(FOOT))
-        bpy.context.active_bone.use_inherit_rotation = False
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk)
         leg_pole = side(LEG_POLE)
-        add_copy_rotation_constraint(rig, side(FOOT), leg_ctrl, "xyz")
-        extrude_bone(rig.data, side(LEG_BONES[1]), (0, 0.02, 0), leg_pole)
-        move_bone(rig.data, leg_pole, Vector((0, -0.4, 0)))
-        posemode()
-        select_bone(rig.data, leg_pole)
-        assign_selected_to_bone_group(bpy.context, BoneGroups.poles)
-        add_ik_modifier(rig, side(LEG_BONES[2]), 3, leg_ctrl, leg_pole, -90)
-        constraint_ik_rotation(rig.data, side(LEG_BONES[1]))
-        posemode()
-        select_bone(rig.data, side(LEG_BONES[0]))
-        select_bone(rig.data, side(LEG_BONES[2]), True)
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk)
-        select_bone(rig.data, side(LEG_BONES[1]))
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk_wo_ik)
+        plan.bones += [
+            BoneSpec(leg_ctrl, side(LEG_BONES[2]), 'EXTRUDE', (0, -0.1, 0), parent="Root",
+                     snap_to=(side(LEG_BONES[2]), False, False),
+                     roll=180 if side() == '.L' else -180),
+            BoneSpec(side(FOOT), use_inherit_rotation=False),
+            BoneSpec(leg_pole, side(LEG_BONES[1]), 'EXTRUDE', (0, 0.02, 0), parent="Root",
+                     translate=(0, -0.4, 0))
+        ]
+        plan.removed_constraints.append((leg_ctrl, "Limit Rotation"))
+        plan.constraints.append(copy_rotation_spec(rig, side(FOOT), leg_ctrl, "xyz"))
+        plan.constraints.append(ik_spec(rig, side(LEG_BONES[2]), 3, leg_ctrl, leg_pole, -90))
+        plan.pose(side(LEG_BONES[1]), lock_ik_x=True, lock_ik_y=False, lock_ik_z=True)
+        plan.groups.update({
+            leg_ctrl: BoneGroups.ctrl,
+            side(FOOT): BoneGroups.fk,
+            leg_pole: BoneGroups.poles,
+            side(LEG_BONES[0]): BoneGroups.fk,
+            side(LEG_BONES[2]): BoneGroups.fk,
+            side(LEG_BONES[1]): BoneGroups.fk_wo_ik
+        })
+    return plan
+
+
+def rig_leg(rig):
+    """Adds IK, pole and controller to leg"""
+    execute_plan(rig, plan_leg(rig))
+
+
+def plan_leg_with_pole(rig: bpy.types.Object) -> RigPlan:
+    """Plan of leg IK with pole constraint, as applied by Rig leg operator"""
+    return plan_leg(rig).extend(
+        plan_pole_constraint(rig, (0, 0.02, 0), LEG_BONES[0], LEG_BONES[1], LEG_BONES[2],
+                             LEG_POLE, LEG_CONTROLLER, "Leg.pole.constraint"))
+
+
+def plan_root_bone(rig: bpy.types.Object) -> RigPlan:
+    """Plan of root bone at armature origin parenting hip,
+    all bones get Euler XYZ rotation mode"""
+    plan = RigPlan()
+    plan.bones += [
+        BoneSpec('Root', kind='NEW', head=(0, 0, 0), tail=(0, 0, 0.3), parent=None),
+        BoneSpec(SPINE_BONES[0], parent='Root')
+    ]
+    for bone_name in [bone.name for bone in rig.data.bones] + ['Root']:
+        plan.pose(bone_name, rotation_mode='XYZ')
+    plan.groups['Root'] = BoneGroups.ctrl
+    return plan
+
+
+def add_root_bone(rig: bpy.types.Object):
+    """Adds root bone and parents hip to it, changes rotation mode of all bones to Euler XYZ"""
+    execute_plan(rig, plan_root_bone(rig))
+
+
+def plan_pole_constraint(rig, extrude_vec, first_bone, second_bone,
+                         third_bone, pole, controller, name) -> RigPlan:
+    """Plan of bones and constraints
+    to avoid IK flipping around pole"""
+    plan = RigPlan()
+    for side in SIDES:
+        first, second, third = (f"{name}.{i}{side()}" for i in range(1, 4))
+        # Missing first bone is left for preflight to report
+        first_parent = getattr(rig.data.bones.get(side(first_bone)), 'parent', None)
+        plan.bones += [
+            BoneSpec(first, side(first_bone), 'EXTRUDE', extrude_vec, 'NORMAL', from_head=True,
+                     parent=first_parent.name if first_parent else None),
+            BoneSpec(second, side(second_bone), 'EXTRUDE', extrude_vec, 'NORMAL', parent=None),
+            BoneSpec(third, side(third_bone), 'EXTRUDE', extrude_vec, 'NORMAL', parent=side(controller)),
+            BoneSpec(side(pole), parent=second)
+        ]
+        plan.constraints += [
+            copy_transforms_spec(rig, second, first, 1),
+            copy_transforms_spec(rig, second, third, 0.5),
+            damped_track_spec(rig, second, side(controller))
+        ]
+    return plan
 
 
 def add_pole_constraint(rig, extrude_vec, first_bone, second_bone, 
                         third_bone, pole, controller, name):
     """Adds bones and constraints
     to avoid IK flipping around pole"""
-    for side in SIDES:
-        extrude_bone(rig.data, side(first_bone), extrude_vec, f"{name}.1{side()}", rig.data.bones[side(first_bone)].parent.name, from_head=True, orient_type='NORMAL')
-        extrude_bone(rig.data, side(second_bone), extrude_vec, f"{name}.2{side()}", None, orient_type='NORMAL')
-        extrude_bone(rig.data, side(third_bone), extrude_vec, f"{name}.3{side()}", side(controller), orient_type='NORMAL')
-        add_copy_transforms_constraint(rig, f"{name}.2{side()}", f"{name}.1{side()}", 1)
-        add_copy_transforms_constraint(rig, f"{name}.2{side()}", f"{name}.3{side()}", 0.5)
-        add_damped_track_modifier(rig, f"{name}.2{side()}", side(controller))
-        editmode()
-        rig.data.edit_bones[side(pole)].parent = rig.data.edit_bones[f"{name}.2{side()}"]
+    execute_plan(rig, plan_pole_constraint(rig, extrude_vec, first_bone, second_bone,
+                                           third_bone, pole, controller, name))
 
 
-def rig_foot_rocker(rig: bpy.types.Object):
-    rig.data.use_mirror_x = False
-    armature = rig.data
+def plan_foot_rocker(rig: bpy.types.Object) -> RigPlan:
+    """Plan of controller rocking foot around heel, toe and sides"""
+    plan = RigPlan()
     ground_level = 0.015
     heel_head_position = {
         '.L': (0.2, 0.1, ground_level), 
@@ -177,210 +204,197 @@ def rig_foot_rocker(rig: bpy.types.Object):
         '.R': (-0.195, 0.13, ground_level)
         }
     bone_len  = 0.03
-    for side in [left_bone, right_bone]:
-        
-        deselect_all()
+    mch_layers = al.single_layer(29)
+    for side in SIDES:
         foot_roll_side_left = side(mch_bone(left_bone(FOOT + ".Roll.side")))
-        editmode()
-        bpy.ops.armature.bone_primitive_add(name=foot_roll_side_left)
-        select_bone(armature, foot_roll_side_left)
-        bpy.context.active_bone.head = heel_head_position[side()]
-        bpy.context.active_bone.tail = heel_tail_position[side()]
-        bpy.context.active_bone.use_deform = False
-        bpy.context.active_bone.parent = armature.edit_bones[side(LEG_CONTROLLER)]
-        bpy.ops.transform.translate(value=(0.025, 0, 0), orient_type='LOCAL')
-        bpy.context.active_bone.roll = 0
-        bpy.context.active_bone.layers = al.single_layer(29)
-
         foot_roll_side_right = side(mch_bone(right_bone(FOOT + ".Roll.side")))
-        duplicate_bone(armature, foot_roll_side_left, foot_roll_side_right, foot_roll_side_left)
-        select_bone(armature, foot_roll_side_right)
-        bpy.ops.transform.translate(value=(-0.05, 0, 0), orient_type='LOCAL')
-        bpy.context.active_bone.roll = 0
-        bpy.context.active_bone.layers = al.single_layer(29)
-
         foot_roll_heel = side(mch_bone(FOOT + ".Roll.Heel"))
-        duplicate_bone(armature, foot_roll_side_left, foot_roll_heel, foot_roll_side_right)
-        select_bone(armature, foot_roll_heel)
-        bpy.ops.transform.translate(value=(-0.025, 0, 0), orient_type='LOCAL')
-        bpy.context.active_bone.roll = 0
-        bpy.context.active_bone.layers = al.single_layer(29)
-
         foot_roll = side(mch_bone(FOOT + ".Roll"))
-        print(foot_roll)
-        duplicate_bone(armature, side(TOE), foot_roll, foot_roll_heel, 0.03)
-        move_to_bone(armature, foot_roll, side(TOE), True, True)
-        editmode()
-        select_bone(armature, foot_roll)
-        bpy.context.active_bone.tail[2] = bpy.context.active_bone.head[2]
-        bpy.context.active_bone.use_deform = False
-        bpy.context.active_bone.roll = 0
-        posemode()
-        bpy.context.active_pose_bone.custom_shape = None
-        bpy.context.active_bone.layers = al.single_layer(29)
-
         foot_mch = side(mch_bone(FOOT))
-        print(foot_mch)
-        duplicate_bone(armature, side(FOOT), foot_mch, foot_roll)
-        move_to_bone(armature, foot_mch, side(LEG_BONES[2]))
-        select_bone(armature, foot_mch)
-        bpy.context.active_bone.use_deform = False
-        bpy.context.active_bone.use_inherit_rotation = True
-        posemode()
-        bpy.context.active_pose_bone.custom_shape = None
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk_wo_ik)
-        remove_constraint(rig, foot_mch, 'Copy Rotation')
-        bpy.context.active_bone.layers = al.single_layer(29)
-
         metatarsals_mch = side(mch_bone(METATARSALS))
-        print(metatarsals_mch)
-        duplicate_bone(armature, side(METATARSALS), metatarsals_mch)
-        select_bone(armature, metatarsals_mch)
-        bpy.context.active_bone.use_deform = False
-        posemode()
-        bpy.context.active_pose_bone.custom_shape = None
-        assign_selected_to_bone_group(bpy.context, BoneGroups.fk)
-        bpy.context.active_bone.layers = al.single_layer(29)
-
         toe_mch = side(mch_bone(TOE))
-        print(toe_mch)
-        duplicate_bone(armature, side(TOE), toe_mch, foot_roll_heel)
-        select_bone(armature, toe_mch)
-        assign_selected_to_bone_group(bpy.context, BoneGroups.sk_ctrl)
-        bpy.context.active_bone.use_deform = False
-        bpy.context.active_bone.layers = al.single_layer(1)
-
         foot_rocker = side(FOOT_ROCKER)
-        extrude_bone(armature, side(FOOT), (0, bone_len, 0), foot_rocker, side(LEG_CONTROLLER), from_head = True)
-        posemode()
-        select_bone(armature, foot_rocker)
-        assign_selected_to_bone_group(bpy.context, BoneGroups.sk_ctrl)
-        
-        add_copy_rotation_constraint(rig, foot_roll_side_left, foot_rocker, "y", 'REPLACE', 'LOCAL')
-        add_limit_rotation_constraint(armature, foot_roll_side_left, "y", min_y = 0, max_y = 180)
+        plan.bones += [
+            BoneSpec(foot_roll_side_left, kind='NEW',
+                     head=heel_head_position[side()], tail=heel_tail_position[side()],
+                     parent=side(LEG_CONTROLLER), translate=(0.025, 0, 0), translate_orient='LOCAL',
+                     roll=0, layers=mch_layers, use_deform=False),
+            BoneSpec(foot_roll_side_right, foot_roll_side_left, 'DUPLICATE', parent=foot_roll_side_left,
+                     translate=(-0.05, 0, 0), translate_orient='LOCAL', roll=0, layers=mch_layers),
+            BoneSpec(foot_roll_heel, foot_roll_side_left, 'DUPLICATE', parent=foot_roll_side_right,
+                     translate=(-0.025, 0, 0), translate_orient='LOCAL', roll=0, layers=mch_layers),
+            BoneSpec(foot_roll, side(TOE), 'DUPLICATE', parent=foot_roll_heel, length=0.03,
+                     snap_to=(side(TOE), True, True), level=True,
+                     roll=0, layers=mch_layers, use_deform=False),
+            BoneSpec(foot_mch, side(FOOT), 'DUPLICATE', parent=foot_roll,
+                     snap_to=(side(LEG_BONES[2]), False, False),
+                     layers=mch_layers, use_deform=False, use_inherit_rotation=True),
+            BoneSpec(metatarsals_mch, side(METATARSALS), 'DUPLICATE', layers=mch_layers, use_deform=False),
+            BoneSpec(toe_mch, side(TOE), 'DUPLICATE', parent=foot_roll_heel,
+                     layers=al.single_layer(1), use_deform=False),
+            BoneSpec(foot_rocker, side(FOOT), 'EXTRUDE', (0, bone_len, 0), from_head=True,
+                     parent=side(LEG_CONTROLLER))
+        ]
+        for bone_name in (foot_roll, foot_mch, metatarsals_mch):
+            plan.custom_shapes[bone_name] = None
+        plan.groups.update({
+            foot_mch: BoneGroups.fk_wo_ik,
+            metatarsals_mch: BoneGroups.fk,
+            toe_mch: BoneGroups.sk_ctrl,
+            foot_rocker: BoneGroups.sk_ctrl
+        })
+        plan.removed_constraints.append((foot_mch, 'Copy Rotation'))
+        plan.constraints += [
+            copy_rotation_spec(rig, foot_roll_side_left, foot_rocker, "y", 'REPLACE', 'LOCAL'),
+            limit_rotation_spec(foot_roll_side_left, "y", min_y = 0, max_y = 180),
+            copy_rotation_spec(rig, foot_roll_side_right, foot_rocker, "y", 'REPLACE', 'LOCAL'),
+            limit_rotation_spec(foot_roll_side_right, "y", min_y = -180, max_y = 0),
+            copy_rotation_spec(rig, foot_roll_heel, foot_rocker, "x", 'REPLACE', 'LOCAL'),
+            limit_rotation_spec(foot_roll_heel, "x", min_x = -180, max_x = 0),
+            copy_rotation_spec(rig, foot_roll, foot_rocker, "x", 'REPLACE', 'LOCAL'),
+            limit_rotation_spec(foot_roll, "x", min_x = 0, max_x = 180),
+            copy_rotation_spec(rig, side(TOE), toe_mch, "xyz", 'REPLACE', 'WORLD','WORLD'),
+            copy_rotation_spec(rig, side(METATARSALS), metatarsals_mch, "xyz", 'REPLACE', 'WORLD','WORLD'),
+            copy_rotation_spec(rig, side(FOOT), foot_mch, "xyz", 'REPLACE', 'WORLD','WORLD')
+        ]
+        # IK of the shin follows foot mechanism instead of leg controller
+        plan.constraint_edits.append((side(LEG_BONES[2]), -1, {'subtarget': foot_mch}))
+    return plan
 
-        add_copy_rotation_constraint(rig, foot_roll_side_right, foot_rocker, "y", 'REPLACE', 'LOCAL')
-        add_limit_rotation_constraint(armature, foot_roll_side_right, "y", min_y = -180, max_y = 0)
 
-        add_copy_rotation_constraint(rig, foot_roll_heel, foot_rocker, "x", 'REPLACE', 'LOCAL')
-        add_limit_rotation_constraint(armature, foot_roll_heel, "x", min_x = -180, max_x = 0)
+def rig_foot_rocker(rig: bpy.types.Object):
+    execute_plan(rig, plan_foot_rocker(rig))
 
-        add_copy_rotation_constraint(rig, foot_roll, foot_rocker, "x", 'REPLACE', 'LOCAL')
-        add_limit_rotation_constraint(armature, foot_roll, "x", min_x = 0, max_x = 180)
 
-        add_copy_rotation_constraint(rig, side(TOE), toe_mch, "xyz", 'REPLACE', 'WORLD','WORLD')
-        add_copy_rotation_constraint(rig, side(METATARSALS), metatarsals_mch, "xyz", 'REPLACE', 'WORLD','WORLD')
-        add_copy_rotation_constraint(rig, side(FOOT), foot_mch, "xyz", 'REPLACE', 'WORLD','WORLD')
+def hand_driver_rules(side) -> list[DriverRetarget]:
+    """Hand corrective drivers read rotation of Hand.driver bone"""
+    suffix = side()[1:2]
+    hand_driver = side("Hand.driver")
+    return [DriverRetarget(f"pJCMHandDwn_70_{suffix}(fin)", hand_driver),
+            DriverRetarget(f"pJCMHandUp_80_{suffix}(fin)", hand_driver)]
 
-        posemode()
-        shin = side(LEG_BONES[2])
-        bone = bpy.context.object.pose.bones[shin]
-        select_bone(rig.data, shin)
-        constraint = bone.constraints[-1]
-        constraint.subtarget = foot_mch 
 
+def foot_driver_rules(side) -> list[DriverRetarget]:
+    """Foot corrective drivers read rotation of Foot.driver bone with rescaled expressions"""
+    suffix = side()[1:2]
+    foot_driver = side("Foot.driver")
+    return [DriverRetarget(f"pJCMFootDwn_75_{suffix}(fin)", foot_driver, '-1.13*A'), # initial down 0.764*A
+            DriverRetarget(f"pJCMHDFootUp_40_{suffix}(fin)", foot_driver, '1.45*A')] # initial up -1.432*A
 
-def fix_hand_driver(rig):
-    """Fixes wrong interaction of hand corrective shapekeys with IK"""
-    armature = rig.data
-    rig.data.use_mirror_x = False
-    sides = [left_bone, right_bone]
-    for side in sides:
+
+def shldr_driver_rules(side) -> list[DriverRetarget]:
+    """Shoulder corrective drivers read rotation of Shldr.Drv.X and Shldr.Drv.Z bones"""
+    ctrl_side = 'n' if side() == '.L' else ''
+    suffix = side()[1:2]
+    drivers_to_fix_x = [f"CTRLMD_N_YRotate_{ctrl_side}110(fin)", f"pJCMShldrFwd_110_{suffix}(fin)"]
+    drivers_to_fix_z = [f"pJCMShldrDown_40_{suffix}(fin)", f"pJCMShldrUp_90_{suffix}(fin)", 
+                        f"CTRLMD_N_ZRotate_{ctrl_side}40(fin)", f"CTRLMD_N_ZRotate_{ctrl_side}90(fin)"]
+    rules = [DriverRetarget(name, side("Shldr.Drv.X"), all_variables=True) for name in drivers_to_fix_x]
+    rules += [DriverRetarget(name, side("Shldr.Drv.Z"), all_variables=True) for name in drivers_to_fix_z]
+    return rules
+
+
+def plan_hand_driver_fix(rig) -> RigPlan:
+    """Plan of bone fixing wrong interaction of hand corrective shapekeys with IK"""
+    plan = RigPlan()
+    for side in SIDES:
         hand_driver = side("Hand.driver")
         forearm = side(ARM_BONES[3])
-        extrude_bone(armature, forearm, (0, -0.01, 0), hand_driver, forearm, 'NORMAL')
-        add_locked_track_constraint(rig, hand_driver, side(HAND), 1.0, 'TRACK_NEGATIVE_Y')
-        add_limit_rotation_constraint(armature, hand_driver, axis = "z", min_z = -90, max_z = 90)
-        posemode()
-        select_bone(armature, hand_driver)
-        bpy.ops.pose.armature_apply(selected=True)
-        bpy.ops.pose.bone_layers(layers=al.single_layer(25))
-    for side in sides:
-        hand_driver = side("Hand.driver")
-        suffix = side()[1:2]
-        for f in armature.animation_data.drivers:
-            if f"pJCMHandDwn_70_{suffix}(fin)" in f.data_path or f"pJCMHandUp_80_{suffix}(fin)" in f.data_path:
-                f.driver.variables[0].targets[0].bone_target = hand_driver
+        plan.bones.append(BoneSpec(hand_driver, forearm, 'EXTRUDE', (0, -0.01, 0), 'NORMAL', parent=forearm,
+                                   layers=al.single_layer(25)))
+        plan.constraints.append(locked_track_spec(rig, hand_driver, side(HAND), 1.0, 'TRACK_NEGATIVE_Y'))
+        plan.constraints.append(limit_rotation_spec(hand_driver, axis = "z", min_z = -90, max_z = 90))
+        plan.rest_pose.append(hand_driver)
+        plan.drivers += hand_driver_rules(side)
+    return plan
 
 
-def fix_foot_driver(rig):
-    """Fixes wrong interaction of foot corrective shapekeys with IK (kind of)"""
-    armature = rig.data
-    rig.data.use_mirror_x = False
-    sides = [left_bone, right_bone]
-    for side in sides:
+def fix_hand_driver(rig):
+    """Fixes wrong interaction of hand corrective shapekeys with IK"""
+    execute_plan(rig, plan_hand_driver_fix(rig))
+
+
+def plan_foot_driver_fix(rig) -> RigPlan:
+    """Plan of bone fixing wrong interaction of foot corrective shapekeys with IK (kind of)"""
+    plan = RigPlan()
+    for side in SIDES:
         foot_driver = side("Foot.driver")
         shin = side(LEG_BONES[2])
-        extrude_bone(armature, shin, (0, -0.01, 0), foot_driver, shin, 'NORMAL')
-        add_locked_track_constraint(rig, foot_driver, side(FOOT), 1.0, 'TRACK_NEGATIVE_Z', 'LOCK_X')
-        add_limit_rotation_constraint(armature, foot_driver, axis = "x", min_x = -90, max_x = 90)
-        posemode()
-        select_bone(armature, foot_driver)
-        bpy.ops.pose.armature_apply(selected=True)
-        bpy.ops.pose.bone_layers(layers=al.single_layer(27))
-    for side in sides:
-        foot_driver = side("Foot.driver")
-        suffix = side()[1:2]
-        for drv in armature.animation_data.drivers:
-            if f"pJCMFootDwn_75_{suffix}(fin)" in drv.data_path:
-                drv.driver.variables[0].targets[0].bone_target = foot_driver
-                drv.driver.expression = '-1.13*A' # initial down 0.764*A
-            elif f"pJCMHDFootUp_40_{suffix}(fin)" in drv.data_path:
-                drv.driver.variables[0].targets[0].bone_target = foot_driver
-                drv.driver.expression = '1.45*A' # initial up -1.432*A
+        plan.bones.append(BoneSpec(foot_driver, shin, 'EXTRUDE', (0, -0.01, 0), 'NORMAL', parent=shin,
+                                   layers=al.single_layer(27)))
+        plan.constraints.append(locked_track_spec(rig, foot_driver, side(FOOT), 1.0, 'TRACK_NEGATIVE_Z', 'LOCK_X'))
+        plan.constraints.append(limit_rotation_spec(foot_driver, axis = "x", min_x = -90, max_x = 90))
+        plan.rest_pose.append(foot_driver)
+        plan.drivers += foot_driver_rules(side)
+    return plan
 
 
-def fix_shldr_driver(rig: bpy.types.Object):
+def fix_foot_driver(rig):
     """Fixes wrong interaction of foot corrective shapekeys with IK (kind of)"""
-    arm = rig.data
-    rig.data.use_mirror_x = False
-    al.show_all(arm)
+    execute_plan(rig, plan_foot_driver_fix(rig))
+
+
+def plan_shldr_driver_fix(rig: bpy.types.Object) -> RigPlan:
+    """Plan of bones fixing wrong interaction of shoulder corrective shapekeys with IK"""
+    plan = RigPlan()
     for side in SIDES:
-        shldr_driver_x = side("Shldr.Drv.X")
         shldr = side(ARM_BONES[0])
-        duplicate_bone(arm, shldr, shldr_driver_x, length = 0.03)
-        add_locked_track_constraint(rig, shldr_driver_x, shldr, 1.0, 'TRACK_Y', 'LOCK_X')
-        add_limit_rotation_constraint(arm, shldr_driver_x, axis = "x", min_x = -40, max_x = 110)
-        posemode()
-        select_bone(arm, shldr_driver_x)
-        bpy.ops.pose.bone_layers(layers=al.single_layer(25))
-        
+        shldr_driver_x = side("Shldr.Drv.X")
         shldr_driver_z = side("Shldr.Drv.Z")
-        duplicate_bone(arm, shldr, shldr_driver_z, length = 0.03)
-        add_locked_track_constraint(rig, shldr_driver_z, shldr, 1.0, 'TRACK_Y', 'LOCK_Z')
-        add_limit_rotation_constraint(arm, shldr_driver_z, axis = "z", min_z = -40, max_z = 90)
-        posemode()
-        select_bone(arm, shldr_driver_z)
-        bpy.ops.pose.bone_layers(layers=al.single_layer(25))
-
-        ctrl_side = 'n' if side() == '.L' else ''
-        suffix = side()[1:2]
-        drivers_to_fix_x = [f"CTRLMD_N_YRotate_{ctrl_side}110(fin)", f"pJCMShldrFwd_110_{suffix}(fin)", ]
-        drivers_to_fix_z = [f"pJCMShldrDown_40_{suffix}(fin)", f"pJCMShldrUp_90_{suffix}(fin)", 
-                            f"CTRLMD_N_ZRotate_{ctrl_side}40(fin)", f"CTRLMD_N_ZRotate_{ctrl_side}90(fin)"]
-        for drv in arm.animation_data.drivers:
-            if any(drv_name in drv.data_path for drv_name in drivers_to_fix_x):
-                print("Driver:", drv.data_path)
-                for var in drv.driver.variables:
-                    try:
-                        # if var.targets[0].bone_target == shldr:
-                        var.targets[0].bone_target = shldr_driver_x
-                    except AttributeError:
-                        pass
-            elif any(drv_name in drv.data_path for drv_name in drivers_to_fix_z):
-                print("Driver:", drv.data_path)
-                for var in drv.driver.variables:
-                    try:
-                        # if var.targets[0].bone_target == shldr:
-                        var.targets[0].bone_target = shldr_driver_z
-                    except AttributeError:
-                        pass
-    al.restore_layers(arm)        
+        plan.bones += [
+            BoneSpec(shldr_driver_x, shldr, 'DUPLICATE', length=0.03, layers=al.single_layer(25)),
+            BoneSpec(shldr_driver_z, shldr, 'DUPLICATE', length=0.03, layers=al.single_layer(25))
+        ]
+        plan.constraints += [
+            locked_track_spec(rig, shldr_driver_x, shldr, 1.0, 'TRACK_Y', 'LOCK_X'),
+            limit_rotation_spec(shldr_driver_x, axis = "x", min_x = -40, max_x = 110),
+            locked_track_spec(rig, shldr_driver_z, shldr, 1.0, 'TRACK_Y', 'LOCK_Z'),
+            limit_rotation_spec(shldr_driver_z, axis = "z", min_z = -40, max_z = 90)
+        ]
+        plan.drivers += shldr_driver_rules(side)
+    return plan
+
+
+def fix_shldr_driver(rig: bpy.types.Object):
+    """Fixes wrong interaction of shoulder corrective shapekeys with IK (kind of)"""
+    with al.preserved(rig, al.all_layers):
+        execute_plan(rig, plan_shldr_driver_fix(rig))
+
+
+def fix_all_drivers(rig: bpy.types.Object):
+    """Applies hand, foot and shoulder fixes with a single pass over armature drivers"""
+    plan = plan_hand_driver_fix(rig).extend(plan_foot_driver_fix(rig)).extend(plan_shldr_driver_fix(rig))
+    with al.preserved(rig, al.all_layers):
+        execute_plan(rig, plan)
+
+
+def run_rig_operator(operator: bpy.types.Operator, rig: bpy.types.Object, function, *args) -> set[str]:
+    """Runs rig function with all layers shown, a plan rejected by preflight
+    is reported as operator error and leaves the rig untouched.
+    Edit mode is left first, so the single undo step of the operator
+    is a global one instead of an edit mode step holding only edit bones"""
+    if rig.mode == 'EDIT':
+        objectmode()
+    try:
+        with al.preserved(rig, al.all_layers):
+            function(*args)
+    except PreflightError as error:
+        print(error)
+        operator.report({'ERROR'}, str(error))
+        return {'CANCELLED'}
+    return {'FINISHED'}
 
 
 #TODO: Move to animation module
 def constraint_bone_to_empty(context: bpy.types.Context):
+    """Adds empty at active pose bone and a Copy Location constraint of the bone to it,
+    raises PreflightError before adding anything when there is no such bone"""
     bone = context.active_pose_bone
+    rig = context.object
+    available = {pose_bone.name for pose_bone in rig.pose.bones} \
+        if rig is not None and rig.type == 'ARMATURE' else set()
+    if bone is None or bone.name not in available:
+        raise PreflightError(["Constraint bone to empty: no active pose bone of active armature"])
     bone_mat = bone.matrix
     arm_mat = context.object.matrix_world
     matrix = arm_mat @ bone_mat
@@ -396,30 +410,40 @@ class FixFootDriver(bpy.types.Operator):
     """Adds bone to fix foot corrective driver with IK"""
     bl_label = "Fix Foot Driver"
     bl_idname = "view3d.fix_foot_driver"
+    bl_options = {'REGISTER', 'UNDO'}
     
     def execute(self, context: bpy.types.Context):
-        fix_foot_driver(context.object)
-        return {'FINISHED'}
+        return run_rig_operator(self, context.object, fix_foot_driver, context.object)
 
 
 class FixShoulderDriver(bpy.types.Operator):
     """Adds bones to fix shoulder corrective driver with IK"""
     bl_label = "Fix Shldr Driver"
     bl_idname = "view3d.fix_shldr_driver"
+    bl_options = {'REGISTER', 'UNDO'}
     
     def execute(self, context: bpy.types.Context):
-        fix_shldr_driver(context.object)
-        return {'FINISHED'}
+        return run_rig_operator(self, context.object, fix_shldr_driver, context.object)
+
+
+class FixAllDrivers(bpy.types.Operator):
+    """Adds bones to fix hand, foot and shoulder corrective drivers with IK"""
+    bl_label = "Fix All Drivers"
+    bl_idname = "view3d.fix_all_drivers"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context: bpy.types.Context):
+        return run_rig_operator(self, context.object, fix_all_drivers, context.object)
 
 
 class FixHandDriver(bpy.types.Operator):
     """Adds bone to fix hand corrective driver with IK"""
     bl_label = "Fix Hand Driver"
     bl_idname = "view3d.fix_hand_driver"
+    bl_options = {'REGISTER', 'UNDO'}
     
     def execute(self, context: bpy.types.Context):
-        fix_hand_driver(context.object)
-        return {'FINISHED'}
+        return run_rig_operator(self, context.object, fix_hand_driver, context.object)
 
 
 #TODO: Move to animation module
@@ -427,8 +451,13 @@ class ConstraintBoneToEmpty(bpy.types.Operator):
     """Constraints bone to empty"""
     bl_label = "Constraint bone to empty"
     bl_idname = "view3d.constraint_bone_to_empty"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        constraint_bone_to_empty(context)
+        try:
+            constraint_bone_to_empty(context)
+        except PreflightError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
         return {'FINISHED'}
 
 
@@ -436,6 +465,7 @@ class CreateBoneGroups(bpy.types.Operator):
     """Creates bone groups for color coding"""
     bl_label = "Create bone groups"
     bl_idname = "view3d.create_bone_groups"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
         create_bone_groups(context)
         return {'FINISHED'}
@@ -445,71 +475,51 @@ class AddRootBone(bpy.types.Operator):
     """Adds root bone and parents hip to it, changes rotation mode of all bones to Euler XYZ"""
     bl_label = "Adds root bone"
     bl_idname = "view3d.add_root_bone"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        current_mode = context.mode
-        bpy.ops.view3d.snap_cursor_to_center()
-        add_bone('Root')
-        editmode()
-        context.active_object.data.edit_bones['hip'].parent = context.active_object.data.edit_bones['Root']
-        context.active_object.data.edit_bones['Root'].length = 0.3
-        posemode()
-        select_bone(context.active_object.data, 'Root')
-        assign_selected_to_bone_group(context, BoneGroups.ctrl)
-        bpy.ops.pose.select_all(action='SELECT')
-        bpy.ops.pose.rotation_mode_set(type='XYZ')
-        if current_mode == 'OBJECT':
-            posemode() 
-        else:
-            editmode()
-        return {'FINISHED'}
+        result = run_rig_operator(self, context.active_object, add_root_bone, context.active_object)
+        if 'FINISHED' in result:
+            posemode()
+        return result
 
 
 class RigArm(bpy.types.Operator):
     """Rigs arm with IK"""
     bl_label = "Rig arm"
     bl_idname = "view3d.rig_arm"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        al.show_all(context.active_object.data)
-        rig_arm(context.active_object)
-        al.restore_layers(context.active_object.data)
-        return {'FINISHED'}
+        return run_rig_operator(self, context.active_object, rig_arm, context.active_object)
 
 
 class AddFingerController(bpy.types.Operator):
     """Adds controller to simultaneous finger rotation"""
     bl_label = "Add finger controller"
     bl_idname = "view3d.add_finger_controller"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        al.show_all(context.active_object.data)
-        add_finger_controller(context)
-        al.restore_layers(context.active_object.data)
-        return {'FINISHED'}
+        return run_rig_operator(self, context.active_object, add_finger_controller, context)
 
 class RigLeg(bpy.types.Operator):
     """Rigs leg with IK"""
     bl_label = "Rig leg"
     bl_idname = "view3d.rig_leg"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
         rig = context.active_object
-        al.show_all(rig.data)
-        rig_leg(rig)
-        add_pole_constraint(rig, (0, 0.02, 0), LEG_BONES[0], LEG_BONES[1], LEG_BONES[2], LEG_POLE, LEG_CONTROLLER, "Leg.pole.constraint")
-        al.restore_layers(rig.data)
-        return {'FINISHED'}
+        return run_rig_operator(self, rig, execute_plan, rig, plan_leg_with_pole(rig))
 
 
 class AddFootRocker(bpy.types.Operator):
     """Adds controller to rock food around pivot"""
     bl_label = "Add foot rocker"
     bl_idname = "view3d.add_foot_rocker"
+    bl_options = {'REGISTER', 'UNDO'}
     def execute(self, context: bpy.types.Context):
-        al.show_all(context.active_object.data)
-        rig_foot_rocker(context.active_object)
-        al.restore_layers(context.active_object.data)
-        return {'FINISHED'}
+        return run_rig_operator(self, context.active_object, rig_foot_rocker, context.active_object)
 
 
-classes = [FixFootDriver, FixHandDriver, ConstraintBoneToEmpty, CreateBoneGroups, 
+classes = [FixFootDriver, FixHandDriver, FixAllDrivers, ConstraintBoneToEmpty, CreateBoneGroups, 
            AddRootBone, RigArm, RigLeg, AddFootRocker, FixShoulderDriver, AddFingerController]
 
 def register():
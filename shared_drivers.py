@@ -0,0 +1,158 @@
+import hashlib
+from backend import bpy
+from typing import NamedTuple, Optional
+from armature_layers import armature_layers as al
+from bone_names import *
+from rig_plan import *
+from driver_fastpath import driver_owners
+from rigging import run_rig_operator
+
+# Layer of helper bone holding shared values
+SHARED_VALUES_LAYER = 31
+# Blender limits custom property names to 63 bytes
+MAX_PROPERTY_NAME = 63
+
+
+class ChannelKey(NamedTuple):
+    """Transform channel read by TRANSFORMS driver variable"""
+    id: bpy.types.Object
+    bone_target: str
+    transform_type: str
+    transform_space: str
+    rotation_mode: str
+
+    def property_name(self) -> str:
+        name = f"{self.id.name}:{self.bone_target}" if self.bone_target else self.id.name
+        name = f"{name} {self.transform_type} {self.transform_space}"
+        if self.transform_type.startswith('ROT'):
+            name = f"{name} {self.rotation_mode}"
+        encoded = name.encode()
+        if len(encoded) <= MAX_PROPERTY_NAME:
+            return name
+        # Truncated names are told apart by a digest of the full name
+        digest = hashlib.sha1(encoded).hexdigest()[:8]
+        head = encoded[:MAX_PROPERTY_NAME - len(digest) - 1].decode(errors='ignore')
+        return f"{head}~{digest}"
+
+
+def channel_key(var: bpy.types.DriverVariable) -> Optional[ChannelKey]:
+    target = var.targets[0]
+    if var.type != 'TRANSFORMS' or not isinstance(target.id, bpy.types.Object):
+        return None
+    # Rotation mode only matters for rotation channels, it must not split other channels
+    rotation_mode = target.rotation_mode if target.transform_type.startswith('ROT') else 'AUTO'
+    return ChannelKey(target.id, target.bone_target, target.transform_type,
+                      target.transform_space, rotation_mode)
+
+
+def shared_channels(owners: list[bpy.types.ID]) -> dict[ChannelKey, list[bpy.types.DriverVariable]]:
+    """Groups TRANSFORMS variables of owners' drivers by channel they read,
+    only channels read by more than one variable are returned"""
+    channels = {}
+    for owner in owners:
+        for fcurve in owner.animation_data.drivers:
+            for var in fcurve.driver.variables:
+                key = channel_key(var)
+                if key is not None:
+                    channels.setdefault(key, []).append(var)
+    return {key: variables for key, variables in channels.items() if len(variables) > 1}
+
+
+def ensure_shared_values_bone(rig: bpy.types.Object):
+    """Creates hidden helper bone holding shared values unless it exists"""
+    if SHARED_VALUES in rig.data.bones:
+        return
+    plan = RigPlan()
+    plan.bones.append(BoneSpec(SHARED_VALUES, kind='NEW', head=(0, 0, 0), tail=(0, 0, 0.05),
+                               parent="Root" if "Root" in rig.data.bones else None,
+                               layers=al.single_layer(SHARED_VALUES_LAYER), use_deform=False))
+    execute_plan(rig, plan)
+
+
+def property_names(keys: list[ChannelKey]) -> dict[ChannelKey, str]:
+    """Property name of every channel, raises PreflightError if two channels share one"""
+    names = {key: key.property_name() for key in keys}
+    seen = {}
+    errors = []
+    for key, name in names.items():
+        if name in seen:
+            errors.append(f"Property {name} would be shared by {seen[name].bone_target or seen[name].id.name} "
+                          f"and {key.bone_target or key.id.name} channels")
+        seen.setdefault(name, key)
+    if errors:
+        raise PreflightError(errors)
+    return names
+
+
+def add_shared_value(rig: bpy.types.Object, key: ChannelKey, prop: str) -> str:
+    """Drives custom property prop of helper bone with channel, returns its data path"""
+    pose_bone = rig.pose.bones[SHARED_VALUES]
+    pose_bone[prop] = 0.0
+    # Object and bone names in prop may hold quotes or backslashes
+    path = f'["{bpy.utils.escape_identifier(prop)}"]'
+    pose_bone.driver_remove(path)
+    driver = pose_bone.driver_add(path).driver
+    driver.type = 'AVERAGE'
+    var = driver.variables.new()
+    var.type = 'TRANSFORMS'
+    target = var.targets[0]
+    target.id = key.id
+    target.bone_target = key.bone_target
+    target.transform_type = key.transform_type
+    target.transform_space = key.transform_space
+    target.rotation_mode = key.rotation_mode
+    return f'pose.bones["{bpy.utils.escape_identifier(SHARED_VALUES)}"]{path}'
+
+
+def share_driver_values(rig: bpy.types.Object, owners: list[bpy.types.ID]) -> tuple[int, int]:
+    """Computes channels read by several driver variables once into properties
+    of helper bone and rewires variables to read them.
+    Every property name is checked before the first change.
+    Returns number of shared channels and of transform lookups removed per frame"""
+    channels = shared_channels(owners)
+    if not channels:
+        return 0, 0
+    names = property_names(list(channels))
+    ensure_shared_values_bone(rig)
+    removed = 0
+    for key, variables in channels.items():
+        data_path = add_shared_value(rig, key, names[key])
+        for var in variables:
+            var.type = 'SINGLE_PROP'
+            target = var.targets[0]
+            target.id_type = 'OBJECT'
+            target.id = rig
+            target.data_path = data_path
+        removed += len(variables) - 1
+    return len(channels), removed
+
+
+class ShareDriverValues(bpy.types.Operator):
+    """Reads bone channels shared by several drivers once through properties of a helper bone"""
+    bl_label = "Share driver values"
+    bl_idname = "view3d.share_driver_values"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context: bpy.types.Context):
+        rig = context.object
+        if rig is None or rig.type != 'ARMATURE':
+            self.report({'ERROR'}, "Active object is not an armature")
+            return {'CANCELLED'}
+        counts = []
+        result = run_rig_operator(self, rig, lambda: counts.extend(share_driver_values(rig, driver_owners([rig]))))
+        if 'FINISHED' not in result:
+            return result
+        channels, removed = counts
+        self.report({'INFO'}, f"Shared {channels} channels, removed {removed} transform evaluations per frame")
+        return {'FINISHED'}
+
+
+classes = [ShareDriverValues]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
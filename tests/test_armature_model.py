@@ -0,0 +1,109 @@
+import math
+import pytest
+from armature_model import ModelRig, Vector, bone_matrix
+from backend import model_backend
+from benchmark import figure_bones, corrective_names, add_driver
+from bone_names import *
+from rigging import *
+
+
+@pytest.fixture
+def rig():
+    rig = ModelRig.from_bones("Genesis", figure_bones())
+    bone_names = list(rig.data.bones.keys())
+    for i, name in enumerate(corrective_names()):
+        add_driver(rig.data, f'["{name}"]', rig, bone_names[i % len(bone_names)])
+    with model_backend(rig):
+        yield rig
+
+
+def test_bone_matrix_follows_blender_axes():
+    x_axis, y_axis, z_axis = bone_matrix((0, 0, 0), (0, 0, 1), 0).columns
+    assert (x_axis, y_axis, z_axis) == ((1, 0, 0), (0, 0, 1), (0, -1, 0))
+    x_axis, y_axis, z_axis = bone_matrix((0, 0, 0), (1, 0, 0), math.pi / 2).columns
+    assert y_axis == (1, 0, 0)
+    assert tuple(z_axis) == pytest.approx((0, -1, 0))
+
+
+def test_vector_is_copied_on_assignment():
+    rig = ModelRig.from_bones("Rig", [("a", None, (0, 0, 0), (0, 0, 1)), ("b", "a", (0, 0, 1), (0, 0, 2))])
+    a, b = rig.data.bones["a"], rig.data.bones["b"]
+    b.head = a.tail
+    b.head[2] = 5
+    assert a.tail == (0, 0, 1)
+
+
+def test_add_root_bone(rig):
+    add_root_bone(rig)
+    root = rig.pose.bones['Root']
+    assert tuple(root.tail) == (0, 0, 0.3)
+    assert rig.data.bones[SPINE_BONES[0]].parent is root
+    assert root.bone_group.name == BoneGroups.ctrl
+    assert all(bone.rotation_mode == 'XYZ' for bone in rig.pose.bones)
+    assert rig.mode == 'POSE'
+
+
+def test_rig_arm_and_leg(rig):
+    add_root_bone(rig)
+    rig_arm(rig)
+    execute_plan(rig, plan_leg_with_pole(rig))
+    for side in SIDES:
+        hand_ctrl = rig.pose.bones[side(HAND_CTRL)]
+        assert hand_ctrl.length == pytest.approx(0.1)
+        assert hand_ctrl.head == rig.data.bones[side(ARM_BONES[3])].tail
+        ik = rig.pose.bones[side(ARM_BONES[3])].constraints['IK']
+        assert (ik.subtarget, ik.pole_subtarget, ik.chain_count) == (side(HAND_CTRL), side(ARM_POLE), 4)
+        assert rig.pose.bones[side(LEG_POLE)].parent.name == f"Leg.pole.constraint.2{side()}"
+
+
+def test_foot_rocker_needs_leg(rig):
+    add_root_bone(rig)
+    with pytest.raises(PreflightError) as error:
+        rig_foot_rocker(rig)
+    assert side_names(error.value.errors, LEG_CONTROLLER)
+    assert 'Foot.Rocker.L' not in rig.data.bones
+
+
+def side_names(errors, name):
+    return [error for error in errors if any(side(name) in error for side in SIDES)]
+
+
+def test_full_rig(rig):
+    add_root_bone(rig)
+    create_bone_groups(bpy.context)
+    rig_arm(rig)
+    execute_plan(rig, plan_leg_with_pole(rig))
+    rig_foot_rocker(rig)
+    add_finger_controller(bpy.context)
+    fix_all_drivers(rig)
+    for side in SIDES:
+        assert rig.pose.bones[side(FOOT_ROCKER)].parent.name == side(LEG_CONTROLLER)
+        assert rig.pose.bones[side(LEG_BONES[2])].constraints[-1].subtarget == side(mch_bone(FOOT))
+    targets = {fcurve.data_path: fcurve.driver.variables[0].targets[0].bone_target
+               for fcurve in rig.data.animation_data.drivers}
+    assert targets['["pJCMHandDwn_70_L(fin)"]'] == 'Hand.driver.L'
+    assert targets['["pJCMShldrUp_90_R(fin)"]'] == 'Shldr.Drv.Z.R'
+
+
+def test_preflight_reports_everything_at_once(rig):
+    add_root_bone(rig)
+    report = preflight(rig, plan_root_bone(rig))
+    assert report.errors == ['Root: bone already exists']
+    plan = RigPlan()
+    plan.bones.append(BoneSpec('New', 'Missing', 'EXTRUDE', (0, 1, 0)))
+    plan.groups['Other'] = BoneGroups.fk
+    plan.constraint_edits.append((SPINE_BONES[0], 'IK', {}))
+    plan.drivers.append(DriverRetarget('noSuchDriver', 'New'))
+    report = preflight(rig, plan)
+    assert report.errors == ['New: bone Missing not found', f'{SPINE_BONES[0]}: constraint IK not found',
+                             f'bone group {BoneGroups.fk}: bone Other not found']
+    assert report.warnings == ['noSuchDriver: no driver to retarget']
+
+
+def test_dry_run_leaves_rig_untouched(rig):
+    bones = len(rig.data.bones)
+    model_rig = ModelRig.from_bones("Genesis", figure_bones())
+    assert dry_run(model_rig, plan_root_bone(model_rig)) == []
+    assert 'Root' in model_rig.data.bones
+    assert len(rig.data.bones) == bones
+    assert dry_run(model_rig, plan_root_bone(model_rig)) == ['Root: bone already exists']
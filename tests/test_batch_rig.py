@@ -0,0 +1,26 @@
+import os
+import pytest
+from batch_rig import output_paths, parse_args
+
+
+def test_output_dir_is_required():
+    with pytest.raises(SystemExit):
+        parse_args(['figure.blend'])
+
+
+def test_no_save_worker_needs_no_output_dir():
+    options = parse_args(['figure.blend', '--worker-args', '--steps', 'rig_arm', '--no-save'])
+    assert options.output_dir is None
+    assert options.worker_args == ['--steps', 'rig_arm', '--no-save']
+
+
+def test_inputs_of_same_name_get_own_outputs(tmp_path):
+    files = [str(tmp_path / "a" / "fig.blend"), str(tmp_path / "b" / "fig.blend")]
+    outputs = output_paths(files, "rigged")
+    assert outputs == {files[0]: os.path.join("rigged", "a", "fig.blend"),
+                       files[1]: os.path.join("rigged", "b", "fig.blend")}
+
+
+def test_single_directory_is_flattened(tmp_path):
+    files = [str(tmp_path / "fig.blend"), str(tmp_path / "other.blend")]
+    assert output_paths(files, "rigged")[files[1]] == os.path.join("rigged", "other.blend")
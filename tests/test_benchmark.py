@@ -0,0 +1,20 @@
+import benchmark
+from benchmark import compare, parse_args, run_scale
+
+
+def test_failing_step_is_recorded_and_run_goes_on(monkeypatch):
+    steps = [(name, step) for name, step in benchmark.STEPS if name != 'add_root_bone']
+    monkeypatch.setattr(benchmark, 'STEPS', steps)
+    entry = run_scale(1, parse_args(['--model', '--repeats', '1', '--drivers', '10']))
+    assert "Hand.controller.L: bone Root not found" in entry['errors']['rig_arm']
+    assert 'rig_arm' not in entry['timings']
+    assert 'fix_shldr_driver' in entry['timings']
+
+
+def test_compare_reports_new_failures():
+    previous = {'scales': [{'scale': 1, 'timings': {'rig_arm': 0.01, 'rig_leg': 0.02}}]}
+    results = {'scales': [{'scale': 1, 'timings': {'rig_leg': 0.02},
+                           'errors': {'rig_arm': ["Hand.controller.L: bone Root not found"]}}]}
+    lines = compare(results, previous)
+    assert lines[1] == "x1 rig_arm: 0.0100 s -> FAILED (Hand.controller.L: bone Root not found)  REGRESSION"
+    assert "REGRESSION" not in lines[0]
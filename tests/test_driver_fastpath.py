@@ -0,0 +1,19 @@
+import ast
+import pytest
+from driver_fastpath import linear_form
+
+
+def form(expression, names=('A', 'B')):
+    return linear_form(ast.parse(expression, mode='eval').body, set(names))
+
+
+def test_linear_form():
+    assert form('A') == ({'A': 1.0}, 0.0)
+    assert form('-1.13*A') == ({'A': -1.13}, 0.0)
+    assert form('(A + B) / 2') == ({'A': 0.5, 'B': 0.5}, 0.0)
+    assert form('2*A - 3*B + 1') == ({'A': 2.0, 'B': -3.0}, 1.0)
+
+
+@pytest.mark.parametrize('expression', ['A*B', 'sin(A)', 'A/B', 'C', 'A**2', 'A/0'])
+def test_non_linear_form(expression):
+    assert form(expression) is None
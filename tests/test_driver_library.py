@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from driver_library import save_driver_library, load_driver_library, read_sections
+from transfer_drivers import DriverTemplate, VariableTemplate, TargetTemplate, KEYFRAME_PROPS
+
+
+def template(name, expression, keyframes):
+    target = TargetTemplate('OBJECT', None, '', 'Hand.driver.L', 'LOCAL_SPACE', 'ROT_X', 'AUTO')
+    arrays = {prop: np.arange(keyframes * size, dtype=dtype) for prop, size, dtype in KEYFRAME_PROPS}
+    path = name.replace('\\', '\\\\').replace('"', '\\"')
+    return DriverTemplate(f'key_blocks["{path}"].value', name, 'SCRIPTED', expression,
+                          [VariableTemplate('A', 'TRANSFORMS', [target])], arrays)
+
+
+def test_round_trip(tmp_path):
+    templates = [template('pJCMHandDwn_70_L', '-1.13*A', 3), template('say "hi"', 'A', 0)]
+    path = tmp_path / "drivers.marcidrv"
+    save_driver_library(templates, str(path))
+    loaded = load_driver_library(str(path))
+    assert len(loaded) == 2
+    for original, copy in zip(templates, loaded):
+        assert copy[:5] == original[:5]
+        for prop, _, _ in KEYFRAME_PROPS:
+            assert np.array_equal(copy.keyframes[prop], original.keyframes[prop])
+
+
+def test_sections_do_not_hold_the_file(tmp_path):
+    path = tmp_path / "drivers.marcidrv"
+    save_driver_library([template('pJCMHandDwn_70_L', 'A', 2)], str(path))
+    sections = read_sections(str(path))
+    assert all(array.flags.owndata for array in sections.values())
+    path.unlink()
+    assert len(sections['drivers'])
+
+
+def test_truncated_library_raises_value_error(tmp_path):
+    path = tmp_path / "drivers.marcidrv"
+    save_driver_library([template('pJCMHandDwn_70_L', 'A', 2)], str(path))
+    path.write_bytes(path.read_bytes()[:40])
+    with pytest.raises(ValueError):
+        load_driver_library(str(path))
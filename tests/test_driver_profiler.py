@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+import pytest
+from driver_profiler import DriverTimer, ProfiledDriver, group_rows
+
+
+def profiled(owner, data_path, array_index, name, type, bones):
+    fcurve = SimpleNamespace(data_path=data_path, array_index=array_index, mute=False)
+    return ProfiledDriver(SimpleNamespace(name=owner), fcurve, name, type, bones)
+
+
+def test_group_rows_sum_driver_costs():
+    drivers = [profiled("Genesis", 'pose.bones["lForearmBend"].rotation_euler', 0, "Bend", 'SCRIPTED', ("lHand",)),
+               profiled("Genesis", 'pose.bones["lForearmBend"].rotation_euler', 1, "Bend", 'SCRIPTED', ("lHand",)),
+               profiled("Mesh", 'key_blocks["Bend"].value', 0, "Bend", 'SUM', ())]
+    costs = {id(driver.fcurve): cost for driver, cost in zip(drivers, (1e-3, 2e-3, 4e-3))}
+    rows = {(row.group, row.name): row for row in group_rows(drivers, costs)}
+    assert rows['DRIVER', 'Genesis: pose.bones["lForearmBend"].rotation_euler[0]'].cost_ms == pytest.approx(1)
+    assert rows['DRIVER', 'Genesis: pose.bones["lForearmBend"].rotation_euler[1]'].cost_ms == pytest.approx(2)
+    assert rows['SHAPE_KEY', "Bend"].drivers == 3
+    assert rows['SHAPE_KEY', "Bend"].cost_ms == pytest.approx(7)
+    assert rows['TYPE', 'SCRIPTED'].cost_ms == pytest.approx(3)
+    assert rows['BONE', "lHand"].cost_ms == pytest.approx(3)
+
+
+def test_empty_frame_range_is_rejected():
+    with pytest.raises(ValueError, match="Empty frame range"):
+        DriverTimer(None, [], range(10, 5))
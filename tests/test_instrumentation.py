@@ -0,0 +1,37 @@
+import pytest
+import instrumentation
+import rig_utils
+from armature_model import ModelRig
+from backend import model_backend
+
+
+@pytest.fixture
+def stats():
+    rig = ModelRig.from_bones("Rig", [("a", None, (0, 0, 0), (0, 0, 1))])
+    instrumentation.enable()
+    stats = instrumentation.OperatorStats("test")
+    instrumentation.active.append(stats)
+    try:
+        with model_backend(rig):
+            yield stats
+    finally:
+        instrumentation.active.remove(stats)
+        instrumentation.disable()
+
+
+def test_lookups_are_counted_once(stats):
+    lookup = rig_utils.BoneLookup(rig_utils.bpy.context.object)
+    rig_utils.get_pose_bone("a", lookup)
+    rig_utils.get_pose_bone("a", lookup=lookup)
+    assert stats.lookups == 2
+    rig_utils.get_pose_bone("a")
+    assert stats.lookups == 3
+    assert stats.helpers['get_pose_bone'][0] == 3
+
+
+def test_disable_restores_originals(stats):
+    instrumentation.disable()
+    assert not instrumentation.is_enabled()
+    assert rig_utils.BoneLookup.pose_bone.__name__ == 'pose_bone'
+    assert not hasattr(rig_utils.get_pose_bone, '__wrapped__')
+
@@ -0,0 +1,46 @@
+from rename_bones import *
+
+
+def test_daz_blender_rules():
+    assert daz_to_blender('lShldrBend') == 'ShldrBend.L'
+    assert blender_to_daz('ShldrBend.L') == 'lShldrBend'
+    assert daz_to_blender('hip') is None
+
+
+def test_rename_map_skips_no_ops():
+    assert rename_map(['lHand', 'hip', 'rHand'], daz_to_blender) == {'lHand': 'Hand.L', 'rHand': 'Hand.R'}
+
+
+def test_find_collisions():
+    mapping = {'a': 'c', 'b': 'c', 'd': 'e'}
+    assert find_collisions(mapping, ['a', 'b', 'd', 'e']) == ['b -> c', 'd -> e']
+    assert find_collisions({'a': 'b', 'b': 'a'}, ['a', 'b']) == []
+
+
+def apply_order(names, order):
+    names = set(names)
+    for old, new in order:
+        assert new not in names, f"{new} still in use"
+        names.remove(old)
+        names.add(new)
+    return names
+
+
+def test_rename_order_chain():
+    order = rename_order({'a': 'b', 'b': 'c'})
+    assert order == [('b', 'c'), ('a', 'b')]
+    assert apply_order(['a', 'b'], order) == {'b', 'c'}
+
+
+def test_rename_order_swap():
+    order = rename_order({'a': 'b', 'b': 'a'})
+    assert apply_order(['a', 'b'], order) == {'a', 'b'}
+    assert ('a', 'a.rename') in order
+
+
+def test_rename_order_temporary_name_is_unused():
+    existing = ['a', 'b', 'a.rename', 'a.rename.1']
+    order = rename_order({'a': 'b', 'b': 'a'}, existing)
+    temporary = order[0][1]
+    assert temporary not in existing
+    assert apply_order(existing, order) == set(existing)
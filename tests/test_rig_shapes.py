@@ -0,0 +1,30 @@
+import pytest
+import armature_model
+from armature_model import ModelRig
+from backend import model_backend
+from benchmark import figure_bones
+from rig_plan import PreflightError
+from rig_shapes import missing_bones, shape_bones, shape_arm_bones, shape_arm_ik_bones, spine_groups, \
+    shape_spine_bones, shape_finger_bones
+from bone_names import *
+
+
+@pytest.fixture
+def rig():
+    rig = ModelRig.from_bones("Genesis", figure_bones())
+    with model_backend(rig):
+        yield rig
+
+
+def test_missing_bones_of_shape_functions(rig):
+    available = {bone.name for bone in rig.pose.bones}
+    assert missing_bones(armature_model.context, shape_finger_bones, available) == []
+    assert missing_bones(armature_model.context, shape_arm_ik_bones, available) == \
+        sorted(side(name) for side in SIDES for name in (HAND_CTRL, ARM_POLE))
+
+
+def test_shape_bones_checks_every_bone_first(rig):
+    with pytest.raises(PreflightError) as error:
+        shape_bones(armature_model.context, [shape_arm_bones, shape_spine_bones], groups=spine_groups())
+    assert error.value.errors == ["shape_spine_bones: bone Root not found"]
+    assert all(bone.custom_shape is None and bone.bone_group is None for bone in rig.pose.bones)
@@ -0,0 +1,29 @@
+import pytest
+from rig_plan import PreflightError
+from shared_drivers import ChannelKey, MAX_PROPERTY_NAME, property_names
+
+
+class Object:
+    def __init__(self, name):
+        self.name = name
+
+
+def key(object_name, bone_target, transform_type='ROT_X', rotation_mode='AUTO'):
+    return ChannelKey(Object(object_name), bone_target, transform_type, 'LOCAL_SPACE', rotation_mode)
+
+
+def test_short_property_names_are_readable():
+    assert key("Genesis", "lHand").property_name() == "Genesis:lHand ROT_X LOCAL_SPACE AUTO"
+    assert key("Genesis", "lHand", 'LOC_Y', 'XYZ').property_name() == "Genesis:lHand LOC_Y LOCAL_SPACE"
+
+
+def test_long_property_names_fit_blender_limit():
+    long = [key("Genesis 9 Feminine Character", f"lPinkyFingerDistal{i}é") for i in range(2)]
+    names = property_names(long)
+    assert all(len(name.encode()) <= MAX_PROPERTY_NAME for name in names.values())
+    assert len(set(names.values())) == 2
+
+
+def test_clashing_property_names_are_rejected():
+    with pytest.raises(PreflightError):
+        property_names([key("Genesis", "lHand"), key("Genesis", "lHand")])
@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+from transfer_drivers import Params, STAMPED_DRIVERS, sync_driver_templates
+
+
+class Drivers(list):
+    def remove(self, fcurve):
+        super().remove(fcurve)
+
+
+class Key(dict):
+    """Shape key stand-in holding drivers and custom properties"""
+
+    def __init__(self, data_paths):
+        super().__init__()
+        self.animation_data = SimpleNamespace(drivers=Drivers(SimpleNamespace(data_path=path)
+                                                              for path in data_paths))
+        self.key_blocks = []
+
+
+def test_sync_deletes_only_stamped_drivers():
+    dstkey = Key(['key_blocks["Own"].value', 'key_blocks["Stamped"].value'])
+    dstkey[STAMPED_DRIVERS] = ['key_blocks["Stamped"].value', 'key_blocks["Gone"].value']
+    report = sync_driver_templates([], dstkey, None, Params(False))
+    assert [fcurve.data_path for fcurve in dstkey.animation_data.drivers] == ['key_blocks["Own"].value']
+    assert report.deleted == ['key_blocks["Stamped"].value']
+    assert dstkey[STAMPED_DRIVERS] == []
+    assert 'deleted (1): key_blocks["Stamped"].value' in report.summary()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from widget_meshes import SHAPES, ring, merge, euler_matrix, custom_shape_transform, displayed_vertices
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_shape_edges_index_vertices(shape):
+    verts, edges = SHAPES[shape]()
+    assert verts.ndim == 2 and verts.shape[1] == 3
+    assert edges.dtype == np.int32
+    assert edges.min() >= 0 and edges.max() < len(verts)
+
+
+def test_ring_is_closed():
+    verts, edges = ring(8)
+    assert len(edges) == 8
+    assert np.allclose(np.linalg.norm(verts, axis=1), 1)
+
+
+def test_merge_offsets_edges():
+    verts, edges = merge(ring(4), ring(4))
+    assert len(verts) == 8
+    assert edges[4:].min() == 4
+
+
+def bonewidget_vertices(verts, length, global_size, slide, rotation):
+    """Where boneWidget puts vertices: sized, rotated and slid in the widget mesh,
+    drawn with the default custom shape transform, scaled by bone length"""
+    mesh = verts * global_size @ euler_matrix(rotation).T + np.array([0, slide, 0])
+    return displayed_vertices(mesh, length, (1, 1, 1), (0, 0, 0), (0, 0, 0))
+
+
+def test_euler_matrix_turns_x_to_y():
+    assert np.allclose(euler_matrix((0, 0, np.pi / 2)) @ [1, 0, 0], [0, 1, 0])
+
+
+@pytest.mark.parametrize('shape, length, size, slide, rotation', [
+    ('Circle', 0.05, 0.3, 1, (0, 0, 0)),
+    ('Roll 1', 0.4, 0.3, 0.5, (0, 0, np.pi / 2)),
+    ('Chest', 0.2, 1.5, -0.3, (0, 0, 0)),
+    ('Rhomboid', 0.6, 4, 0, (np.pi / 2, 0, 0)),
+    ('Torso', 0.15, 1.7, 0.25, (1.5708, 0.3, -0.2)),
+])
+def test_native_widget_matches_bonewidget(shape, length, size, slide, rotation):
+    verts, _ = SHAPES[shape]()
+    native = displayed_vertices(verts, length, *custom_shape_transform(length, size, slide, rotation))
+    assert np.allclose(native, bonewidget_vertices(verts, length, size, slide, rotation), atol=1e-6)
@@ -1,26 +1,70 @@
-import bpy
+import re
+from backend import bpy
+import numpy as np
 
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
 class Params(NamedTuple):
     transfer_only_existing: bool
 
+# Matches 'key_blocks["name"].property', name may contain escaped quotes
+KEY_BLOCK_PATH = re.compile(r'^key_blocks\["((?:[^"\\]|\\.)*)"\]\.(\w+)$')
+
+# Custom property of destination shape keys listing data paths of drivers transferred onto them,
+# sync deletes only those and never drivers the destination had of its own
+STAMPED_DRIVERS = "marci_stamped_drivers"
+
+# Keyframe properties copied by transfer_drivers as (name, values per keyframe, dtype)
+KEYFRAME_PROPS = [
+    ('co', 2, np.float32),
+    ('handle_left', 2, np.float32),
+    ('handle_right', 2, np.float32),
+    ('interpolation', 1, np.int32),
+    ('easing', 1, np.int32),
+    ('handle_left_type', 1, np.int32),
+    ('handle_right_type', 1, np.int32)
+]
+
+class TargetTemplate(NamedTuple):
+    id_type: str
+    id: Optional[bpy.types.ID]
+    data_path: str
+    bone_target: str
+    transform_space: str
+    transform_type: str
+    rotation_mode: str
+
+class VariableTemplate(NamedTuple):
+    name: str
+    type: str
+    targets: list[TargetTemplate]
+
+class DriverTemplate(NamedTuple):
+    """Source driver read once, stamped onto any number of destinations"""
+    data_path: str
+    key_name: Optional[str]
+    type: str
+    expression: str
+    variables: list[VariableTemplate]
+    keyframes: dict[str, np.ndarray]
+
 class  TransferDrivers(bpy.types.Operator):
     """Transfer drivers from active object to selected"""
     bl_label = "Transfer drivers from active"
     bl_idname = "view3d.transfer_drivers"
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context: bpy.types.Context):
-        if len(context.selected_objects) != 2:
-            return {'CANCELLED'}
-        params = Params(context.scene.transfer_only_existing)
         srckey = context.active_object.data.shape_keys
-        dstkey = context.selected_objects[0].data.shape_keys
-        dstrig = context.selected_objects[0].parent
-        if dstkey == srckey:
-            dstkey = context.selected_objects[1].data.shape_keys
-            dstrig = context.selected_objects[1].parent
-        transfer_drivers(srckey, dstkey, dstrig, params)
+        if context.scene.transfer_to_all_selected:
+            targets = [obj for obj in context.selected_objects if obj != context.active_object]
+        elif len(context.selected_objects) != 2:
+            return {'CANCELLED'}
+        else:
+            targets = [obj for obj in context.selected_objects if obj.data.shape_keys != srckey]
+        report = transfer_templates(context, read_driver_templates(srckey), targets)
+        print(report.summary())
+        self.report({'INFO'}, report.summary().splitlines()[0])
         return {'FINISHED'}
 
 def register():
@@ -29,58 +73,235 @@ def register():
 def unregister():
     bpy.utils.unregister_class(TransferDrivers)
 
-def transfer_drivers(srckey: bpy.types.Key, dstkey: bpy.types.Key, dstrig: bpy.types.Object, params: Params):
-    fcurves = srckey.animation_data.drivers
-    dest_fcurves = None
-    try:
-        dest_fcurves = dstkey.animation_data.drivers
-    except AttributeError:
+class TransferReport:
+    """Collects transferred and skipped drivers of transfer_drivers"""
+
+    def __init__(self):
+        self.transferred = 0
+        self.updated = 0
+        self.deleted: list[str] = []
+        self.unchanged = 0
+        self.skipped: dict[str, list[str]] = {}
+
+    def skip(self, data_path: str, reason: str):
+        self.skipped.setdefault(reason, []).append(data_path)
+
+    def summary(self) -> str:
+        skipped = sum(len(paths) for paths in self.skipped.values())
+        lines = [f"Transferred {self.transferred} drivers, skipped {skipped}"]
+        if self.updated or self.deleted or self.unchanged:
+            lines[0] += f", updated {self.updated}, deleted {len(self.deleted)}, unchanged {self.unchanged}"
+        for reason, paths in self.skipped.items():
+            lines.append(f"  {reason} ({len(paths)}): {', '.join(paths)}")
+        if self.deleted:
+            lines.append(f"  deleted ({len(self.deleted)}): {', '.join(self.deleted)}")
+        return "\n".join(lines)
+
+def parse_key_block_path(data_path: str) -> Optional[tuple[str, str]]:
+    """Returns shape key name and property of key block data path,
+    None if data path does not point to a key block"""
+    match = KEY_BLOCK_PATH.match(data_path)
+    if match is None:
+        return None
+    return re.sub(r'\\(.)', r'\1', match.group(1)), match.group(2)
+
+def read_keyframes(fcurve: bpy.types.FCurve) -> dict[str, np.ndarray]:
+    """Reads all keyframes of fcurve into flat arrays, one per property"""
+    keyframe_points = fcurve.keyframe_points
+    count = len(keyframe_points)
+    arrays = {}
+    for prop, size, dtype in KEYFRAME_PROPS:
+        array = np.empty(count * size, dtype=dtype)
+        keyframe_points.foreach_get(prop, array)
+        arrays[prop] = array
+    return arrays
+
+def write_keyframes(fcurve: bpy.types.FCurve, arrays: dict[str, np.ndarray]):
+    """Replaces keyframes of fcurve with ones read by read_keyframes,
+    updating the curve once at the end"""
+    keyframe_points = fcurve.keyframe_points
+    keyframe_points.clear()
+    count = len(arrays['co']) // 2
+    if count == 0:
+        return
+    keyframe_points.add(count)
+    for prop, array in arrays.items():
+        keyframe_points.foreach_set(prop, array)
+    fcurve.update()
+
+def read_driver_template(fcurve: bpy.types.FCurve) -> DriverTemplate:
+    """Reads expression, variables, targets and keyframes of driver fcurve"""
+    variables = []
+    for var in fcurve.driver.variables:
+        targets = [TargetTemplate(t.id_type, t.id, t.data_path, t.bone_target,
+                                  t.transform_space, t.transform_type, t.rotation_mode)
+                   for t in var.targets]
+        variables.append(VariableTemplate(var.name, var.type, targets))
+    parsed = parse_key_block_path(fcurve.data_path)
+    return DriverTemplate(fcurve.data_path, parsed[0] if parsed else None,
+                          fcurve.driver.type, fcurve.driver.expression,
+                          variables, read_keyframes(fcurve))
+
+def read_driver_templates(srckey: bpy.types.Key) -> list[DriverTemplate]:
+    """Reads all drivers of srckey"""
+    return [read_driver_template(fcurve) for fcurve in srckey.animation_data.drivers]
+
+def resolve_id(target: TargetTemplate, var_type: str, key: Optional[bpy.types.Key] = None,
+               rig: Optional[bpy.types.Object] = None):
+    """Returns target id with key and rig of the mesh replaced by placeholders,
+    without key and rig every KEY and ARMATURE target is treated as own"""
+    if var_type != 'SINGLE_PROP':
+        return 'RIG' if rig is None or target.id == rig else target.id
+    if target.id_type == 'KEY' and (key is None or target.id == key):
+        return 'KEY'
+    if target.id_type == 'ARMATURE' and (rig is None or target.id == rig.data):
+        return 'ARMATURE'
+    return target.id
+
+def fingerprint(template: DriverTemplate, key: Optional[bpy.types.Key] = None,
+                rig: Optional[bpy.types.Object] = None) -> tuple:
+    """Returns comparable summary of driver independent of the mesh it lives on,
+    pass key and rig of the mesh for drivers read from destination"""
+    variables = tuple(
+        (var.name, var.type, tuple(t._replace(id=resolve_id(t, var.type, key, rig)) for t in var.targets))
+        for var in template.variables)
+    keyframes = tuple(template.keyframes[prop].tobytes() for prop, _, _ in KEYFRAME_PROPS)
+    return template.type, template.expression, variables, keyframes
+
+def stamp_variable(driver: bpy.types.Driver, template: VariableTemplate,
+                   dstkey: bpy.types.Key, dstrig: bpy.types.Object):
+    """Adds variable to driver, resolving KEY and ARMATURE targets to destination"""
+    v = driver.variables.new()
+    v.name = template.name
+    v.type = template.type
+    for target, target_template in zip(v.targets, template.targets):
+        if v.type == 'SINGLE_PROP':
+            target.id_type = target_template.id_type
+            if target.id_type == 'KEY':
+                target.id = dstkey
+            elif target.id_type == 'ARMATURE':
+                target.id = dstrig.data
+            else:
+                target.id = target_template.id
+            target.data_path = target_template.data_path
+        else:
+            target.id = dstrig
+            target.bone_target = target_template.bone_target
+            target.transform_space = target_template.transform_space
+            target.transform_type = target_template.transform_type
+            target.rotation_mode = target_template.rotation_mode
+
+def stamp_driver_templates(templates: list[DriverTemplate], dstkey: bpy.types.Key,
+                           dstrig: bpy.types.Object, params: Params,
+                           report: Optional[TransferReport] = None) -> TransferReport:
+    """Creates drivers described by templates on dstkey, targeting dstrig"""
+    report = report or TransferReport()
+    if dstkey.animation_data is None:
         dstkey.animation_data_create()
-        dest_fcurves = dstkey.animation_data.drivers
-    for fcurve in fcurves:
+    dest_fcurves = dstkey.animation_data.drivers
+    key_names = {key.name for key in dstkey.key_blocks}
+    stamped = []
+    for template in templates:
+        if params.transfer_only_existing:
+            if template.key_name is None:
+                report.skip(template.data_path, "not a shape key driver")
+                continue
+            if template.key_name not in key_names:
+                report.skip(template.data_path, "no such shape key on destination")
+                continue
         try:
-            new_fcurve = None
-            if params.transfer_only_existing:
-                for key in dstkey.key_blocks:
-                    if fcurve.data_path[12:-8] == key.name:
-                        new_fcurve = dest_fcurves.new(fcurve.data_path)
-            else:
-                new_fcurve = dest_fcurves.new(fcurve.data_path)
+            new_fcurve = dest_fcurves.new(template.data_path)
         except RuntimeError as e:
-            print(fcurve.data_path, e)
+            report.skip(template.data_path, str(e))
             continue
-        if new_fcurve is None:
+        report.transferred += 1
+        apply_driver_template(new_fcurve, template, dstkey, dstrig)
+        stamped.append(template.data_path)
+    mark_stamped(dstkey, stamped)
+    return report
+
+def stamped_drivers(dstkey: bpy.types.Key) -> list[str]:
+    return list(dstkey.get(STAMPED_DRIVERS, ()))
+
+def mark_stamped(dstkey: bpy.types.Key, data_paths: list[str]):
+    """Records data paths of drivers transferred onto dstkey"""
+    dstkey[STAMPED_DRIVERS] = list(dict.fromkeys(stamped_drivers(dstkey) + data_paths))
+
+def apply_driver_template(fcurve: bpy.types.FCurve, template: DriverTemplate,
+                          dstkey: bpy.types.Key, dstrig: bpy.types.Object):
+    """Makes driver fcurve match template, replacing its variables"""
+    write_keyframes(fcurve, template.keyframes)
+    driver = fcurve.driver
+    driver.type = template.type
+    driver.expression = template.expression
+    while len(driver.variables) > 0:
+        driver.variables.remove(driver.variables[-1])
+    for var in template.variables:
+        stamp_variable(driver, var, dstkey, dstrig)
+
+def sync_driver_templates(templates: list[DriverTemplate], dstkey: bpy.types.Key,
+                          dstrig: bpy.types.Object, params: Params,
+                          report: Optional[TransferReport] = None) -> TransferReport:
+    """Makes drivers of dstkey match templates, only creating, updating
+    or deleting drivers whose fingerprint differs. Drivers earlier transferred
+    onto dstkey without template now are deleted and listed in report,
+    drivers the destination had of its own are kept"""
+    report = report or TransferReport()
+    if dstkey.animation_data is None:
+        dstkey.animation_data_create()
+    dest_fcurves = dstkey.animation_data.drivers
+    existing = {fcurve.data_path: fcurve for fcurve in dest_fcurves}
+    key_names = {key.name for key in dstkey.key_blocks}
+    synced = []
+    for template in templates:
+        fcurve = existing.pop(template.data_path, None)
+        if params.transfer_only_existing:
+            if template.key_name is None:
+                report.skip(template.data_path, "not a shape key driver")
+                continue
+            if template.key_name not in key_names:
+                report.skip(template.data_path, "no such shape key on destination")
+                continue
+        if fcurve is None:
+            try:
+                fcurve = dest_fcurves.new(template.data_path)
+            except RuntimeError as e:
+                report.skip(template.data_path, str(e))
+                continue
+            report.transferred += 1
+        elif fingerprint(template) == fingerprint(read_driver_template(fcurve), dstkey, dstrig):
+            report.unchanged += 1
             continue
-        print(fcurve.data_path)
-        while len(new_fcurve.keyframe_points) > 0:
-            new_fcurve.keyframe_points.remove(new_fcurve.keyframe_points[0])
-        new_fcurve.keyframe_points.add(len(fcurve.keyframe_points))
-        if len(new_fcurve.keyframe_points) > 0:
-            for i, kf in new_fcurve.keyframe_points.items():
-                kf.interpolation = fcurve.keyframe_points[i].interpolation
-                kf.co = fcurve.keyframe_points[i].co
-                kf.easing = fcurve.keyframe_points[i].easing
-                kf.handle_left = fcurve.keyframe_points[i].handle_left
-                kf.handle_left_type = fcurve.keyframe_points[i].handle_left_type
-                kf.handle_right = fcurve.keyframe_points[i].handle_right
-                kf.handle_right_type = fcurve.keyframe_points[i].handle_right_type
-        new_fcurve.driver.type = fcurve.driver.type
-        new_fcurve.driver.expression = fcurve.driver.expression
-        for var in fcurve.driver.variables:
-            v = new_fcurve.driver.variables.new()
-            v.name = var.name
-            v.type = var.type
-            if v.type == 'SINGLE_PROP':
-                v.targets[0].id_type = var.targets[0].id_type
-                if v.targets[0].id_type == 'KEY':
-                    v.targets[0].id = dstkey
-                elif v.targets[0].id_type == 'ARMATURE':
-                    v.targets[0].id = dstrig.data
-                else:
-                    v.targets[0].id = var.targets[0].id
-                v.targets[0].data_path = var.targets[0].data_path
-            else:
-                v.targets[0].id = dstrig
-                v.targets[0].bone_target = fcurve.driver.variables[0].targets[0].bone_target
-                v.targets[0].transform_space = fcurve.driver.variables[0].targets[0].transform_space
-                v.targets[0].transform_type = fcurve.driver.variables[0].targets[0].transform_type
\ No newline at end of file
+        else:
+            report.updated += 1
+        apply_driver_template(fcurve, template, dstkey, dstrig)
+        synced.append(template.data_path)
+    stamped = stamped_drivers(dstkey)
+    deleted = [path for path in stamped if path in existing]
+    for path in deleted:
+        dest_fcurves.remove(existing[path])
+    report.deleted += deleted
+    present = {fcurve.data_path for fcurve in dest_fcurves}
+    dstkey[STAMPED_DRIVERS] = [path for path in stamped if path in present]
+    mark_stamped(dstkey, synced)
+    return report
+
+def transfer_drivers(srckey: bpy.types.Key, dstkey: bpy.types.Key, dstrig: bpy.types.Object, params: Params) -> TransferReport:
+    return stamp_driver_templates(read_driver_templates(srckey), dstkey, dstrig, params)
+
+def transfer_templates(context: bpy.types.Context, templates: list[DriverTemplate],
+                       objects: list[bpy.types.Object]) -> TransferReport:
+    """Stamps or syncs templates onto shapekeys of objects, targeting their parent rig,
+    following transfer options of the scene"""
+    params = Params(context.scene.transfer_only_existing)
+    report = TransferReport()
+    for obj in objects:
+        dstkey = getattr(obj.data, 'shape_keys', None)
+        if dstkey is None or obj.parent is None:
+            report.skip(obj.name, "object without shape keys or parent rig")
+            continue
+        if context.scene.sync_drivers:
+            sync_driver_templates(templates, dstkey, obj.parent, params, report)
+        else:
+            stamp_driver_templates(templates, dstkey, obj.parent, params, report)
+    return report
\ No newline at end of file
@@ -0,0 +1,167 @@
+from backend import bpy
+import numpy as np
+
+# Widget vertices are in bone space of a bone of length 1, Y axis points along the bone.
+# Size, slide and rotation are applied per bone with custom shape transform,
+# so every shape has a single mesh shared by all bones
+
+
+def ring(segments: int = 32, radius: float = 1.0, y: float = 0.0, plane: str = 'XZ',
+         arc: float = 2 * np.pi) -> tuple[np.ndarray, np.ndarray]:
+    """Circle or arc of given radius, closed when arc is a full turn"""
+    closed = np.isclose(arc, 2 * np.pi)
+    count = segments if closed else segments + 1
+    angles = np.linspace(0, arc, count, endpoint=not closed)
+    verts = np.zeros((count, 3), dtype=np.float32)
+    first, second = {'XZ': (0, 2), 'XY': (0, 1), 'YZ': (1, 2)}[plane]
+    verts[:, first] = radius * np.cos(angles)
+    verts[:, second] = radius * np.sin(angles)
+    if plane == 'XZ':
+        verts[:, 1] += y
+    return verts, polyline_edges(count, closed)
+
+
+def polyline(points) -> tuple[np.ndarray, np.ndarray]:
+    verts = np.asarray(points, dtype=np.float32)
+    return verts, polyline_edges(len(verts), False)
+
+
+def loop(points) -> tuple[np.ndarray, np.ndarray]:
+    verts = np.asarray(points, dtype=np.float32)
+    return verts, polyline_edges(len(verts), True)
+
+
+def polyline_edges(count: int, closed: bool) -> np.ndarray:
+    starts = np.arange(count if closed else count - 1, dtype=np.int32)
+    return np.stack([starts, (starts + 1) % count], axis=1)
+
+
+def merge(*parts: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Joins parts into one vertex and edge array, offsetting edge indices"""
+    offsets = np.cumsum([0] + [len(verts) for verts, _ in parts[:-1]])
+    verts = np.concatenate([verts for verts, _ in parts])
+    edges = np.concatenate([edges + offset for (_, edges), offset in zip(parts, offsets)])
+    return verts, edges.astype(np.int32)
+
+
+def box(half_x: float, y0: float, y1: float, half_z: float) -> tuple[np.ndarray, np.ndarray]:
+    corners = np.array([[x, y, z] for y in (y0, y1) for x, z in
+                        ((-half_x, -half_z), (half_x, -half_z), (half_x, half_z), (-half_x, half_z))],
+                       dtype=np.float32)
+    edges = np.array([[0, 1], [1, 2], [2, 3], [3, 0], [4, 5], [5, 6], [6, 7], [7, 4],
+                      [0, 4], [1, 5], [2, 6], [3, 7]], dtype=np.int32)
+    return corners, edges
+
+
+def rounded_square(half: float, radius: float, y: float = 0.0, segments: int = 8):
+    """Square loop with rounded corners in XZ plane"""
+    points = []
+    for cx, cz, start in ((half, half, 0), (-half, half, 0.5), (-half, -half, 1), (half, -half, 1.5)):
+        angles = np.linspace(start * np.pi, (start + 0.5) * np.pi, segments)
+        points += [(cx + radius * np.cos(a), y, cz + radius * np.sin(a)) for a in angles]
+    return loop(points)
+
+
+def circle():
+    return ring(32, 1.0)
+
+def sphere():
+    return merge(ring(32, 1.0, plane='XZ'), ring(32, 1.0, plane='XY'), ring(32, 1.0, plane='YZ'))
+
+def cube():
+    return box(1.0, -1.0, 1.0, 1.0)
+
+def plane():
+    return loop([(-1, 0, -1), (1, 0, -1), (1, 0, 1), (-1, 0, 1)])
+
+def fk_limb_1():
+    return merge(ring(24, 0.25, 0.5), polyline([(0, 0, 0), (0, 1, 0)]))
+
+def fk_limb_2():
+    return merge(ring(24, 0.2, 0.25), ring(24, 0.2, 0.75), polyline([(0, 0, 0), (0, 1, 0)]))
+
+def roll_1():
+    arc = ring(24, 1.0, arc=1.5 * np.pi)
+    end = arc[0][-1]
+    arrow = polyline([(end[0] - 0.25, 0, end[2] + 0.15), tuple(end), (end[0] - 0.15, 0, end[2] - 0.25)])
+    return merge(arc, arrow)
+
+def rhomboid():
+    return merge(loop([(0, 0, 1), (1, 0, 0), (0, 0, -1), (-1, 0, 0)]),
+                 loop([(0, 1, 0), (1, 0, 0), (0, -1, 0), (-1, 0, 0)]))
+
+def pyramid():
+    base = loop([(-0.5, 0, -0.5), (0.5, 0, -0.5), (0.5, 0, 0.5), (-0.5, 0, 0.5)])
+    sides = merge(*(polyline([corner, (0, 1, 0)]) for corner in base[0]))
+    return merge(base, sides)
+
+def chest():
+    return rounded_square(0.7, 0.3, 0.5)
+
+def torso():
+    return rounded_square(1.0, 0.5)
+
+def clavicle():
+    return merge(ring(16, 0.3, 0.0), ring(16, 0.3, 1.0), polyline([(0.3, 0, 0), (0.3, 1, 0)]),
+                 polyline([(-0.3, 0, 0), (-0.3, 1, 0)]))
+
+def root_1():
+    ticks = [polyline([(x * 1.0, 0, z * 1.0), (x * 1.3, 0, z * 1.3)])
+             for x, z in ((1, 0), (-1, 0), (0, 1), (0, -1))]
+    return merge(ring(48, 1.0), *ticks)
+
+def paddle_rounded():
+    head, edges = ring(16, 0.3, plane='XY')
+    return merge(polyline([(0, 0, 0), (0, 0.7, 0)]), (head + np.array([0, 1.0, 0], dtype=np.float32), edges))
+
+
+# boneWidget shape names mapped to generators
+SHAPES = {
+    'Circle': circle,
+    'Sphere': sphere,
+    'Cube': cube,
+    'Plane': plane,
+    'FK Limb 1': fk_limb_1,
+    'FK Limb 2': fk_limb_2,
+    'Roll 1': roll_1,
+    'Rhomboid': rhomboid,
+    'Pyramid': pyramid,
+    'Chest': chest,
+    'Torso': torso,
+    'Clavicle': clavicle,
+    'Root 1': root_1,
+    'Paddle (rounded)': paddle_rounded
+}
+
+
+def widget_mesh(name: str, shape: str) -> bpy.types.Mesh:
+    """Creates wireframe mesh of shape with foreach_set"""
+    verts, edges = SHAPES[shape]()
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set('co', np.ascontiguousarray(verts, dtype=np.float32).ravel())
+    mesh.edges.add(len(edges))
+    mesh.edges.foreach_set('vertices', np.ascontiguousarray(edges, dtype=np.int32).ravel())
+    mesh.update()
+    return mesh
+
+
+def euler_matrix(rotation) -> np.ndarray:
+    """Rotation matrix of XYZ euler angles"""
+    (cx, cy, cz), (sx, sy, sz) = np.cos(rotation), np.sin(rotation)
+    x = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    y = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    z = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return z @ y @ x
+
+
+def custom_shape_transform(length: float, global_size: float, slide: float, rotation: tuple):
+    """Custom shape scale, translation and rotation placing a native widget where boneWidget puts it.
+    Blender scales the shape by bone length but not the translation, boneWidget slides in bone lengths"""
+    return (global_size, global_size, global_size), (0, slide * length, 0), tuple(rotation)
+
+
+def displayed_vertices(verts: np.ndarray, length: float, scale: tuple, translation: tuple,
+                       rotation: tuple) -> np.ndarray:
+    """Bone space positions Blender draws custom shape vertices at"""
+    return np.asarray(translation) + (np.asarray(verts) * length * np.asarray(scale)) @ euler_matrix(rotation).T